@@ -1,10 +1,13 @@
+import argparse
 import csv, os, sys, json
 from collections import defaultdict
 
+from trace_phases import fixed_nested_segments, nested_segments, DEFAULT_MIN_SIZE
+from elf_symbols import load_symbols, parse_range, SymbolTable
+
 # 配置（与之前一致）
 GROUP_SIZE = 5120
 SUB_SIZE = 512
-SUB_COUNT = GROUP_SIZE // SUB_SIZE  # =10
 
 # twiddle 地址范围（包含端点）
 START = 0x80000854
@@ -13,6 +16,9 @@ END   = 0x80001853
 OSTART = 0x8000dfcc
 OEND = 0x8000ffcb
 
+# cachelog.log 中访问行的类型列
+ACCESS_KINDS = ("R", "W")
+
 # --------------------------
 # 1) 解析指令 trace（与用户第一份格式）
 # --------------------------
@@ -112,7 +118,7 @@ def build_basic_blocks(instrs):
         if p in block_starts:
             if current_block:
                 if current_start not in blocks_map:
-                    blocks_map[current_start] = {"block_id": block_id_counter, "iterations": []}
+                    blocks_map[current_start] = {"block_id": block_id_counter, "start_pc": current_start, "iterations": []}
                     block_id_counter += 1
                 blocks_map[current_start]["iterations"].append(current_block)
             current_start = p
@@ -121,7 +127,7 @@ def build_basic_blocks(instrs):
             current_block.append(instr)
     if current_block:
         if current_start not in blocks_map:
-            blocks_map[current_start] = {"block_id": block_id_counter, "iterations": []}
+            blocks_map[current_start] = {"block_id": block_id_counter, "start_pc": current_start, "iterations": []}
             block_id_counter += 1
         blocks_map[current_start]["iterations"].append(current_block)
 
@@ -161,6 +167,8 @@ def parse_cache_trace(filename):
             if not s: continue
             parts = s.split(",")
             if len(parts) < 3: continue
+            # --log-dcache-access 额外记录的访问行（第 4 列为 R/W），不是 miss
+            if len(parts) > 3 and parts[3] in ACCESS_KINDS: continue
             try:
                 ts = int(parts[0])
                 dur = int(parts[1])
@@ -183,18 +191,34 @@ def parse_cache_trace(filename):
 # --------------------------
 # 5) 统计每个小层的 miss count / miss_time（并拆分 twiddle/output 与 L1/L2）
 # --------------------------
-def analyze_sublayers_for_iteration_infos(it_infos, cache_events, group_size=GROUP_SIZE, sub_size=SUB_SIZE):
+def classify_miss(ev):
+    """按地址区间（twiddle/output/其它）与 L1/L2（dur > 10 视为 L2）给 miss 分桶"""
+    addr = ev.get("addr")
+    is_l2 = (ev.get("dur", 0) > 10)
+    level = "l2" if is_l2 else "l1"
+    if addr is not None and START <= addr <= END:
+        return "tw_" + level
+    if addr is not None and OSTART <= addr <= OEND:
+        return "out_" + level
+    return "miss_taken_" + level
+
+
+def analyze_sublayers_for_iteration_infos(it_infos, cache_events, group_size=GROUP_SIZE, sub_size=SUB_SIZE, layout=None, symtab=None):
+    """
+    layout: [(g_start, g_end, [(s_start, s_end), ...]), ...]，由 trace_phases 检测得到；
+    为 None 时退回固定的 group_size / sub_size 切分。
+    symtab: elf_symbols.SymbolTable，给出每个小层 miss 最多的数据符号（top_symbol）。
+    """
+    if symtab is None:
+        symtab = SymbolTable()
+    if layout is None:
+        layout = fixed_nested_segments(len(it_infos), group_size, sub_size)
     results = []  # list of dicts per sublayer
-    total_iters = len(it_infos)
+    global_sub_index = 0
     # 遍历每个大组
-    for g_start in range(0, total_iters, group_size):
-        g_end = min(g_start + group_size, total_iters)
-        group = it_infos[g_start:g_end]
-        # 每组切成 sub_count 个小层
-        for sub_id in range( (len(group) + sub_size -1) // sub_size ):  # handle partial last group
-            s_start = sub_id * sub_size
-            s_end = min(s_start + sub_size, len(group))
-            sub = group[s_start:s_end]
+    for group_idx, (g_start, g_end, subs) in enumerate(layout):
+        for sub_id, (s_start, s_end) in enumerate(subs):
+            sub = it_infos[s_start:s_end]
             if not sub:
                 continue
             # 小层时间窗用首尾 iteration 的 start/end
@@ -202,17 +226,12 @@ def analyze_sublayers_for_iteration_infos(it_infos, cache_events, group_size=GRO
             layer_end = sub[-1]["end"]
             window_len = layer_end - layer_start if layer_end > layer_start else 0
 
-            # 初始化统计量
+            # 初始化统计量：twiddle/output × L1/L2 的计数与时长
             miss_count = 0
             miss_dur_sum = 0
-
-            # twiddle/output × L1/L2 的计数与时长
-            tw_l1 = 0; tw_l1_dur = 0
-            tw_l2 = 0; tw_l2_dur = 0
-            out_l1 = 0; out_l1_dur = 0
-            out_l2 = 0; out_l2_dur = 0
-            miss_taken_l1 = 0; miss_taken_l1_dur = 0
-            miss_taken_l2 = 0; miss_taken_l2_dur = 0
+            buckets = {k: 0 for k in ("tw_l1", "tw_l2", "out_l1", "out_l2", "miss_taken_l1", "miss_taken_l2")}
+            durs = dict.fromkeys(buckets, 0)
+            sym_counts = defaultdict(int)
             # efficient scan: cache_events sorted by ts
             # binary search start index
             lo = 0; hi = len(cache_events)
@@ -228,43 +247,18 @@ def analyze_sublayers_for_iteration_infos(it_infos, cache_events, group_size=GRO
                 ev = cache_events[idx]
                 miss_count += 1
                 miss_dur_sum += ev["dur"]
-
-                # 判定 twiddle / output
-                addr = ev.get("addr")
-                is_twiddle = (addr is not None and START <= addr <= END)
-                is_output = (addr is not None and OSTART <= addr <= OEND)
-                # 判定 L1 / L2
-                is_l2 = (ev.get("dur", 0) > 10)
-
-                # 累计到对应 bucket
-                if is_twiddle:
-                    if is_l2:
-                        tw_l2 += 1
-                        tw_l2_dur += ev["dur"]
-                    else:
-                        tw_l1 += 1
-                        tw_l1_dur += ev["dur"]
-                elif is_output:
-                    if is_l2:
-                        out_l2 += 1
-                        out_l2_dur += ev["dur"]
-                    else:
-                        out_l1 += 1
-                        out_l1_dur += ev["dur"]
-                else:
-                    if is_l2:
-                        miss_taken_l2 += 1
-                        miss_taken_l2_dur += ev["dur"]
-                    else:
-                        miss_taken_l1 += 1
-                        miss_taken_l1_dur += ev["dur"]
-
+                bucket = classify_miss(ev)
+                buckets[bucket] += 1
+                durs[bucket] += ev["dur"]
+                if symtab:
+                    sym_counts[symtab.symbol_of(ev["addr"])] += 1
                 idx += 1
+            top_symbol = max(sym_counts, key=sym_counts.get) if sym_counts else ""
 
             results.append({
-                "group_idx": g_start // group_size,
+                "group_idx": group_idx,
                 "sub_idx_in_group": sub_id,
-                "global_sub_index": (g_start // group_size) * SUB_COUNT + sub_id,
+                "global_sub_index": global_sub_index,
                 "iter_first": sub[0]["iter_id"],
                 "iter_last": sub[-1]["iter_id"],
                 "start": layer_start,
@@ -274,29 +268,49 @@ def analyze_sublayers_for_iteration_infos(it_infos, cache_events, group_size=GRO
                 "miss_dur_sum": miss_dur_sum,
                 "occupancy_ratio": (miss_dur_sum / window_len) if window_len>0 else 0.0,
                 # 新增细分
-                "tw_l1": tw_l1,
-                "tw_l1_dur": tw_l1_dur,
-                "tw_l2": tw_l2,
-                "tw_l2_dur": tw_l2_dur,
-                "out_l1": out_l1,
-                "out_l1_dur": out_l1_dur,
-                "out_l2": out_l2,
-                "out_l2_dur": out_l2_dur,
-                "miss_taken_l1": miss_taken_l1,
-                "miss_taken_l1_dur": miss_taken_l1_dur,
-                "miss_taken_l2": miss_taken_l2,         
-                "miss_taken_l2_dur": miss_taken_l2_dur
+                "tw_l1": buckets["tw_l1"],
+                "tw_l1_dur": durs["tw_l1"],
+                "tw_l2": buckets["tw_l2"],
+                "tw_l2_dur": durs["tw_l2"],
+                "out_l1": buckets["out_l1"],
+                "out_l1_dur": durs["out_l1"],
+                "out_l2": buckets["out_l2"],
+                "out_l2_dur": durs["out_l2"],
+                "miss_taken_l1": buckets["miss_taken_l1"],
+                "miss_taken_l1_dur": durs["miss_taken_l1"],
+                "miss_taken_l2": buckets["miss_taken_l2"],
+                "miss_taken_l2_dur": durs["miss_taken_l2"],
+                "top_symbol": top_symbol
             })
+            global_sub_index += 1
     return results
 
 # --------------------------
 # 6) main
 # --------------------------
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python analyze_sublayer_misses.py <imgname>")
-        sys.exit(1)
-    imgname = sys.argv[1] + "-riscv32"
+    parser = argparse.ArgumentParser(description="按阶段/小层统计 cache miss")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--fixed", action="store_true",
+                        help=f"按固定的 group/sub 大小切分（默认 {GROUP_SIZE}/{SUB_SIZE}），不做阶段检测")
+    parser.add_argument("--group-size", type=int, default=GROUP_SIZE)
+    parser.add_argument("--sub-size", type=int, default=SUB_SIZE)
+    parser.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE, help="阶段检测时每段最少迭代数")
+    parser.add_argument("--elf", help="镜像的 ELF 文件，用于函数/数据符号归属")
+    parser.add_argument("--twiddle", help="twiddle 区间：数据符号名或 lo:hi（默认内置常量）")
+    parser.add_argument("--output", help="output 区间：数据符号名或 lo:hi（默认内置常量）")
+    args = parser.parse_args()
+
+    global START, END, OSTART, OEND
+    symtab = load_symbols(args.elf)
+    try:
+        if args.twiddle:
+            START, END = parse_range(args.twiddle, symtab)
+        if args.output:
+            OSTART, OEND = parse_range(args.output, symtab)
+    except KeyError as e:
+        parser.error(e.args[0])
+    imgname = args.img + "-riscv32"
     instr_trace = os.path.join("profiling", imgname, "base.log")   # 你的第一份trace
     cache_trace = os.path.join("profiling", imgname, "cachelog.log")  # 你的第二份trace
     out_csv = os.path.join("profiling", imgname, "sublayer_miss_stats.csv")
@@ -315,7 +329,7 @@ def main():
         fout.write(
             "block_id,group_idx,sub_idx_in_group,global_sub_index,iter_first,iter_last,"
             "start,end,window_len,miss_count,miss_dur_sum,occupancy_ratio,"
-            "tw_l1,tw_l1_dur,tw_l2,tw_l2_dur,out_l1,out_l1_dur,out_l2,out_l2_dur,miss_taken_l1, miss_taken_l1_dur,miss_taken_l2, miss_taken_l2_dur \n"
+            "tw_l1,tw_l1_dur,tw_l2,tw_l2_dur,out_l1,out_l1_dur,out_l2,out_l2_dur,miss_taken_l1, miss_taken_l1_dur,miss_taken_l2, miss_taken_l2_dur,function,top_symbol\n"
         )
         for blk in blocks:
             block_id = blk["block_id"]
@@ -323,7 +337,12 @@ def main():
             it_infos = iterations_to_infos(iterations)
             if not it_infos:
                 continue
-            results = analyze_sublayers_for_iteration_infos(it_infos, cache_events)
+            if args.fixed:
+                layout = None
+            else:
+                layout = nested_segments([info["cycles"] for info in it_infos], args.min_size)
+            results = analyze_sublayers_for_iteration_infos(it_infos, cache_events, args.group_size, args.sub_size, layout, symtab)
+            function = symtab.func_of(blk["start_pc"])
             for r in results:
                 fout.write(
                     f"{block_id},{r['group_idx']},{r['sub_idx_in_group']},{r['global_sub_index']},"
@@ -331,7 +350,8 @@ def main():
                     f"{r['miss_count']},{r['miss_dur_sum']:.0f},{r['occupancy_ratio']:.6f},"
                     f"{r['tw_l1']},{r['tw_l1_dur']:.0f},{r['tw_l2']},{r['tw_l2_dur']:.0f},"
                     f"{r['out_l1']},{r['out_l1_dur']:.0f},{r['out_l2']},{r['out_l2_dur']:.0f},"
-                    f"{r['miss_taken_l1']},{r['miss_taken_l1_dur']:.0f},{r['miss_taken_l2']},{r['miss_taken_l2_dur']:.0f}\n"
+                    f"{r['miss_taken_l1']},{r['miss_taken_l1_dur']:.0f},{r['miss_taken_l2']},{r['miss_taken_l2_dur']:.0f},"
+                    f"{function},{r['top_symbol']}\n"
                 )
 
     print(f"[+] 完成，输出：{out_csv}")
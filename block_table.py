@@ -0,0 +1,82 @@
+from array import array
+
+import memo_store
+
+# ============================
+# 基本块/迭代表
+# ============================
+# BlockSummary 会被 pickle 进 memo_store，类定义放在这个独立模块里，
+# trace.py 直接运行（__main__）和被 trace_whatif.py 等脚本导入时，缓存条目都能互相读取。
+# 基本块的切分仍由 trace.build_basic_blocks 完成，这里只负责压缩和缓存。
+
+# 缓存的中间结果格式变化时递增
+BLOCKS_VERSION = 2
+
+
+class BlockSummary:
+    """
+    基本块的紧凑表示，可 pickle 进 memo_store：每次迭代只保留 start / end / 指令数 / 首条指令 seq。
+    迭代内指令的 seq 连续，需要逐条指令时按 (first_seq, size) 重新取。
+    """
+    def __init__(self, block_id, start_pc, starts, ends, sizes, first_seqs):
+        self.block_id = block_id
+        self.start_pc = start_pc
+        self.starts = starts
+        self.ends = ends
+        self.sizes = sizes
+        self.first_seqs = first_seqs
+
+    @classmethod
+    def from_block(cls, bb):
+        starts, ends, sizes, first_seqs = array("q"), array("q"), array("l"), array("q")
+        for it in bb.iterations:
+            if not it:
+                continue
+            starts.append(min(instr.start for instr in it))
+            ends.append(max(instr.start + instr.latency for instr in it))
+            sizes.append(len(it))
+            first_seqs.append(it[0].seq)
+        return cls(bb.block_id, bb.start_pc, starts, ends, sizes, first_seqs)
+
+    def n_iterations(self):
+        return len(self.starts)
+
+    def n_instrs(self):
+        return sum(self.sizes)
+
+    def total_cycles(self):
+        return sum(self.ends) - sum(self.starts)
+
+    def avg_ipc(self):
+        total_cycles = self.total_cycles()
+        return self.n_instrs() / total_cycles if total_cycles else 0
+
+    def iteration_info(self, below_ipc):
+        """与 BasicBlock.iteration_info 相同的字段，instrs 换成 first_seq / size"""
+        infos = []
+        for idx, (a, b, n, first) in enumerate(zip(self.starts, self.ends, self.sizes, self.first_seqs)):
+            cycles = b - a
+            ipc = n / cycles if cycles else 0
+            infos.append({
+                "iter_id": idx + 1,
+                "cycles": cycles,
+                "ipc": ipc,
+                "first_seq": first,
+                "size": n,
+                "below_avg": ipc < below_ipc
+            })
+        return infos
+
+
+def summarize_blocks(instrs, blocks):
+    """instrs 与 build_basic_blocks(instrs) 的结果 -> (总周期, 总指令数, [BlockSummary])，即 "blocks" 阶段缓存的内容"""
+    total_cycles = 0
+    if instrs:
+        total_cycles = max(instr.start + instr.latency for instr in instrs) - min(instr.start for instr in instrs)
+    return total_cycles, len(instrs), [BlockSummary.from_block(bb) for bb in blocks]
+
+
+def cached_block_table(store, trace_file, seq_range, cycle_range, compute):
+    """从缓存取基本块/迭代表，未命中时调用 compute()（返回 summarize_blocks 的结果）并写入缓存"""
+    window = {"seq": seq_range, "cycles": cycle_range}
+    return store.cached("blocks", BLOCKS_VERSION, memo_store.file_fingerprint(trace_file), window, compute)
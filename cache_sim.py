@@ -0,0 +1,248 @@
+import argparse
+import multiprocessing
+import os
+from array import array
+from collections import namedtuple
+
+from analyze_sublayer_misses import START, END, OSTART, OEND, ACCESS_KINDS
+from elf_symbols import load_symbols, resolve_regions
+
+# ============================
+# 多配置组相联 cache 模拟
+# ============================
+# 回放 cachelog.log 中由 --log-dcache-access 记录的 load/store 地址流（提交顺序），
+# 对每个 (sets, ways, line, policy) 配置各跑一遍，配置之间按进程并行。
+
+POLICIES = ("lru", "plru", "fifo")
+
+# 默认地址区间（与 analyze_sublayer_misses 一致），其它地址归入 other
+DEFAULT_REGIONS = [("twiddle", START, END), ("output", OSTART, OEND)]
+
+CacheConfig = namedtuple("CacheConfig", ["sets", "ways", "line", "policy"])
+
+
+def config_size(cfg):
+    return cfg.sets * cfg.ways * cfg.line
+
+
+def parse_access_log(filename):
+    """返回 (addrs, is_write, pcs, 记录到的 miss 持续周期列表)"""
+    addrs = array("I")
+    writes = array("B")
+    pcs = array("I")
+    miss_durs = []
+    with open(filename) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 3:
+                continue
+            try:
+                if len(parts) > 3 and parts[3] in ACCESS_KINDS:
+                    addrs.append(int(parts[2], 16))
+                    writes.append(parts[3] == "W")
+                    pcs.append(int(parts[4], 16) if len(parts) > 4 else 0)
+                else:
+                    miss_durs.append(int(parts[1]))
+            except ValueError:
+                continue
+    return addrs, writes, pcs, miss_durs
+
+
+def region_ids(addrs, regions):
+    """每次访问所属区间的下标；len(regions) 表示 other"""
+    other = len(regions)
+    ids = array("B", bytes(len(addrs)))
+    for i, a in enumerate(addrs):
+        rid = other
+        for r, (_, lo, hi) in enumerate(regions):
+            if lo <= a <= hi:
+                rid = r
+                break
+        ids[i] = rid
+    return ids
+
+
+# ----------------------------
+# 替换策略
+# ----------------------------
+def _simulate_dict_policy(cfg, addrs, rids, n_regions, move_on_hit):
+    """LRU / FIFO：每组一个按插入顺序排列的 dict（LRU 命中时把 tag 挪到末尾）"""
+    offset_bits = cfg.line.bit_length() - 1
+    set_mask = cfg.sets - 1
+    index_bits = cfg.sets.bit_length() - 1
+    ways = cfg.ways
+    sets = [dict() for _ in range(cfg.sets)]
+    hits = [0] * n_regions
+    accesses = [0] * n_regions
+    for a, rid in zip(addrs, rids):
+        line = a >> offset_bits
+        s = sets[line & set_mask]
+        tag = line >> index_bits
+        accesses[rid] += 1
+        if tag in s:
+            hits[rid] += 1
+            if move_on_hit:
+                del s[tag]
+                s[tag] = None
+        else:
+            if len(s) >= ways:
+                del s[next(iter(s))]
+            s[tag] = None
+    return hits, accesses
+
+
+def _simulate_plru(cfg, addrs, rids, n_regions):
+    """树形 PLRU：每组 ways-1 个方向位，节点 k 的左右孩子为 2k+1 / 2k+2"""
+    offset_bits = cfg.line.bit_length() - 1
+    set_mask = cfg.sets - 1
+    index_bits = cfg.sets.bit_length() - 1
+    ways = cfg.ways
+    levels = ways.bit_length() - 1
+    tags = [[None] * ways for _ in range(cfg.sets)]
+    where = [dict() for _ in range(cfg.sets)]
+    bits = [0] * cfg.sets
+    hits = [0] * n_regions
+    accesses = [0] * n_regions
+
+    def touch(b, way):
+        node = 0
+        for lvl in range(levels - 1, -1, -1):
+            right = (way >> lvl) & 1
+            # 方向位指向“较久未用”的一侧：访问右侧则指向左侧
+            if right:
+                b &= ~(1 << node)
+            else:
+                b |= 1 << node
+            node = 2 * node + 1 + right
+        return b
+
+    def victim(b):
+        node, way = 0, 0
+        for _ in range(levels):
+            right = (b >> node) & 1
+            way = (way << 1) | right
+            node = 2 * node + 1 + right
+        return way
+
+    for a, rid in zip(addrs, rids):
+        line = a >> offset_bits
+        si = line & set_mask
+        tag = line >> index_bits
+        accesses[rid] += 1
+        w = where[si].get(tag)
+        if w is not None:
+            hits[rid] += 1
+        else:
+            st = tags[si]
+            try:
+                w = st.index(None)
+            except ValueError:
+                w = victim(bits[si])
+                del where[si][st[w]]
+            st[w] = tag
+            where[si][tag] = w
+        bits[si] = touch(bits[si], w)
+    return hits, accesses
+
+
+# 由 fork 出的子进程继承，避免把上亿个地址序列化给每个任务
+_ADDRS = None
+_RIDS = None
+_N_REGIONS = 1
+
+
+def simulate(cfg):
+    if cfg.policy == "lru":
+        hits, accesses = _simulate_dict_policy(cfg, _ADDRS, _RIDS, _N_REGIONS, True)
+    elif cfg.policy == "fifo":
+        hits, accesses = _simulate_dict_policy(cfg, _ADDRS, _RIDS, _N_REGIONS, False)
+    elif cfg.policy == "plru":
+        hits, accesses = _simulate_plru(cfg, _ADDRS, _RIDS, _N_REGIONS)
+    else:
+        raise ValueError(f"unknown policy: {cfg.policy}")
+    return cfg, hits, accesses
+
+
+def run_configs(configs, addrs, rids, n_regions, jobs):
+    global _ADDRS, _RIDS, _N_REGIONS
+    _ADDRS, _RIDS, _N_REGIONS = addrs, rids, n_regions
+    if jobs <= 1 or len(configs) <= 1:
+        return [simulate(cfg) for cfg in configs]
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(min(jobs, len(configs))) as pool:
+        return pool.map(simulate, configs, chunksize=1)
+
+
+def _int_list(text):
+    return [int(v, 0) for v in text.split(",") if v]
+
+
+def _is_pow2(v):
+    return v > 0 and (v & (v - 1)) == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放 D-cache 访问地址的多配置 cache 模拟")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--sets", default="16,32,64,128", help="组数列表（2 的幂）")
+    parser.add_argument("--ways", default="1,2,4,8", help="路数列表（plru 要求 2 的幂）")
+    parser.add_argument("--line", default="64", help="行大小列表（字节，2 的幂）")
+    parser.add_argument("--policy", default="lru,plru,fifo", help="替换策略列表")
+    parser.add_argument("--penalty", type=float, help="每次 miss 的停顿周期（默认取 cachelog 中实测 miss 的平均持续周期）")
+    parser.add_argument("--region", action="append",
+                        help="地址区间 name:lo:hi、name:符号 或 符号（可重复，默认 twiddle/output）")
+    parser.add_argument("--elf", help="镜像的 ELF 文件，用于按符号名定义区间")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    cache_file = os.path.join(output_dir, "cachelog.log")
+    output_file = os.path.join(output_dir, "cache_sim.csv")
+
+    addrs, writes, pcs, miss_durs = parse_access_log(cache_file)
+    if not addrs:
+        print("⚠️ cachelog.log 中没有访问记录，请用 `make run ARGS=--log-dcache-access` 重新仿真")
+        return
+    penalty = args.penalty
+    if penalty is None:
+        penalty = sum(miss_durs) / len(miss_durs) if miss_durs else 20.0
+
+    try:
+        regions = resolve_regions(args.region, load_symbols(args.elf)) if args.region else DEFAULT_REGIONS
+    except KeyError as e:
+        parser.error(e.args[0])
+    region_names = [r[0] for r in regions] + ["other"]
+    rids = region_ids(addrs, regions)
+
+    configs = []
+    for policy in args.policy.split(","):
+        for line in _int_list(args.line):
+            for sets in _int_list(args.sets):
+                for ways in _int_list(args.ways):
+                    if not (_is_pow2(line) and _is_pow2(sets)) or (policy == "plru" and not _is_pow2(ways)):
+                        continue
+                    configs.append(CacheConfig(sets, ways, line, policy))
+    print(f"[*] {len(addrs)} 次访问（写 {sum(writes)} 次），{len(configs)} 个配置，"
+          f"miss 代价 {penalty:.1f} cycles，{args.jobs} 个进程")
+
+    results = run_configs(configs, addrs, rids, len(region_names), args.jobs)
+    results.sort(key=lambda r: (config_size(r[0]), r[0].policy, r[0].ways))
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("sets,ways,line,policy,size_bytes,accesses,hits,misses,hit_rate,est_stall_cycles,"
+                + ",".join(f"{n}_accesses,{n}_hit_rate" for n in region_names) + "\n")
+        for cfg, hits, accesses in results:
+            total_hits, total = sum(hits), sum(accesses)
+            misses = total - total_hits
+            per_region = ",".join(
+                f"{acc},{(h / acc if acc else 0):.4f}" for h, acc in zip(hits, accesses)
+            )
+            f.write(f"{cfg.sets},{cfg.ways},{cfg.line},{cfg.policy},{config_size(cfg)},"
+                    f"{total},{total_hits},{misses},{total_hits / total:.4f},{misses * penalty:.0f},"
+                    f"{per_region}\n")
+    print(f"✅ 已输出 {len(results)} 个配置的模拟结果到 {output_file}")
+
+
+if __name__ == "__main__":
+    main()
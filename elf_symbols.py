@@ -0,0 +1,178 @@
+import argparse
+import struct
+from bisect import bisect_right
+
+# ============================
+# ELF32 符号表读取（纯 Python）
+# ============================
+# 只解析节头表中的 SHT_SYMTAB 及其关联的字符串表，按符号起始地址排序后
+# 用 bisect 做区间查找：PC -> 函数名、数据地址 -> 数据符号，单次 O(log n)。
+
+SHT_SYMTAB = 2
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+
+
+class ElfError(Exception):
+    pass
+
+
+def read_symbols(path):
+    """返回 [(name, value, size, type)]，只保留有名字、已定义的符号"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"\x7fELF":
+        raise ElfError(f"{path}: 不是 ELF 文件")
+    if data[4] != 1:
+        raise ElfError(f"{path}: 只支持 ELF32")
+    endian = "<" if data[5] == 1 else ">"
+
+    e_shoff, = struct.unpack_from(endian + "I", data, 0x20)
+    e_shentsize, e_shnum = struct.unpack_from(endian + "HH", data, 0x2E)
+    sections = []
+    for i in range(e_shnum):
+        # sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, sh_link, sh_info, sh_addralign, sh_entsize
+        sections.append(struct.unpack_from(endian + "10I", data, e_shoff + i * e_shentsize))
+
+    symbols = []
+    for sh in sections:
+        if sh[1] != SHT_SYMTAB:
+            continue
+        offset, size, link, entsize = sh[4], sh[5], sh[6], sh[9] or 16
+        str_off = sections[link][4]
+        for pos in range(offset, offset + size, entsize):
+            st_name, st_value, st_size, st_info, _, st_shndx = struct.unpack_from(endian + "IIIBBH", data, pos)
+            if st_name == 0 or st_shndx == 0:
+                continue
+            end = data.index(b"\0", str_off + st_name)
+            name = data[str_off + st_name:end].decode("utf-8", "replace")
+            symbols.append((name, st_value, st_size, st_info & 0xF))
+    return symbols
+
+
+class IntervalIndex:
+    """
+    按起始地址排序的 [start, end) 区间；size 为 0 的符号延伸到下一个符号起点。
+    查找时取起点不大于 addr 的最后一个区间。
+    """
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda e: (e[1], -e[2]))
+        # 从后往前求每项之后第一个更大的起点，size 为 0 的符号延伸到那里
+        next_start = [0] * len(entries)
+        nxt = None
+        for i in range(len(entries) - 1, -1, -1):
+            next_start[i] = nxt
+            if i > 0 and entries[i][1] > entries[i - 1][1]:
+                nxt = entries[i][1]
+        self.starts = []
+        self.ends = []
+        self.names = []
+        for i, (name, start, size) in enumerate(entries):
+            if self.starts and self.starts[-1] == start:
+                continue  # 同地址别名只保留第一个（size 最大者）
+            if size == 0:
+                size = (next_start[i] if next_start[i] is not None else start + 1) - start
+            self.starts.append(start)
+            self.ends.append(start + size)
+            self.names.append(name)
+
+    def lookup(self, addr):
+        i = bisect_right(self.starts, addr) - 1
+        if i >= 0 and addr < self.ends[i]:
+            return self.names[i]
+        return ""
+
+
+class SymbolTable:
+    """functions: PC -> 函数；objects: 数据地址 -> 数据符号。未加载 ELF 时所有查询返回空串"""
+
+    def __init__(self, symbols=()):
+        self.by_name = {}
+        funcs, objs = [], []
+        for name, value, size, typ in symbols:
+            self.by_name.setdefault(name, (value, size))
+            if typ == STT_FUNC:
+                funcs.append((name, value, size))
+            elif typ == STT_OBJECT:
+                objs.append((name, value, size))
+        self.functions = IntervalIndex(funcs)
+        self.objects = IntervalIndex(objs)
+
+    def __bool__(self):
+        return bool(self.by_name)
+
+    def func_of(self, pc):
+        if isinstance(pc, str):
+            pc = int(pc, 16)
+        return self.functions.lookup(pc)
+
+    def symbol_of(self, addr):
+        return self.objects.lookup(addr)
+
+    def range_of(self, name):
+        """符号对应的闭区间 (lo, hi)，与 analyze_sublayer_misses 中 START/END 的约定一致"""
+        if not self:
+            raise KeyError(f"按符号名 {name} 指定区间需要 --elf")
+        if name not in self.by_name:
+            raise KeyError(f"ELF 中没有符号 {name}")
+        value, size = self.by_name[name]
+        if size == 0:
+            # 没有 size 的符号（如汇编里定义的表）沿用索引中延伸到下一个符号的范围
+            for index in (self.objects, self.functions):
+                i = bisect_right(index.starts, value) - 1
+                if i >= 0 and index.starts[i] == value:
+                    size = index.ends[i] - value
+                    break
+        return value, value + max(size, 1) - 1
+
+
+def load_symbols(path):
+    return SymbolTable(read_symbols(path)) if path else SymbolTable()
+
+
+def parse_range(text, symtab):
+    """'lo:hi'（闭区间，十六进制需带 0x）或符号名 -> (lo, hi)"""
+    if ":" in text:
+        lo, hi = text.split(":", 1)
+        return int(lo, 0), int(hi, 0)
+    return symtab.range_of(text)
+
+
+def resolve_regions(specs, symtab):
+    """
+    地址区间定义，每项为 'name:lo:hi'、'name:symbol' 或 'symbol'（以符号名作区间名），
+    返回 [(name, lo, hi)]。
+    """
+    regions = []
+    for spec in specs:
+        parts = spec.split(":")
+        if len(parts) == 3:
+            regions.append((parts[0], int(parts[1], 0), int(parts[2], 0)))
+        elif len(parts) == 2:
+            regions.append((parts[0],) + symtab.range_of(parts[1]))
+        else:
+            regions.append((spec,) + symtab.range_of(spec))
+    return regions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列出 ELF 中的函数/数据符号，或查询地址所属符号")
+    parser.add_argument("elf")
+    parser.add_argument("addr", nargs="*", help="要查询的地址（十六进制）")
+    args = parser.parse_args()
+
+    symtab = load_symbols(args.elf)
+    if args.addr:
+        for a in args.addr:
+            v = int(a, 16)
+            print(f"0x{v:08x} func={symtab.func_of(v) or '-'} data={symtab.symbol_of(v) or '-'}")
+        return
+    for kind, index in (("FUNC", symtab.functions), ("OBJECT", symtab.objects)):
+        for start, end, name in zip(index.starts, index.ends, index.names):
+            print(f"{kind:<6} 0x{start:08x}-0x{end:08x} {name}")
+
+
+if __name__ == "__main__":
+    main()
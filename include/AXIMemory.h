@@ -4,9 +4,9 @@
 #include <verilated_vcd_c.h>
 #include "VCPU.h"
 #include <cstdint>
-#include <unordered_map>
 #include <fstream>
 #include "Device.h"
+#include "PagedMemory.h"
 
 
 enum class AXIReadState {
@@ -35,8 +35,8 @@ struct AXIWriteConfig {
 
 class AXIMemory {
     private:
-    std::unordered_map<uint32_t, uint32_t> memory;
-    std::unordered_map<uint32_t, uint32_t> refMemory;
+    PagedMemory memory;
+    PagedMemory refMemory;
     Device* device = nullptr;
     uint32_t byteMasks[4] = {0x000000FF, 0x0000FF00, 0x00FF0000, 0xFF000000};
     uint32_t randSeqIndex = 0;
@@ -56,6 +56,18 @@ class AXIMemory {
     uint32_t refMemoryRead(uint32_t addr);
     void refMemoryWrite(uint32_t addr, uint32_t data, uint8_t wstrb);
 
+    // 快进：镜像末尾地址；把参考模型的内存整体拷给 DUT 侧；只改 DUT 侧的一个字
+    uint32_t imageEnd = 0;
+    bool refMemoryTouched(uint32_t addr) {
+        return refMemory.allocated(addr >> 2);
+    }
+    void syncFromRef() {
+        memory = refMemory;
+    }
+    void debugWrite(uint32_t addr, uint32_t data) {
+        memory.write(addr >> 2, data);
+    }
+
 };
 
 #endif
\ No newline at end of file
@@ -0,0 +1,35 @@
+#ifndef COUNTER_SAMPLER_HH
+#define COUNTER_SAMPLER_HH
+
+#include <cstdint>
+#include <fstream>
+#include <string>
+#include <vector>
+#include "VCPU.h"
+
+// 每隔 interval 个周期把 io_dbg_* 计数器的当前值写入 counters.bin，由 trace_counters.py 读取。
+// 文件格式（小端）：
+//   "ZCTR" | u32 版本 | u32 间隔 | u32 计数器个数 n | n 个以 '\0' 结尾的计数器名
+//   之后每条采样：u64 周期 | u64 提交指令数 | n × u32 计数器值
+#define COUNTER_FILE_VERSION 1
+
+class CounterSampler {
+    private:
+    VCPU* cpu = nullptr;
+    uint32_t interval = 0;
+    std::ofstream fout;
+    std::vector<uint32_t> values;
+
+    public:
+    CounterSampler(VCPU* cpu, uint32_t interval): cpu(cpu), interval(interval) {}
+    bool open(const std::string& path);
+    inline bool due(uint64_t cycles) {
+        return cycles % interval == 0;
+    }
+    void sample(uint64_t cycles, uint64_t insts);
+    void close() {
+        fout.close();
+    }
+};
+
+#endif
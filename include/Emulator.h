@@ -2,18 +2,42 @@
 #define EMULATOR_HH
 
 #include <cstdint>
+#include <vector>
 #include "AXIMemory.h"
 #include "Statistic.h"
 #include "Simulator.h"
+#include "PcProfile.h"
+#include "WaveDumper.h"
+#include "CounterSampler.h"
 
 #define NCOMMIT 2
 
+struct EmulatorOptions {
+    // 在 cachelog.log 中额外记录每条提交的 load/store 访存地址（含命中）
+    bool logDCacheAccess = false;
+    // 在 mispredict.log 中记录预测失败的分支（seq,pc），作为 trace_branches.py 推断结果的对照
+    bool logMispredict = false;
+    // 不写 base.log，只在仿真器内按 PC 聚合，退出时写出 pcprofile.csv
+    bool aggregate = false;
+    // 快进：先用功能模型 Simulator 执行 ffInsts 条指令（ffPC >= 0 时再执行到该 PC），
+    // 再把内存和寄存器交给 RTL，之后才开始周期精确仿真与 trace
+    uint64_t ffInsts = 0;
+    int64_t ffPC = -1;
+    // 用快进期间最后 ffWarmup 次访存的 cache 行预热 D-cache
+    uint32_t ffWarmup = 0;
+    // 恢复寄存器的代码段放置的地址（默认自动选择镜像之后未被访问过的区域）
+    int64_t ffStub = -1;
+    // 每隔 sampleInterval 个周期把 io_dbg_* 计数器写入 counters.bin（0 表示不采样）
+    uint32_t sampleInterval = 0;
+};
+
 class Emulator {
     private:
     VCPU* cpu = nullptr;
     AXIMemory* memory = nullptr;
     Statistic* stat = nullptr;
     Simulator* simulator = nullptr;
+    EmulatorOptions options;
 
 
     uint32_t baseAddr = 0x80000000;
@@ -23,8 +47,14 @@ class Emulator {
     uint8_t rnmTable[32] = {0};
     uint32_t stallCount = 0;
     
-    VerilatedVcdC *m_trace = nullptr;
-    uint64_t simTime = 0;
+    // 未启用波形时为 nullptr
+    WaveDumper *wave = nullptr;
+
+    // 快进后 RTL 先执行恢复寄存器的代码段，期间暂停 difftest 与 trace；
+    // 提交到 stubLast 时把被覆盖的字还原
+    bool inStub = false;
+    uint32_t stubLast = 0;
+    std::vector<uint32_t> stubPatched;
 
     inline uint32_t bits(uint32_t value, uint32_t hi, uint32_t lo) {
         return (value >> lo) & ~((-1) << (hi - lo + 1));
@@ -44,8 +74,9 @@ class Emulator {
         AXIMemory* memory, 
         Statistic* stat, 
         Simulator* simulator,
-        VerilatedVcdC *m_trace
-    ): cpu(cpu), memory(memory), stat(stat), simulator(simulator), m_trace(m_trace) {}
+        WaveDumper *wave,
+        EmulatorOptions options = EmulatorOptions()
+    ): cpu(cpu), memory(memory), stat(stat), simulator(simulator), options(options), wave(wave) {}
 
     
     inline bool simEnd(uint32_t instruction) {
@@ -55,6 +86,7 @@ class Emulator {
         return stallCount > stallThreshold;
     }
     void reset();
+    int fastForward();
     int step(uint32_t num,std::string imgName);
 
 };
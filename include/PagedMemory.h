@@ -0,0 +1,96 @@
+#ifndef PAGED_MEMORY_HH
+#define PAGED_MEMORY_HH
+
+#include <cstdint>
+#include <cstring>
+#include <algorithm>
+#include <memory>
+
+// 按字寻址的平坦分页内存：32 位地址空间切成 64 KiB 的页，一级页表直接按页号索引，
+// 页在第一次写入时才分配并清零。读未分配的页返回 0 且不分配。
+// 替代 unordered_map<uint32_t, uint32_t>：每次访问只有一次移位和一次数组下标，没有哈希和 rehash。
+class PagedMemory {
+    public:
+    static const uint32_t PAGE_BITS = 16;                       // 字节地址中的页内偏移位数
+    static const uint32_t PAGE_WORDS = 1u << (PAGE_BITS - 2);
+    static const uint32_t NUM_PAGES = 1u << (32 - PAGE_BITS);
+
+    private:
+    std::unique_ptr<std::unique_ptr<uint32_t[]>[]> pages;
+
+    static inline uint32_t pageOf(uint32_t wordAddr) {
+        return wordAddr >> (PAGE_BITS - 2);
+    }
+    static inline uint32_t offsetOf(uint32_t wordAddr) {
+        return wordAddr & (PAGE_WORDS - 1);
+    }
+    uint32_t* allocPage(uint32_t page) {
+        pages[page].reset(new uint32_t[PAGE_WORDS]());
+        return pages[page].get();
+    }
+
+    public:
+    PagedMemory(): pages(new std::unique_ptr<uint32_t[]>[NUM_PAGES]) {}
+    PagedMemory(const PagedMemory& other): PagedMemory() {
+        *this = other;
+    }
+    PagedMemory& operator=(const PagedMemory& other) {
+        if (this == &other) {
+            return *this;
+        }
+        for (uint32_t p = 0; p < NUM_PAGES; p++) {
+            if (!other.pages[p]) {
+                pages[p].reset();
+                continue;
+            }
+            uint32_t *dst = pages[p] ? pages[p].get() : allocPage(p);
+            std::memcpy(dst, other.pages[p].get(), PAGE_WORDS * sizeof(uint32_t));
+        }
+        return *this;
+    }
+
+    // 以下接口均以字地址（字节地址 >> 2）为参数，与原先 map 的 key 一致
+    inline uint32_t read(uint32_t wordAddr) const {
+        const uint32_t *page = pages[pageOf(wordAddr)].get();
+        return page ? page[offsetOf(wordAddr)] : 0;
+    }
+    inline uint32_t& at(uint32_t wordAddr) {
+        uint32_t page = pageOf(wordAddr);
+        uint32_t *p = pages[page] ? pages[page].get() : allocPage(page);
+        return p[offsetOf(wordAddr)];
+    }
+    inline void write(uint32_t wordAddr, uint32_t data) {
+        at(wordAddr) = data;
+    }
+    // 所在页是否分配过（被写过或属于镜像）
+    inline bool allocated(uint32_t wordAddr) const {
+        return pages[pageOf(wordAddr)] != nullptr;
+    }
+
+    // 连续 n 个字的突发读写，按页切块后整段拷贝
+    void readBurst(uint32_t wordAddr, uint32_t *out, uint32_t n) const {
+        while (n > 0) {
+            uint32_t chunk = std::min(n, PAGE_WORDS - offsetOf(wordAddr));
+            const uint32_t *page = pages[pageOf(wordAddr)].get();
+            if (page) {
+                std::memcpy(out, page + offsetOf(wordAddr), chunk * sizeof(uint32_t));
+            } else {
+                std::memset(out, 0, chunk * sizeof(uint32_t));
+            }
+            wordAddr += chunk;
+            out += chunk;
+            n -= chunk;
+        }
+    }
+    void writeBurst(uint32_t wordAddr, const uint32_t *in, uint32_t n) {
+        while (n > 0) {
+            uint32_t chunk = std::min(n, PAGE_WORDS - offsetOf(wordAddr));
+            std::memcpy(&at(wordAddr), in, chunk * sizeof(uint32_t));
+            wordAddr += chunk;
+            in += chunk;
+            n -= chunk;
+        }
+    }
+};
+
+#endif
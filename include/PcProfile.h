@@ -0,0 +1,46 @@
+#ifndef PC_PROFILE_HH
+#define PC_PROFILE_HH
+
+#include <cstdint>
+#include <string>
+#include <vector>
+#include "AXIMemory.h"
+#include "Simulator.h"
+
+// 与 trace.py 中 analyze_pipeline_stages 的划分一致
+#define NPROFILE_STAGES 5
+
+// 聚合模式下的按 PC 统计：开放寻址（线性探测）的扁平哈希表，
+// 每条提交的指令只更新一个表项，退出时一次性写出 pcprofile.csv
+struct PcProfileEntry {
+    uint32_t pc = 0;
+    bool used = false;
+    uint64_t count = 0;
+    uint64_t latency = 0;       // ∑ (retire - lastcommit)
+    double cycles = 0;          // ∑ latency / 同拍提交的指令数，即 pc_stats 中的 total_cycles
+    uint64_t missCycles = 0;    // 等待期间 D-cache 处于 miss 状态的周期
+    uint64_t stageCount[NPROFILE_STAGES] = {0};
+    uint64_t stageCycles[NPROFILE_STAGES] = {0};
+};
+
+class PcProfile {
+    private:
+    std::vector<PcProfileEntry> table;
+    uint32_t used = 0;
+
+    inline uint32_t slot(uint32_t pc) {
+        return ((pc >> 2) * 2654435761u) & (table.size() - 1);
+    }
+    void grow();
+
+    public:
+    PcProfile(uint32_t capacity = 4096): table(capacity) {}
+
+    PcProfileEntry& at(uint32_t pc);
+    // 按 analyze_pipeline_stages 的规则，从 lastcommit 所在的阶段开始累加各阶段耗时
+    void addStages(PcProfileEntry& e, uint64_t lastCmt, uint64_t dispatch, uint64_t readOp,
+                   uint64_t exe, uint64_t wb, uint64_t retire);
+    bool dump(const std::string& path, AXIMemory* memory, Simulator* simulator, uint64_t cycles);
+};
+
+#endif
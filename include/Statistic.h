@@ -28,6 +28,9 @@ class Statistic {
     inline uint32_t getCycles() {
         return cycles;
     }
+    inline uint32_t getInsts() {
+        return insts;
+    }
 
     inline double getIPC() {
         return insts * 1.0 / cycles;
@@ -0,0 +1,72 @@
+#ifndef WAVE_DUMPER_HH
+#define WAVE_DUMPER_HH
+
+#include <cstdint>
+#include <string>
+#include "VCPU.h"
+
+// 波形格式在 verilate 时决定（make WAVE_FORMAT=fst 会加 --trace-fst 并定义 WAVE_FST）
+#ifdef WAVE_FST
+#include "verilated_fst_c.h"
+typedef VerilatedFstC WaveTracer;
+#define WAVE_EXT ".fst"
+#else
+#include "verilated_vcd_c.h"
+typedef VerilatedVcdC WaveTracer;
+#define WAVE_EXT ".vcd"
+#endif
+
+struct WaveOptions {
+    // 只在 [begin, end) 周期内记录；默认整个运行
+    uint64_t begin = 0;
+    uint64_t end = UINT64_MAX;
+    // 该 PC 提交时开始记录，持续 after 个周期
+    int64_t triggerPC = -1;
+    uint64_t after = 10000;
+    // 滚动保留最近 ring 个周期（两个分段文件轮换），difftest 失败、卡死或触发时保留
+    uint64_t ring = 0;
+    bool fst = false;
+    int depth = 5;
+    std::string base = "waveform";
+};
+
+// 按需打开的波形记录器：未启用波形时不会被创建，仿真主循环里也不做任何 trace 相关的工作
+class WaveDumper {
+    private:
+    enum class State { IDLE, RING, ACTIVE, DONE };
+
+    VCPU* cpu = nullptr;
+    WaveOptions options;
+    WaveTracer* tracer = nullptr;
+    State state = State::IDLE;
+    uint64_t stopAt = UINT64_MAX;
+    // 滚动分段：segStart 为当前分段的起始周期，seg 为当前分段编号（0/1）
+    uint64_t segStart = 0;
+    int seg = 0;
+
+    std::string ringPath(int k) {
+        return options.base + ".ring" + std::to_string(k) + WAVE_EXT;
+    }
+    void openFile(const std::string& path);
+    void closeFile();
+    void keepRing(const std::string& reason);
+    void activate(uint64_t cycle, uint64_t until);
+
+    public:
+    WaveDumper(VCPU* cpu, WaveOptions options);
+    ~WaveDumper();
+
+    inline bool triggerArmed() {
+        return options.triggerPC >= 0 && (state == State::IDLE || state == State::RING);
+    }
+    // 每个时钟周期 eval 之后调用
+    void tick(uint64_t cycle);
+    // 提交一条指令时调用（只在 triggerArmed() 时需要）
+    void onCommit(uint32_t pc, uint64_t cycle);
+    // difftest 失败或长时间不提交：保留滚动窗口中的波形
+    void onFailure(const std::string& reason);
+    // 正常结束：关闭文件，删除未被保留的滚动分段
+    void finish();
+};
+
+#endif
@@ -0,0 +1,53 @@
+from bisect import bisect_right
+
+
+class IntervalUnion:
+    """
+    一组半开区间 [start, end) 的并集。
+    构造时排序 + 一次扫描合并重叠区间，并记录长度前缀和；
+    之后任意查询区间被覆盖的周期数只需两次二分，整体是 sweep-line 而不是嵌套循环。
+    """
+
+    def __init__(self, intervals):
+        self.starts = []
+        self.ends = []
+        for s, e in sorted(intervals):
+            if e <= s:
+                continue
+            if self.ends and s <= self.ends[-1]:
+                if e > self.ends[-1]:
+                    self.ends[-1] = e
+            else:
+                self.starts.append(s)
+                self.ends.append(e)
+        self.cum = [0]
+        for s, e in zip(self.starts, self.ends):
+            self.cum.append(self.cum[-1] + (e - s))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def total(self):
+        return self.cum[-1]
+
+    def _covered_before(self, x):
+        i = bisect_right(self.starts, x) - 1
+        if i < 0:
+            return 0
+        return self.cum[i] + min(x, self.ends[i]) - self.starts[i]
+
+    def covered(self, a, b):
+        """[a, b) 中被并集覆盖的长度"""
+        if b <= a or not self.starts:
+            return 0
+        return self._covered_before(b) - self._covered_before(a)
+
+
+def miss_intervals(cache_events):
+    """cachelog 事件 -> [(ts, ts + dur)]"""
+    return [(ev["ts"], ev["ts"] + ev["dur"]) for ev in cache_events]
+
+
+def axi_intervals(timeline_events, kind):
+    """trace_timeline.convert_trace_to_json 的结果中指定类型（STREAM/INST/DATA）的区间"""
+    return [(ev["ts"], ev["ts"] + ev["dur"]) for ev in timeline_events if ev["tid"] == kind]
@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+
+# ============================
+# 中间结果的内容寻址缓存
+# ============================
+# 键 = sha256(阶段名, 阶段版本, 输入指纹, 该阶段依赖的参数)，值为 pickle 后的结果，
+# 每个键一个文件 <root>/<key[:2]>/<key>.pkl。读取命中时刷新 mtime，
+# 淘汰时先删超过 max_age 的条目，再按 mtime 从旧到新删到总大小不超过 max_bytes。
+# 只依赖报告阈值的步骤不进入缓存键，改阈值后只重跑最后的报告步骤。
+
+DEFAULT_MAX_BYTES = 1 << 30
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+SUFFIX = ".pkl"
+_SAMPLE = 1 << 20
+
+
+def file_fingerprint(path):
+    """
+    文件大小 + mtime + 首尾各 1 MiB 内容的哈希；不存在的文件指纹为 None。
+    只改动中间部分、大小不变的重新仿真结果靠 mtime 区分（与 trace_index 的索引校验相同）。
+    """
+    if not path or not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    size = st.st_size
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        h.update(f.read(_SAMPLE))
+        if size > _SAMPLE:
+            f.seek(max(_SAMPLE, size - _SAMPLE))
+            h.update(f.read(_SAMPLE))
+    return f"{size}:{st.st_mtime_ns}:{h.hexdigest()}"
+
+
+class MemoStore:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(stage, version, fingerprint, params):
+        text = json.dumps([stage, version, fingerprint, params], sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + SUFFIX)
+
+    def get(self, key):
+        """返回 (是否命中, 值)"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # 读不出或类定义已不存在的条目按未命中处理
+            return False, None
+        os.utime(path)
+        return True, value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def cached(self, stage, version, fingerprint, params, compute):
+        """命中则直接返回缓存的值，否则调用 compute() 并写入缓存"""
+        key = self.key(stage, version, fingerprint, params)
+        hit, value = self.get(key)
+        if hit:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def entries(self):
+        """[(mtime, size, path)]"""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for d in os.listdir(self.root):
+            sub = os.path.join(self.root, d)
+            if not os.path.isdir(sub):
+                continue
+            for name in os.listdir(sub):
+                if not name.endswith(SUFFIX):
+                    continue
+                path = os.path.join(sub, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def evict(self):
+        now = time.time()
+        entries = sorted(self.entries())
+        kept = []
+        for mtime, size, path in entries:
+            if now - mtime > self.max_age:
+                os.remove(path)
+            else:
+                kept.append((mtime, size, path))
+        total = sum(size for _, size, _ in kept)
+        for mtime, size, path in kept:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+
+def store_for(output_dir, max_mb=None, max_days=None):
+    """profiling/<img>/.memo 下的缓存"""
+    return MemoStore(
+        os.path.join(output_dir, ".memo"),
+        int(max_mb * (1 << 20)) if max_mb is not None else DEFAULT_MAX_BYTES,
+        max_days * 24 * 3600 if max_days is not None else DEFAULT_MAX_AGE,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看或清理 profiling/<img>/.memo 下的中间结果缓存")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--clear", action="store_true", help="删除全部缓存条目")
+    args = parser.parse_args()
+
+    store = store_for(os.path.join("profiling", args.img + "-riscv32"))
+    if args.clear:
+        store.clear()
+        print(f"✅ 已清空 {store.root}")
+        return
+    entries = store.entries()
+    total = sum(size for _, size, _ in entries)
+    print(f"{store.root}: {len(entries)} 个条目，共 {total / (1 << 20):.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
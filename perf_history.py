@@ -0,0 +1,329 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+import memo_store
+
+# ============================
+# 性能历史库与回归检测
+# ============================
+# 每次仿真都会覆盖 reports/report-<img>.md 和 profiling/<img>/blkinfo，这里把它们的摘要追加到 SQLite：
+#   runs     每次运行一行：镜像、git commit、时间、总周期/指令/IPC，以及该次运行的指纹
+#   metrics  报告中各表的数值列，名为 "<行名>/<列名>"，如 "DCache Read/命中率"、"重排序缓存满/停顿率"
+#   blocks   blkinfo 中各基本块的总周期，按起始 PC 标识（block_id 在不同运行之间不稳定）
+# 指纹由 commit、报告的 mtime 和报告/blkinfo 的内容组成，同一次运行重复 ingest 会被跳过，
+# 因此每次仿真后都可以无条件执行 ingest；数值相同的新运行仍然各记一条。
+# regress 把每个镜像最新一次运行与之前 --window 次运行的均值比较：
+#   z = (最新值 - 均值) / max(标准差, 均值 × --noise)
+# 仿真是确定性的，同一 commit 的重复运行标准差为 0，--noise 给出可忽略的相对变化下限。
+# 只在“变差”的方向上报告：周期数、停顿率变大，IPC、命中率、预测正确率变小。
+
+DEFAULT_DB = "perf_history.db"
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    img TEXT NOT NULL,
+    fingerprint TEXT NOT NULL UNIQUE,
+    git_commit TEXT,
+    git_dirty INTEGER,
+    label TEXT,
+    run_time REAL NOT NULL,
+    ingest_time REAL NOT NULL,
+    cycles INTEGER,
+    insts INTEGER,
+    ipc REAL
+);
+CREATE INDEX IF NOT EXISTS runs_img ON runs (img, run_time);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    pc TEXT NOT NULL,
+    func TEXT,
+    cycles INTEGER NOT NULL,
+    iterations INTEGER,
+    ipc REAL,
+    PRIMARY KEY (run_id, pc)
+);
+"""
+
+# 报告中的列名 -> 变差方向（+1 表示变大为差，-1 表示变小为差）；不在表中的列只记录不检测
+COLUMN_DIRECTION = {
+    "命中率": -1,
+    "预测正确率": -1,
+    "停顿率": +1,
+}
+SUMMARY_DIRECTION = {"cycles": +1, "ipc": -1}
+
+BLOCK_LINE = re.compile(r"^Block (\d+): 函数=(\S+), 总cycles=(\d+), .*?迭代次数 (\d+), .*?当前IPC=([\d.]+)")
+DETAIL_LINE = re.compile(r"^=== 基本块 (\d+) \((0x[0-9a-fA-F]+) ")
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _number(text):
+    text = text.strip().rstrip("%")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_report(path):
+    """
+    返回 (summary, metrics)。summary 为 {"cycles", "insts", "ipc"}，
+    metrics 为 {"<行名>/<列名>": 数值}，百分比去掉 % 后按数值保存。
+    """
+    summary, metrics = {}, {}
+    header = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith("|"):
+                header = None
+                continue
+            cells = [c.strip() for c in line.strip("|").split("|")]
+            if header is None:
+                header = cells
+                continue
+            if all(set(c) <= set("-: ") for c in cells):
+                continue
+            if header[0] == "程序名":
+                summary = {"cycles": int(_number(cells[1])), "insts": int(_number(cells[2])), "ipc": _number(cells[3])}
+                continue
+            for col, cell in zip(header[1:], cells[1:]):
+                value = _number(cell)
+                if value is not None:
+                    metrics[f"{cells[0]}/{col}"] = value
+    return summary, metrics
+
+
+def parse_blkinfo(path):
+    """[(pc, 函数, 总周期, 迭代次数, IPC)]；PC 取自对应的 "=== 基本块 N (pc ...) ===" 明细标题"""
+    summary, pc_of = [], {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.startswith("Block "):
+                m = BLOCK_LINE.match(line)
+                if m:
+                    summary.append(m.groups())
+            elif line.startswith("=== 基本块"):
+                m = DETAIL_LINE.match(line)
+                if m:
+                    pc_of[m.group(1)] = m.group(2)
+    result = []
+    for block_id, func, cycles, iterations, ipc in summary:
+        pc = pc_of.get(block_id)
+        if pc is not None:
+            result.append((pc, None if func == "-" else func, int(cycles), int(iterations), float(ipc)))
+    return result
+
+
+def git_commit(repo=REPO_DIR):
+    """(短 commit, 是否有未提交修改)；不在 git 仓库中时为 (None, None)"""
+    try:
+        commit = subprocess.run(["git", "-C", repo, "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "-C", repo, "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, int(dirty)
+
+
+def run_fingerprint(report_file, blkinfo_file, commit):
+    """
+    一次仿真对应一个指纹：commit + 报告的 mtime + 报告与 blkinfo 的内容。
+    重复 ingest 同一次运行会被跳过；新的运行即使数值完全相同也会另记一条。
+    """
+    h = hashlib.sha256()
+    h.update(str(commit).encode())
+    h.update(str(os.stat(report_file).st_mtime_ns).encode())
+    for path in (report_file, blkinfo_file):
+        h.update(str(memo_store.file_fingerprint(path)).encode())
+    return h.hexdigest()
+
+
+def ingest(conn, root, imgname, commit=None, dirty=None, label=None):
+    """
+    把 <root>/reports/report-<imgname>.md 和 <root>/profiling/<imgname>/blkinfo 写入历史库。
+    返回新 run 的 id；报告不存在或该运行已入库时返回 None。
+    """
+    report_file = os.path.join(root, "reports", f"report-{imgname}.md")
+    blkinfo_file = os.path.join(root, "profiling", imgname, "blkinfo")
+    if not os.path.exists(report_file):
+        return None
+    if commit is None:
+        commit, dirty = git_commit()
+    fingerprint = run_fingerprint(report_file, blkinfo_file, commit)
+    if conn.execute("SELECT 1 FROM runs WHERE fingerprint = ?", (fingerprint,)).fetchone():
+        return None
+    summary, metrics = parse_report(report_file)
+    blocks = parse_blkinfo(blkinfo_file) if os.path.exists(blkinfo_file) else []
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO runs (img, fingerprint, git_commit, git_dirty, label, run_time, ingest_time, cycles, insts, ipc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (imgname, fingerprint, commit, dirty, label, os.path.getmtime(report_file), time.time(),
+             summary.get("cycles"), summary.get("insts"), summary.get("ipc")))
+        run_id = cur.lastrowid
+        conn.executemany("INSERT OR REPLACE INTO metrics VALUES (?, ?, ?)",
+                         [(run_id, name, value) for name, value in metrics.items()])
+        conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+                         [(run_id,) + b for b in blocks])
+    return run_id
+
+
+def direction_of(name):
+    return COLUMN_DIRECTION.get(name.rsplit("/", 1)[-1])
+
+
+def check(latest, baseline, direction, z_threshold, noise):
+    """返回 (均值, 标准差, z)；不构成回归时返回 None"""
+    mean = statistics.fmean(baseline)
+    std = statistics.stdev(baseline) if len(baseline) > 1 else 0.0
+    sigma = max(std, abs(mean) * noise)
+    delta = (latest - mean) * direction
+    if delta <= 0:
+        return None
+    z = delta / sigma if sigma else float("inf")
+    return (mean, std, z) if z >= z_threshold else None
+
+
+def regressions(conn, img, window, z_threshold, noise, min_runs, hot_blocks):
+    """最新一次运行相对前 window 次运行的回归：[(类别, 名称, 最新值, 均值, 标准差, z)]"""
+    runs = conn.execute("SELECT id, cycles, ipc FROM runs WHERE img = ? ORDER BY run_time DESC, id DESC LIMIT ?",
+                        (img, window + 1)).fetchall()
+    if len(runs) < min_runs + 1:
+        return None, []
+    latest, base = runs[0], runs[1:]
+    base_ids = [r[0] for r in base]
+    marks = ",".join("?" * len(base_ids))
+    found = []
+
+    for col, name in ((1, "cycles"), (2, "ipc")):
+        values = [r[col] for r in base if r[col] is not None]
+        if latest[col] is None or len(values) < min_runs:
+            continue
+        hit = check(latest[col], values, SUMMARY_DIRECTION[name], z_threshold, noise)
+        if hit:
+            found.append(("summary", name, latest[col]) + hit)
+
+    for name, value in conn.execute("SELECT name, value FROM metrics WHERE run_id = ?", (latest[0],)):
+        direction = direction_of(name)
+        if direction is None:
+            continue
+        values = [v for (v,) in conn.execute(
+            f"SELECT value FROM metrics WHERE name = ? AND run_id IN ({marks})", [name] + base_ids)]
+        if len(values) < min_runs:
+            continue
+        hit = check(value, values, direction, z_threshold, noise)
+        if hit:
+            found.append(("metric", name, value) + hit)
+
+    hot = conn.execute("SELECT pc, func, cycles FROM blocks WHERE run_id = ? ORDER BY cycles DESC LIMIT ?",
+                       (latest[0], hot_blocks)).fetchall()
+    for pc, func, cycles in hot:
+        values = [v for (v,) in conn.execute(
+            f"SELECT cycles FROM blocks WHERE pc = ? AND run_id IN ({marks})", [pc] + base_ids)]
+        if len(values) < min_runs:
+            continue
+        hit = check(cycles, values, +1, z_threshold, noise)
+        if hit:
+            found.append(("block", f"{pc} {func or '-'}", cycles) + hit)
+    return latest[0], found
+
+
+def cmd_ingest(args):
+    conn = connect(args.db)
+    commit, dirty = (args.commit, None) if args.commit else git_commit()
+    added = skipped = 0
+    for img in args.img:
+        run_id = ingest(conn, args.root, img + "-riscv32", commit, dirty, args.label)
+        if run_id is None:
+            skipped += 1
+        else:
+            added += 1
+    print(f"✅ 新增 {added} 次运行，跳过 {skipped} 个（已入库或没有报告），历史库 {args.db}")
+
+
+def cmd_regress(args):
+    conn = connect(args.db)
+    imgs = [i + "-riscv32" for i in args.img] if args.img else \
+        [r[0] for r in conn.execute("SELECT DISTINCT img FROM runs ORDER BY img")]
+    total = 0
+    for img in imgs:
+        run_id, found = regressions(conn, img, args.window, args.z, args.noise, args.min_runs, args.hot_blocks)
+        if run_id is None:
+            print(f"[-] {img}: 历史运行不足 {args.min_runs + 1} 次，跳过")
+            continue
+        commit = conn.execute("SELECT git_commit FROM runs WHERE id = ?", (run_id,)).fetchone()[0]
+        if not found:
+            print(f"[ok] {img} @ {commit or '-'}: 无回归")
+            continue
+        total += len(found)
+        print(f"[!!] {img} @ {commit or '-'}: {len(found)} 项回归")
+        for kind, name, value, mean, std, z in found:
+            print(f"     {kind:<8}{name:<32} {value:>14.4f}  基线 {mean:.4f} ± {std:.4f}  z={z:.1f}")
+    return 1 if total else 0
+
+
+def cmd_show(args):
+    conn = connect(args.db)
+    rows = conn.execute("SELECT id, datetime(run_time, 'unixepoch', 'localtime'), git_commit, git_dirty, label, "
+                        "cycles, insts, ipc FROM runs WHERE img = ? ORDER BY run_time DESC, id DESC LIMIT ?",
+                        (args.img + "-riscv32", args.limit)).fetchall()
+    print(f"{'id':>5}  {'时间':<19}  {'commit':<10} {'cycles':>12} {'insts':>12} {'IPC':>7}  label")
+    for rid, when, commit, dirty, label, cycles, insts, ipc in rows:
+        commit = (commit or "-") + ("*" if dirty else "")
+        print(f"{rid:>5}  {when:<19}  {commit:<10} {cycles or 0:>12} {insts or 0:>12} {ipc or 0:>7.3f}  {label or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能历史库：记录每次运行的报告摘要，并检测相对滚动基线的回归")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite 历史库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="把 reports/ 和 profiling/ 下的结果写入历史库（已入库的自动跳过）")
+    p.add_argument("img", nargs="+", help="镜像名（不含 -riscv32 后缀）")
+    p.add_argument("--root", default=".", help="reports/ 与 profiling/ 所在目录")
+    p.add_argument("--commit", help="记录的 commit（默认取本仓库 HEAD）")
+    p.add_argument("--label", help="附加标签，如硬件配置名")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("regress", help="最新一次运行相对之前若干次运行的回归")
+    p.add_argument("img", nargs="*", help="镜像名（不含 -riscv32 后缀），默认全部")
+    p.add_argument("--window", type=int, default=10, help="基线取之前的运行次数")
+    p.add_argument("--min-runs", type=int, default=2, help="基线至少需要的运行次数")
+    p.add_argument("--z", type=float, default=3.0, help="z 分数阈值")
+    p.add_argument("--noise", type=float, default=0.005, help="相对变化下限（标准差至少取 均值 × noise）")
+    p.add_argument("--hot-blocks", type=int, default=20, help="检测最新运行中周期最多的前 N 个基本块")
+    p.set_defaults(func=cmd_regress)
+
+    p = sub.add_parser("show", help="列出某个镜像的历史运行")
+    p.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=cmd_show)
+
+    args = parser.parse_args()
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+import argparse
+import os
+from collections import defaultdict
+
+from analyze_sublayer_misses import ACCESS_KINDS
+from cache_sim import DEFAULT_REGIONS
+from elf_symbols import load_symbols, resolve_regions
+
+# ============================
+# LRU 栈距离（reuse distance）
+# ============================
+# 以“时间戳”为下标的 Fenwick 树：每条 cache 行只在它最近一次访问的时间戳上置 1，
+# 两次访问之间的不同行数 = 两个时间戳之间 1 的个数，单次查询/更新 O(log n)。
+# 时间戳用满容量后把存活的行按最近访问顺序重新编号为 0..k-1，
+# 因此内存只与不同 cache 行数成正比，与访问总数无关。
+
+
+class Fenwick:
+    def __init__(self, n):
+        self.n = n
+        self.tree = [0] * (n + 1)
+
+    @classmethod
+    def ones(cls, n, k):
+        """前 k 个位置为 1 的树，O(n) 构建"""
+        fw = cls(n)
+        tree = fw.tree
+        for i in range(1, k + 1):
+            tree[i] += 1
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        for i in range(k + 1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        return fw
+
+    def add(self, i, v):
+        i += 1
+        n, tree = self.n, self.tree
+        while i <= n:
+            tree[i] += v
+            i += i & -i
+
+    def prefix(self, i):
+        """[0, i) 的和"""
+        s = 0
+        tree = self.tree
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+
+class ReuseDistanceTracker:
+    def __init__(self, min_capacity=1 << 16):
+        self.min_capacity = min_capacity
+        self.capacity = min_capacity
+        self.fw = Fenwick(self.capacity)
+        self.last = {}      # line -> 最近一次访问的时间戳
+        self.now = 0
+
+    def _compact(self):
+        live = sorted(self.last.items(), key=lambda kv: kv[1])
+        k = len(live)
+        self.capacity = max(self.min_capacity, 2 * k)
+        self.fw = Fenwick.ones(self.capacity, k)
+        self.last = {line: i for i, (line, _) in enumerate(live)}
+        self.now = k
+
+    def access(self, line):
+        """返回栈距离（两次访问之间的不同行数），首次访问返回 -1"""
+        if self.now >= self.capacity:
+            self._compact()
+        slot = self.last.get(line)
+        if slot is None:
+            dist = -1
+        else:
+            dist = len(self.last) - self.fw.prefix(slot + 1)
+            self.fw.add(slot, -1)
+        self.fw.add(self.now, 1)
+        self.last[line] = self.now
+        self.now += 1
+        return dist
+
+
+# ============================
+# 直方图：log2 分桶，bin b 表示距离落在 [2^(b-1), 2^b)（bin 0 表示距离 0）
+# ============================
+class Histogram:
+    __slots__ = ("cold", "bins")
+
+    def __init__(self):
+        self.cold = 0
+        self.bins = []
+
+    def add(self, dist):
+        if dist < 0:
+            self.cold += 1
+            return
+        b = dist.bit_length()
+        if b >= len(self.bins):
+            self.bins.extend([0] * (b + 1 - len(self.bins)))
+        self.bins[b] += 1
+
+    def total(self):
+        return self.cold + sum(self.bins)
+
+    def hits_below(self, size_lines):
+        """全相联 LRU、容量为 size_lines（2 的幂）时的命中次数：距离 < size_lines"""
+        limit = size_lines.bit_length()  # 距离 < 2^(limit-1) 的桶为 0..limit-1
+        return sum(self.bins[:limit])
+
+
+def bin_label(b):
+    if b == 0:
+        return "0"
+    lo, hi = 1 << (b - 1), (1 << b) - 1
+    return str(lo) if lo == hi else f"{lo}-{hi}"
+
+
+def iter_accesses(filename):
+    """流式读取 cachelog.log 中的访问行，产出 (addr, kind, pc)"""
+    with open(filename) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 4 or parts[3] not in ACCESS_KINDS:
+                continue
+            try:
+                addr = int(parts[2], 16)
+                pc = parts[4] if len(parts) > 4 else ""
+            except ValueError:
+                continue
+            yield addr, parts[3], pc
+
+
+def profile(filename, line_size, regions):
+    offset_bits = line_size.bit_length() - 1
+    tracker = ReuseDistanceTracker()
+    overall = Histogram()
+    by_region = defaultdict(Histogram)
+    by_pc = defaultdict(Histogram)
+    for addr, kind, pc in iter_accesses(filename):
+        dist = tracker.access(addr >> offset_bits)
+        overall.add(dist)
+        region = "other"
+        for name, lo, hi in regions:
+            if lo <= addr <= hi:
+                region = name
+                break
+        by_region[region].add(dist)
+        if kind == "R":
+            by_pc[pc].add(dist)
+    return overall, by_region, by_pc, len(tracker.last)
+
+
+def write_histograms(output_file, overall, by_region, by_pc):
+    n_bins = max([len(overall.bins)] + [len(h.bins) for h in by_region.values()] + [len(h.bins) for h in by_pc.values()])
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("scope,key,accesses,cold," + ",".join(bin_label(b) for b in range(n_bins)) + "\n")
+
+        def row(scope, key, h):
+            bins = h.bins + [0] * (n_bins - len(h.bins))
+            f.write(f"{scope},{key},{h.total()},{h.cold}," + ",".join(str(v) for v in bins) + "\n")
+
+        row("all", "all", overall)
+        for name, h in sorted(by_region.items()):
+            row("region", name, h)
+        for pc, h in sorted(by_pc.items(), key=lambda kv: kv[1].total(), reverse=True):
+            row("load_pc", pc, h)
+    print(f"✅ 栈距离直方图写入 {output_file}")
+
+
+def write_hit_rates(output_file, overall, by_region, line_size, distinct_lines):
+    """由直方图直接读出每个 2 的幂容量的全相联 LRU 命中率"""
+    names = sorted(by_region)
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("cache_lines,cache_bytes,hit_rate," + ",".join(f"{n}_hit_rate" for n in names) + "\n")
+        size = 1
+        while True:
+            total = overall.total()
+            rates = [overall.hits_below(size) / total if total else 0]
+            for n in names:
+                h = by_region[n]
+                rates.append(h.hits_below(size) / h.total() if h.total() else 0)
+            f.write(f"{size},{size * line_size}," + ",".join(f"{r:.4f}" for r in rates) + "\n")
+            if size >= distinct_lines:
+                break
+            size <<= 1
+    print(f"✅ 全相联命中率曲线写入 {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按地址区间和 load PC 统计 LRU 栈距离")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--line", type=int, default=64, help="cache 行大小（字节）")
+    parser.add_argument("--region", action="append",
+                        help="地址区间 name:lo:hi、name:符号 或 符号（可重复，默认 twiddle/output）")
+    parser.add_argument("--elf", help="镜像的 ELF 文件，用于按符号名定义区间")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    cache_file = os.path.join(output_dir, "cachelog.log")
+
+    try:
+        regions = resolve_regions(args.region, load_symbols(args.elf)) if args.region else DEFAULT_REGIONS
+    except KeyError as e:
+        parser.error(e.args[0])
+    overall, by_region, by_pc, distinct = profile(cache_file, args.line, regions)
+    if not overall.total():
+        print("⚠️ cachelog.log 中没有访问记录，请用 `make run ARGS=--log-dcache-access` 重新仿真")
+        return
+    print(f"[*] {overall.total()} 次访问，{distinct} 条不同 cache 行")
+    write_histograms(os.path.join(output_dir, "reuse_hist.csv"), overall, by_region, by_pc)
+    write_hit_rates(os.path.join(output_dir, "reuse_hitrate.csv"), overall, by_region, args.line, distinct)
+
+
+if __name__ == "__main__":
+    main()
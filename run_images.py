@@ -0,0 +1,302 @@
+import argparse
+import glob
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import perf_history
+
+# ============================
+# 多镜像并行仿真 + 分析
+# ============================
+# 每个镜像在 <out>/<img>/ 下单独运行 VCPU（仿真器把 profiling/、reports/、波形都写在当前目录），
+# 仿真结束后立即把分析脚本提交到另一个线程池，与其它镜像的仿真重叠执行。
+# 并发数默认取 min(CPU 核数, 可用内存 / --mem-per-run)。
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BINARY = os.path.join(REPO_DIR, "build", "VCPU")
+DEFAULT_ANALYSIS = "trace.py"
+
+# 与 main.cc / Emulator::step 的返回值一致
+STATUS = {
+    0: "pass",
+    -1: "a0_nonzero",
+    -2: "difftest_failed",
+    -3: "stall",
+    -4: "io_error",
+    -5: "ff_failed",
+}
+PERF_RE = re.compile(r"Total cycles: (\d+), Total insts: (\d+), IPC: ([\d.eE+-]+|nan|inf)")
+
+_print_lock = threading.Lock()
+
+
+def log(msg):
+    with _print_lock:
+        print(msg, flush=True)
+
+
+class Children:
+    """
+    正在运行的子进程。每个子进程单独一个进程组（VCPU 会起打印线程，超时时要整组结束），
+    因此终端的 Ctrl-C 到不了它们，中断时由 kill_all 统一结束，之后不再启动新进程。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.procs = set()
+        self.stopping = False
+
+    def start(self, cmd, **kwargs):
+        """启动子进程；已经在中断时返回 None"""
+        with self.lock:
+            if self.stopping:
+                return None
+            proc = subprocess.Popen(cmd, start_new_session=True, **kwargs)
+            self.procs.add(proc)
+            return proc
+
+    def done(self, proc):
+        with self.lock:
+            self.procs.discard(proc)
+
+    def kill_all(self):
+        with self.lock:
+            self.stopping = True
+            for proc in self.procs:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+
+_children = Children()
+
+
+def available_memory():
+    """/proc/meminfo 中的 MemAvailable（字节），读不到时返回 None"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def default_jobs(mem_per_run):
+    jobs = os.cpu_count() or 1
+    mem = available_memory()
+    if mem is not None and mem_per_run > 0:
+        jobs = min(jobs, int(mem // (mem_per_run * (1 << 30))))
+    return max(1, jobs)
+
+
+def expand_images(specs):
+    images = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            images += sorted(glob.glob(os.path.join(spec, "*.bin")))
+        else:
+            images += sorted(glob.glob(spec)) or [spec]
+    return images
+
+
+def image_name(path):
+    """与 main.cc 相同：去掉目录和扩展名"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def signed_code(returncode):
+    if returncode is None:
+        return None
+    if returncode < 0:
+        return returncode  # 被信号终止
+    return returncode - 256 if returncode > 127 else returncode
+
+
+def status_of(code):
+    if code is None:
+        return "timeout"
+    if code in STATUS:
+        return STATUS[code]
+    return f"exit_{code}"
+
+
+class Run:
+    def __init__(self, image, run_dir):
+        self.image = os.path.abspath(image)
+        self.name = image_name(image)
+        self.run_dir = run_dir
+        self.code = None
+        self.status = "pending"
+        self.seconds = 0.0
+        self.cycles = self.insts = self.ipc = None
+        self.analysis = "-"
+
+
+def simulate(run, binary, extra_args, timeout):
+    os.makedirs(run.run_dir, exist_ok=True)
+    cmd = [binary, run.image] + extra_args
+    start = time.time()
+    with open(os.path.join(run.run_dir, "run.log"), "w") as out:
+        proc = _children.start(cmd, cwd=run.run_dir, stdout=out, stderr=subprocess.STDOUT)
+        if proc is None:
+            run.status = "interrupted"
+            return run
+        try:
+            proc.wait(timeout=timeout)
+            run.code = signed_code(proc.returncode)
+        except subprocess.TimeoutExpired:
+            # VCPU 会起打印线程，按进程组整体结束
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+            run.code = None
+        finally:
+            _children.done(proc)
+    run.seconds = time.time() - start
+    run.status = "interrupted" if _children.stopping else status_of(run.code)
+    with open(os.path.join(run.run_dir, "run.log"), errors="replace") as f:
+        for m in PERF_RE.finditer(f.read()):
+            run.cycles, run.insts, run.ipc = int(m.group(1)), int(m.group(2)), float(m.group(3))
+    log(f"[{run.status:>15}] {run.name}  {run.seconds:.1f}s" + (f"  IPC={run.ipc:.3f}" if run.ipc is not None else ""))
+    return run
+
+
+def analyze(run, scripts):
+    """在 run_dir 下依次运行分析脚本（脚本按 profiling/<img>-riscv32 查找输入）"""
+    img = run.name[:-len("-riscv32")] if run.name.endswith("-riscv32") else run.name
+    with open(os.path.join(run.run_dir, "analysis.log"), "w") as out:
+        for script in scripts:
+            cmd = [sys.executable, os.path.join(REPO_DIR, script), img]
+            out.write(f"$ {' '.join(cmd)}\n")
+            out.flush()
+            proc = _children.start(cmd, cwd=run.run_dir, stdout=out, stderr=subprocess.STDOUT)
+            if proc is None:
+                run.analysis = "interrupted"
+                return run
+            try:
+                ret = proc.wait()
+            finally:
+                _children.done(proc)
+            if _children.stopping:
+                run.analysis = "interrupted"
+                return run
+            if ret != 0:
+                run.analysis = f"{script} failed ({ret})"
+                log(f"[analysis failed] {run.name}: {script}")
+                return run
+    run.analysis = "ok"
+    log(f"[    analyzed   ] {run.name}")
+    return run
+
+
+def write_summary(runs, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("image,status,code,seconds,cycles,insts,ipc,analysis,run_dir\n")
+        for r in runs:
+            f.write(f"{r.name},{r.status},{'' if r.code is None else r.code},{r.seconds:.1f},"
+                    f"{'' if r.cycles is None else r.cycles},{'' if r.insts is None else r.insts},"
+                    f"{'' if r.ipc is None else f'{r.ipc:.4f}'},{r.analysis},{r.run_dir}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行仿真多个镜像，并在每个仿真结束后立即运行分析脚本")
+    parser.add_argument("images", nargs="+", help="镜像文件、通配符或目录（目录下的 *.bin）")
+    parser.add_argument("--binary", default=DEFAULT_BINARY, help="仿真器可执行文件（测试时可用 script/stub_vcpu.py）")
+    parser.add_argument("--args", default="", help="传给仿真器的额外参数，如 \"--log-mispredict --sample 10000\"")
+    parser.add_argument("--out", default="runs", help="输出目录，每个镜像一个子目录")
+    parser.add_argument("--jobs", type=int, help="并行仿真数（默认按 CPU 核数与可用内存）")
+    parser.add_argument("--mem-per-run", type=float, default=2.0, help="估计每个仿真占用的内存（GiB）")
+    parser.add_argument("--timeout", type=float, help="单个仿真的超时（秒），超时记为 timeout")
+    parser.add_argument("--analyze", default=DEFAULT_ANALYSIS,
+                        help="仿真结束后依次运行的分析脚本，逗号分隔（空字符串表示不分析）")
+    parser.add_argument("--analysis-jobs", type=int, default=2, help="并行分析数")
+    parser.add_argument("--analyze-failed", action="store_true", help="仿真未通过但有 base.log 时也运行分析")
+    parser.add_argument("--history", help="全部结束后把通过的运行写入该性能历史库（见 perf_history.py）")
+    args = parser.parse_args()
+
+    images = expand_images(args.images)
+    if not images:
+        print("⚠️ 没有找到镜像")
+        return 1
+    names = [image_name(p) for p in images]
+    if len(set(names)) != len(names):
+        print("⚠️ 镜像名重复，输出目录会冲突")
+        return 1
+    binary = os.path.abspath(args.binary)
+    extra_args = shlex.split(args.args)
+    scripts = [s for s in args.analyze.split(",") if s]
+    jobs = args.jobs or default_jobs(args.mem_per_run)
+    out_dir = os.path.abspath(args.out)
+    print(f"[*] {len(images)} 个镜像，并行 {jobs} 个仿真，{args.analysis_jobs} 个分析")
+
+    runs = [Run(p, os.path.join(out_dir, image_name(p))) for p in images]
+    analysis_pool = ThreadPoolExecutor(max_workers=max(1, args.analysis_jobs))
+    analysis_futures = []
+    futures_lock = threading.Lock()
+
+    def run_analysis(run):
+        try:
+            analyze(run, scripts)
+        except Exception as e:
+            run.analysis = f"error ({type(e).__name__})"
+            log(f"[analysis failed] {run.name}: {e}")
+        return run
+
+    def job(run):
+        try:
+            simulate(run, binary, extra_args, args.timeout)
+        except Exception as e:
+            run.status = "error"
+            log(f"[          error] {run.name}: {e}")
+            return run
+        has_trace = os.path.exists(os.path.join(run.run_dir, "profiling", run.name, "base.log"))
+        if scripts and has_trace and (run.code == 0 or args.analyze_failed):
+            with futures_lock:
+                analysis_futures.append(analysis_pool.submit(run_analysis, run))
+        return run
+
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    interrupted = False
+    try:
+        for fut in [pool.submit(job, r) for r in runs]:
+            fut.result()
+        for fut in analysis_futures:
+            fut.result()
+    except KeyboardInterrupt:
+        interrupted = True
+        print("⚠️ 收到中断，结束所有仿真与分析 ...", flush=True)
+        _children.kill_all()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        analysis_pool.shutdown(cancel_futures=True)
+    for r in runs:
+        if r.status == "pending":
+            r.status = "not_run"
+
+    if args.history:
+        conn = perf_history.connect(args.history)
+        commit, dirty = perf_history.git_commit()
+        added = sum(perf_history.ingest(conn, r.run_dir, r.name, commit, dirty) is not None
+                    for r in runs if r.code == 0)
+        print(f"[*] 新增 {added} 次运行到历史库 {args.history}")
+
+    summary = os.path.join(out_dir, "summary.csv")
+    write_summary(runs, summary)
+    passed = sum(r.code == 0 for r in runs)
+    print(f"✅ {passed}/{len(runs)} 通过，汇总写入 {summary}")
+    if interrupted:
+        return 130
+    return 0 if passed == len(runs) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+// AXIMemory 后端的访存吞吐微基准：unordered_map（原实现）与 PagedMemory 对比
+// 构建并运行：make membench
+#include <chrono>
+#include <cstdio>
+#include <cstdint>
+#include <random>
+#include <unordered_map>
+#include <vector>
+#include "PagedMemory.h"
+
+static const uint32_t BASE = 0x80000000u >> 2;
+static const uint32_t WORDS = 1u << 20;          // 4 MiB 的镜像区
+static const uint32_t OPS = 1u << 24;
+
+struct MapMemory {
+    std::unordered_map<uint32_t, uint32_t> m;
+    uint32_t read(uint32_t a) { return m[a]; }
+    void write(uint32_t a, uint32_t d) { m[a] = d; }
+};
+
+template <typename F>
+static void bench(const char *name, const char *backend, F f) {
+    auto t0 = std::chrono::steady_clock::now();
+    uint64_t sink = f();
+    double s = std::chrono::duration<double>(std::chrono::steady_clock::now() - t0).count();
+    std::printf("%-14s %-12s %8.1f Mops/s  (%llx)\n", name, backend, OPS / s / 1e6, (unsigned long long)sink);
+}
+
+template <typename M>
+static void run(const char *backend, const std::vector<uint32_t> &addrs) {
+    M mem;
+    bench("fill", backend, [&]() {
+        for (uint32_t i = 0; i < OPS; i++) {
+            mem.write(BASE + (i & (WORDS - 1)), i);
+        }
+        return (uint64_t)0;
+    });
+    bench("seq-read", backend, [&]() {
+        uint64_t acc = 0;
+        for (uint32_t i = 0; i < OPS; i++) {
+            acc += mem.read(BASE + (i & (WORDS - 1)));
+        }
+        return acc;
+    });
+    bench("rand-read", backend, [&]() {
+        uint64_t acc = 0;
+        for (uint32_t i = 0; i < OPS; i++) {
+            acc += mem.read(addrs[i & (addrs.size() - 1)]);
+        }
+        return acc;
+    });
+    bench("rand-rmw", backend, [&]() {
+        for (uint32_t i = 0; i < OPS; i++) {
+            uint32_t a = addrs[i & (addrs.size() - 1)];
+            mem.write(a, (mem.read(a) & 0xffffff00u) | (i & 0xff));
+        }
+        return (uint64_t)mem.read(addrs[0]);
+    });
+    // 逐拍访问的 8 拍突发，与 AXIMemory::read 的 R 状态一致
+    bench("burst8-beats", backend, [&]() {
+        uint64_t acc = 0;
+        for (uint32_t i = 0; i < OPS; i += 8) {
+            uint32_t line = addrs[(i >> 3) & (addrs.size() - 1)] & ~7u;
+            for (uint32_t b = 0; b < 8; b++) {
+                acc += mem.read(line + b);
+            }
+        }
+        return acc;
+    });
+}
+
+int main() {
+    std::mt19937 rng(1);
+    std::vector<uint32_t> addrs(1u << 16);
+    for (auto &a : addrs) {
+        // 大部分落在镜像区，少量落在栈附近的高地址
+        a = (rng() & 7) ? BASE + (rng() & (WORDS - 1)) : (0x88000000u >> 2) - (rng() & 0xffff);
+    }
+    run<MapMemory>("unordered_map", addrs);
+    run<PagedMemory>("paged", addrs);
+
+    // 整段突发接口
+    PagedMemory mem;
+    std::vector<uint32_t> buf(WORDS);
+    bench("burst-copy", "paged", [&]() {
+        for (uint32_t i = 0; i < OPS / WORDS / 2; i++) {
+            mem.writeBurst(BASE, buf.data(), WORDS);
+            mem.readBurst(BASE, buf.data(), WORDS);
+        }
+        return (uint64_t)buf[0];
+    });
+    return 0;
+}
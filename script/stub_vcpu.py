@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+import time
+import zlib
+
+# ============================
+# 用于测试 run_images.py 的 VCPU 替身
+# ============================
+# 命令行与 build/VCPU 一致（镜像路径 + 选项），在当前目录下写出与仿真器同格式的
+# profiling/<img>/base.log、cachelog.log、timeline.log 和 reports/report-<img>.md。
+# 镜像名中含 fail / difftest / stall / hang 时分别模拟 a0 != 0、difftest 失败、卡死（返回码 -1/-2/-3）和不退出。
+#   STUB_VCPU_DELAY   模拟的运行时间（秒，默认 0.2）
+#   STUB_VCPU_ITERS   内层循环次数（默认 200）
+
+BASE = 0x80000000
+LOOP = [
+    (0x10c, "lw a14, 0(a10)", 0),
+    (0x110, "lw a15, 4(a10)", 0),
+    (0x114, "mul a14, a14, a15", 0),
+    (0x118, "add a13, a13, a14", 0),
+    (0x11c, "sw a13, 8(a10)", 0),
+    (0x120, "addi a10, a10, 12", 0),
+    (0x124, "bne a10, a11, -24", 1),
+]
+PROLOGUE = [(0x000, "addi a8, a0, 0", 0), (0x004, "jal a1, 264", 1), (0x108, "addi a10, a0, 0", 0)]
+EPILOGUE = [(0x128, "jalr a0, a1, 0", 1), (0x008, "addi a10, a0, 0", 0), (0x00c, "unknown", 0)]
+
+
+def program(iters):
+    return PROLOGUE + LOOP * iters + EPILOGUE
+
+
+def simulate(stream, rng):
+    """按两条一组提交，随机延迟与 miss；返回 (base.log 行, miss, timeline, 总周期)"""
+    rows, misses, timeline = [], [], []
+    cycle, last_cmt = 10, 0
+    i = 0
+    while i < len(stream):
+        group = stream[i:i + (2 if rng.random() < 0.5 else 1)]
+        lat = rng.choice([1, 1, 2, 3])
+        if any(asm.startswith("lw") for _, asm, _ in group) and rng.random() < 0.15:
+            dur = rng.choice([6, 8, 40, 60])
+            misses.append((cycle, dur, 0x80010000 + rng.randrange(0, 4096, 4)))
+            timeline.append(f"start,4,{cycle + 1}")
+            timeline.append(f"end,4,{dur - 2},{cycle + dur}")
+            lat += dur
+        retire = cycle + lat
+        for off, asm, br in group:
+            f = retire - rng.randint(8, 14)
+            disp = f + 3
+            iss = disp + rng.randint(1, 3)
+            exe = iss + 2
+            wb = min(max(exe + 1, retire - rng.randint(1, 3)), retire)
+            rows.append(f'0x{BASE + off:x},"{asm}",{f},{f + 1},{f + 2},{disp},{iss},{iss + 1},{exe},{exe + 1},'
+                        f'{exe + 2},{wb},{min(wb + 1, retire)},{retire},{last_cmt},{br}')
+        last_cmt = cycle = retire
+        i += len(group)
+    return rows, misses, timeline, cycle
+
+
+def write_report(path, img, cycles, insts, rng):
+    ipc = insts / cycles
+    loads = insts * 2 // 7
+    hits = int(loads * rng.uniform(0.85, 0.95))
+    with open(path, "w") as f:
+        f.write("## 程序基本情况\n| 程序名 | 总周期数 | 总指令数 | IPC |\n| --- | --- | --- | --- |\n")
+        f.write(f"| {img} | {cycles} | {insts} | {ipc} |\n")
+        f.write("## 高速缓存\n| 高速缓存通道 | 访问次数 | 命中数 | 命中率 |\n| --- | --- | --- | --- |\n")
+        f.write(f"| ICache Read | {insts // 2} | {insts // 2 - 3} | {(insts // 2 - 3) * 100 / (insts // 2)}% |\n")
+        f.write(f"| DCache Read | {loads} | {hits} | {hits * 100 / loads}% |\n")
+        f.write("## 流水线停顿\n### 调度\n| 停顿原因 | 停顿周期数 | 停顿率 |\n| --- | --- | --- |\n")
+        rob = int(cycles * rng.uniform(0.05, 0.2))
+        f.write(f"| 重排序缓存满 | {rob} | {rob * 100 / cycles}% |\n")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: stub_vcpu.py IMAGE [options]", file=sys.stderr)
+        return 1
+    img_path = sys.argv[1]
+    img = os.path.splitext(os.path.basename(img_path))[0]
+    rng = random.Random(zlib.crc32(img.encode()))
+    print("========================================")
+    print("SIMULATION STARTED.", flush=True)
+    if "hang" in img:
+        while True:
+            time.sleep(1)
+    time.sleep(float(os.environ.get("STUB_VCPU_DELAY", "0.2")))
+
+    out = os.path.join("profiling", img)
+    os.makedirs(out, exist_ok=True)
+    os.makedirs("reports", exist_ok=True)
+    rows, misses, timeline, cycles = simulate(program(int(os.environ.get("STUB_VCPU_ITERS", "200"))), rng)
+    with open(os.path.join(out, "base.log"), "w") as f:
+        f.write("pc,asm,fetch,predecode,decode,dispatch,issue,readOp,exe,exe1,exe2,wb,wbROB,retire,lastcommit,is_branch\n")
+        f.write("\n".join(rows) + "\n")
+    with open(os.path.join(out, "cachelog.log"), "w") as f:
+        f.writelines(f"{ts},{dur},0x{addr:x}\n" for ts, dur, addr in misses)
+    with open(os.path.join(out, "timeline.log"), "w") as f:
+        f.writelines(line + "\n" for line in timeline)
+    write_report(os.path.join("reports", f"report-{img}.md"), img, cycles, len(rows), rng)
+
+    print("========================================")
+    ret = -3 if "stall" in img else -2 if "difftest" in img else -1 if "fail" in img else 0
+    message = {0: "SIMULATION ENDED SUCCESSFULLY.", -1: "SIMULATION ENDED WITH a0 != 0.",
+               -2: "DIFFTEST FAILED.", -3: "STALL FOR TOO LONG WITHOUT COMMITTING INSTRUCTIONS."}[ret]
+    print(message)
+    print(f"Total cycles: {cycles}, Total insts: {len(rows)}, IPC: {len(rows) / cycles}")
+    print("========================================")
+    return ret & 0xFF
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,12 @@
 #include "AXIMemory.h"
+#include <vector>
 
 AXIMemory::AXIMemory(std::string imgPath, uint32_t baseAddr, Device* device) {
     this->device = device;
 
     if(imgPath.empty()) {
-        memory.emplace(baseAddr >> 2, 0x80000000);
-        refMemory.emplace(baseAddr >> 2, 0x80000000);
+        memory.write(baseAddr >> 2, 0x80000000);
+        refMemory.write(baseAddr >> 2, 0x80000000);
         return;
     } 
     // open binary file
@@ -14,13 +15,14 @@ AXIMemory::AXIMemory(std::string imgPath, uint32_t baseAddr, Device* device) {
         return;
     }
     // read binary file to memory
+    std::vector<uint32_t> words;
     uint32_t word;
-    uint32_t addr = baseAddr >> 2;
     while(img.read(reinterpret_cast<char*>(&word), sizeof(uint32_t))) {
-        memory[addr] = word;
-        refMemory[addr] = word;
-        addr += 1;
+        words.push_back(word);
     }
+    memory.writeBurst(baseAddr >> 2, words.data(), words.size());
+    refMemory.writeBurst(baseAddr >> 2, words.data(), words.size());
+    imageEnd = baseAddr + words.size() * 4;
     img.close();
     srand(time(NULL));
     // generate random sequence
@@ -65,7 +67,7 @@ void AXIMemory::read(VCPU* cpu) {
                 uint32_t wordAddr = readConfig.araddr >> 2;
                 uint32_t wordOffset = readConfig.araddr & 0x3;
                 uint32_t shiftAmount = wordOffset << 3;
-                uint32_t word = memory[wordAddr] >> shiftAmount;
+                uint32_t word = memory.read(wordAddr) >> shiftAmount;
                 cpu->io_axi_rdata = word;
                 if(readConfig.arlen != 0) {
                     if(cpu->io_axi_rready) {
@@ -121,14 +123,14 @@ void AXIMemory::write(VCPU* cpu) {
                 if(wordAddr >> 26 == 0xa) {
                     device->write(writeConfig.awaddr, cpu->io_axi_wdata);
                 } else {
-                    uint32_t word = memory[wordAddr];
+                    uint32_t word = memory.read(wordAddr);
                     uint32_t wdataShift = cpu->io_axi_wdata << (wordOffset << 3);
                     for(int i = 0; i < 4; i++) {
                         if(wstrb & (1 << i)) {
                             word = (word & ~byteMasks[i]) | (wdataShift & byteMasks[i]);
                         }
                     }
-                    memory[wordAddr] = word;
+                    memory.write(wordAddr, word);
                 }
                 if(cpu->io_axi_wlast){
                     writeConfig.state = AXIWriteState::B;
@@ -154,23 +156,22 @@ void AXIMemory::write(VCPU* cpu) {
 }
 
 uint32_t AXIMemory::refMemoryRead(uint32_t addr) {
-    return refMemory[addr >> 2] >> ((addr & 0x3) << 3);
+    return refMemory.read(addr >> 2) >> ((addr & 0x3) << 3);
 }
 
 void AXIMemory::refMemoryWrite(uint32_t addr, uint32_t data, uint8_t wstrb) {
     uint32_t wordAddr = addr >> 2;
     uint32_t wordOffset = addr & 0x3;
     uint8_t wstrbShift = wstrb << wordOffset;
-    uint32_t word = refMemory[wordAddr];
+    uint32_t &word = refMemory.at(wordAddr);
     uint32_t wdataShift = data << (wordOffset << 3);
     for(int i = 0; i < 4; i++) {
         if(wstrbShift & (1 << i)) {
             word = (word & ~byteMasks[i]) | (wdataShift & byteMasks[i]);
         }
     }
-    refMemory[wordAddr] = word;
 }
 
 uint32_t AXIMemory::debugRead(uint32_t addr) {
-    return memory[addr >> 2] >> ((addr & 0x3) << 3);
+    return memory.read(addr >> 2) >> ((addr & 0x3) << 3);
 }
\ No newline at end of file
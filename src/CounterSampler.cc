@@ -0,0 +1,57 @@
+#include "CounterSampler.h"
+#include <iostream>
+#include <cstring>
+
+struct CounterDef {
+    const char *name;
+    uint32_t (*read)(VCPU* cpu);
+};
+
+#define COUNTER(field) {#field, [](VCPU* cpu) -> uint32_t { return cpu->io_dbg_##field; }}
+
+// 与 Statistic::printMarkdownReport 中使用的计数器一致
+static const CounterDef counterDefs[] = {
+    COUNTER(fte_ic_visit), COUNTER(fte_ic_hit), COUNTER(fte_ic_missCycle),
+    COUNTER(bke_lsPP_dc_0_visit), COUNTER(bke_lsPP_dc_0_hit), COUNTER(bke_lsPP_dc_0_missCycle),
+    COUNTER(bke_lsPP_dc_0_sbFullCycle),
+    COUNTER(bke_lsPP_dc_1_visit), COUNTER(bke_lsPP_dc_1_hit),
+    COUNTER(l2_0_visit), COUNTER(l2_0_hit), COUNTER(l2_1_visit), COUNTER(l2_1_hit),
+    COUNTER(cmt_bdb_branch), COUNTER(cmt_bdb_branchFail), COUNTER(cmt_bdb_call), COUNTER(cmt_bdb_callFail),
+    COUNTER(cmt_bdb_ret), COUNTER(cmt_bdb_retFail), COUNTER(cmt_bdb_fullCycle),
+    COUNTER(fte_fq_fullCycle), COUNTER(fte_fq_emptyCycle), COUNTER(fte_rnm_fList_fListEmptyCycle),
+    COUNTER(cmt_rob_fullCycle),
+    COUNTER(bke_arIQ_fullCycle), COUNTER(bke_mdIQ_fullCycle), COUNTER(bke_lsIQ_fullCycle),
+    COUNTER(bke_mdPP_srt2_busyCycle),
+};
+static const uint32_t numCounters = sizeof(counterDefs) / sizeof(counterDefs[0]);
+
+template <typename T>
+static void put(std::ofstream& f, T v) {
+    f.write(reinterpret_cast<const char*>(&v), sizeof(T));
+}
+
+bool CounterSampler::open(const std::string& path) {
+    fout.open(path, std::ios::binary);
+    if (!fout.is_open()) {
+        std::cerr << "failed to open " << path << "\n";
+        return false;
+    }
+    fout.write("ZCTR", 4);
+    put<uint32_t>(fout, COUNTER_FILE_VERSION);
+    put<uint32_t>(fout, interval);
+    put<uint32_t>(fout, numCounters);
+    for (uint32_t i = 0; i < numCounters; i++) {
+        fout.write(counterDefs[i].name, strlen(counterDefs[i].name) + 1);
+    }
+    values.resize(numCounters);
+    return true;
+}
+
+void CounterSampler::sample(uint64_t cycles, uint64_t insts) {
+    for (uint32_t i = 0; i < numCounters; i++) {
+        values[i] = counterDefs[i].read(cpu);
+    }
+    put<uint64_t>(fout, cycles);
+    put<uint64_t>(fout, insts);
+    fout.write(reinterpret_cast<const char*>(values.data()), numCounters * sizeof(uint32_t));
+}
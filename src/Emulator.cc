@@ -3,9 +3,12 @@
 #include <filesystem>
 #include <thread>
 #include <chrono>
+#include <algorithm>
+#include <unordered_map>
 #include "utils.h"
-//#define DUMP_WAVE
-// #define DUMP_WAVE 0
+
+// 预热时按 cache 行去重，与 trace-cache.py 中 L1 的行大小一致
+#define FF_LINE_BYTES 64u
 
 void Emulator::reset() {
     cpu->reset = 1;
@@ -43,16 +46,168 @@ uint32_t bits(uint32_t value, uint32_t hi, uint32_t lo){
     return (value >> lo) & ~((-1) << (hi - lo + 1));
 }
 
+// ---------------- 快进 ----------------
+// 指令编码
+static uint32_t encLui(uint8_t rd, uint32_t hi20) { return (hi20 << 12) | (rd << 7) | 0x37; }
+static uint32_t encAddi(uint8_t rd, uint8_t rs1, int32_t imm) { return ((imm & 0xfff) << 20) | (rs1 << 15) | (rd << 7) | 0x13; }
+static uint32_t encLw(uint8_t rd, uint8_t rs1, int32_t imm) { return ((imm & 0xfff) << 20) | (rs1 << 15) | (0x2 << 12) | (rd << 7) | 0x03; }
+static uint32_t encJalr(uint8_t rd, uint8_t rs1, int32_t imm) { return ((imm & 0xfff) << 20) | (rs1 << 15) | (rd << 7) | 0x67; }
+static uint32_t encJal(uint8_t rd, int32_t off) {
+    uint32_t imm = off;
+    return (((imm >> 20) & 0x1) << 31) | (((imm >> 1) & 0x3ff) << 21) | (((imm >> 11) & 0x1) << 20)
+         | (((imm >> 12) & 0xff) << 12) | (rd << 7) | 0x6f;
+}
+static bool jalReach(uint32_t from, uint32_t to) {
+    int64_t off = (int64_t)to - (int64_t)from;
+    return off >= -(1 << 20) && off < (1 << 20);
+}
+// value = (hi << 12) + lo，lo 为 12 位有符号数
+static void splitImm(uint32_t value, uint32_t &hi, int32_t &lo) {
+    hi = (value + 0x800) >> 12;
+    lo = (int32_t)(value - (hi << 12));
+}
+
+int Emulator::fastForward() {
+    if (options.ffInsts == 0 && options.ffPC < 0) {
+        return 0;
+    }
+    // 1. 功能模型执行到目标点，同时记录最近的访存地址
+    std::vector<uint32_t> recent(options.ffWarmup);
+    uint64_t nAccess = 0;
+    uint64_t executed = 0;
+    bool warnedStream = false;
+    while (executed < options.ffInsts || (options.ffPC >= 0 && simulator->getPC() != (uint32_t)options.ffPC)) {
+        uint32_t pc = simulator->getPC();
+        uint32_t inst = memory->refMemoryRead(pc);
+        if (simEnd(inst)) {
+            std::cerr << ANSI_FG_RED << "fast-forward: program ended at pc " << std::hex << pc << std::dec
+                      << " after " << executed << " instructions" << ANSI_NONE << std::endl;
+            return -5;
+        }
+        uint8_t opcode = bits(inst, 6, 0);
+        if (opcode == 0x0b && !warnedStream) {
+            // Simulator 不模拟 stream 单元，其状态无法交给 RTL
+            std::cerr << ANSI_FG_YELLOW << "fast-forward: stream instruction at pc " << std::hex << pc << std::dec
+                      << ", stream unit state is not transferred" << ANSI_NONE << std::endl;
+            warnedStream = true;
+        }
+        if (options.ffWarmup && (opcode == 0x03 || opcode == 0x23)) {
+            uint32_t imm = opcode == 0x03 ? (inst >> 20) : ((bits(inst, 31, 25) << 5) | bits(inst, 11, 7));
+            if (imm & 0x800) {
+                imm |= 0xFFFFF000;
+            }
+            recent[nAccess++ % options.ffWarmup] = simulator->getRf(bits(inst, 19, 15)) + imm;
+        }
+        simulator->step(1);
+        executed++;
+    }
+    uint32_t target = simulator->getPC();
+
+    // 2. 预热的 cache 行：按最近一次访问的先后排列，最近访问的最后加载
+    std::vector<uint32_t> lines;
+    std::unordered_map<uint32_t, bool> seen;
+    uint64_t nRecent = std::min<uint64_t>(nAccess, options.ffWarmup);
+    for (uint64_t k = 0; k < nRecent; k++) {
+        uint32_t line = recent[(nAccess - 1 - k) % options.ffWarmup] & ~(FF_LINE_BYTES - 1);
+        if ((line >> 28) == 0xa || seen.count(line)) {
+            continue;
+        }
+        seen[line] = true;
+        lines.push_back(line);
+    }
+    std::reverse(lines.begin(), lines.end());
+
+    // 3. 恢复代码段的位置：镜像之后、未被访问过、且能用 jal 跳到目标 PC
+    uint32_t stubBytes = (2 * lines.size() + 2 * 31 + 1) * 4;
+    uint32_t stub = 0;
+    auto untouched = [&](uint32_t base) {
+        for (uint32_t a = base; a < base + stubBytes; a += 4) {
+            if (memory->refMemoryTouched(a)) {
+                return false;
+            }
+        }
+        return true;
+    };
+    if (options.ffStub >= 0) {
+        stub = options.ffStub;
+    } else {
+        for (uint32_t base = (std::max(memory->imageEnd, baseAddr) + 0xfff) & ~0xfffu;
+             jalReach(base + stubBytes, target); base += 0x1000) {
+            if (untouched(base)) {
+                stub = base;
+                break;
+            }
+        }
+    }
+    if (stub == 0 || !jalReach(stub + stubBytes - 4, target)) {
+        std::cerr << ANSI_FG_RED << "fast-forward: no room for the register stub within jal range of pc "
+                  << std::hex << target << std::dec << ", use --ff-stub" << ANSI_NONE << std::endl;
+        return -5;
+    }
+    // 预热不能把代码段所在的行带进 cache
+    lines.erase(std::remove_if(lines.begin(), lines.end(), [&](uint32_t line) {
+        return line + FF_LINE_BYTES > stub && line < stub + stubBytes;
+    }), lines.end());
+
+    // 4. DUT 侧内存 = 参考模型内存，再写入代码段：预热 load、逐个恢复 x1..x31、跳到目标
+    memory->syncFromRef();
+    std::vector<uint32_t> code;
+    uint32_t hi;
+    int32_t lo;
+    for (uint32_t line : lines) {
+        splitImm(line, hi, lo);
+        code.push_back(encLui(1, hi));
+        code.push_back(encLw(2, 1, lo));
+    }
+    for (uint8_t r = 1; r < 32; r++) {
+        splitImm(simulator->getRf(r), hi, lo);
+        code.push_back(encLui(r, hi));
+        code.push_back(encAddi(r, r, lo));
+    }
+    uint32_t addr = stub;
+    for (uint32_t word : code) {
+        stubPatched.push_back(addr);
+        memory->debugWrite(addr, word);
+        addr += 4;
+    }
+    stubLast = addr;
+    stubPatched.push_back(addr);
+    memory->debugWrite(addr, encJal(0, target - addr));
+
+    // 复位向量处跳到代码段（x1 随后由代码段恢复）
+    stubPatched.push_back(baseAddr);
+    if (jalReach(baseAddr, stub)) {
+        memory->debugWrite(baseAddr, encJal(0, stub - baseAddr));
+    } else {
+        splitImm(stub, hi, lo);
+        memory->debugWrite(baseAddr, encLui(1, hi));
+        memory->debugWrite(baseAddr + 4, encJalr(0, 1, lo));
+        stubPatched.push_back(baseAddr + 4);
+    }
+    inStub = true;
+    std::cout << ANSI_FG_CYAN << "fast-forward: " << executed << " instructions, pc " << std::hex << target
+              << ", stub at " << stub << std::dec << " (" << code.size() + 1 << " instructions, "
+              << lines.size() << " warm-up lines)" << ANSI_NONE << std::endl;
+    return 0;
+}
+
 
 int Emulator::step(uint32_t num, std::string imgName) {
     std::string reportsDir = "profiling/" + imgName;
     if(!std::filesystem::exists(reportsDir)){
         std::filesystem::create_directories(reportsDir);
     }
-    std::ofstream baselog = std::ofstream(reportsDir + "/base.log");
+    std::ofstream baselog;
+    if (!options.aggregate) {
+        baselog.open(reportsDir + "/base.log");
+    } else {
+        // 删掉上一次运行留下的 trace，否则 trace.py 会分析旧的 base.log 而不是 pcprofile.csv
+        std::filesystem::remove(reportsDir + "/base.log");
+        std::filesystem::remove(reportsDir + "/base.log.idx");
+    }
     std::ofstream timelinelog = std::ofstream(reportsDir + "/timeline.log");
     std::ofstream cachelog = std::ofstream(reportsDir + "/cachelog.log");
-    if (!baselog.is_open()) {
+    if (!options.aggregate && !baselog.is_open()) {
         std::cerr << "failed to open base.log\n";
         return -4;
     }
@@ -64,6 +219,15 @@ int Emulator::step(uint32_t num, std::string imgName) {
         std::cerr << "failed to open cachelog.log\n";
         return -4;
     }
+    std::ofstream mispredictlog;
+    if (options.logMispredict) {
+        mispredictlog.open(reportsDir + "/mispredict.log");
+        if (!mispredictlog.is_open()) {
+            std::cerr << "failed to open mispredict.log\n";
+            return -4;
+        }
+        mispredictlog << "seq,pc" << std::endl;
+    }
 
     std::thread printThread([this](){
         while(true){
@@ -102,13 +266,47 @@ int Emulator::step(uint32_t num, std::string imgName) {
         "readOp", "exe", "exe1", "exe2", "wb", "wbROB"
     };
     const int numStages = sizeof(allCycles) / sizeof(allCycles[0]);
-    baselog << "pc,asm,fetch,predecode,decode,dispatch,issue,readOp,exe,exe1,exe2,wb,wbROB,retire,lastcommit,is_branch"
-            << std::endl;   ;
+    if (!options.aggregate) {
+        baselog << "pc,asm,fetch,predecode,decode,dispatch,issue,readOp,exe,exe1,exe2,wb,wbROB,retire,lastcommit,is_branch"
+                << std::endl;   ;
+    }
+    // 聚合模式：同拍提交的指令平分 retire - lastcommit；上次提交以来 D-cache 处于 miss 的周期记在本拍第一条提交的指令上
+    PcProfile profile;
+    uint64_t pendingMissCycles = 0;
+    bool firstCommit = true;
+    std::string profilePath = reportsDir + "/pcprofile.csv";
+    CounterSampler sampler(cpu, options.sampleInterval);
+    if (options.sampleInterval && !sampler.open(reportsDir + "/counters.bin")) {
+        return -4;
+    }
+    auto finishLogs = [&]() {
+        if (options.aggregate) {
+            profile.dump(profilePath, memory, simulator, stat->getCycles());
+        }
+        if (options.sampleInterval) {
+            // 最后一段不足一个间隔的采样
+            sampler.sample(stat->getCycles(), stat->getInsts());
+            sampler.close();
+        }
+    };
     int cacheMissing = 0;
     int cacheMissCycle = 0;
     int cacheMissAddr = 0;
+    // 预测失败计数器在分支提交的下一拍才更新：记住上一拍最后提交的分支，
+    // 计数器增加时把它记为预测失败（同一拍中更年轻的指令会被冲刷，至多一条失败）
+    uint32_t lastFailCount = 0;
+    int64_t lastBranchSeq = -1;
+    uint32_t lastBranchPC = 0;
     while(num-- > 0){
         stat->addCycles(1);
+        if (options.logMispredict) {
+            uint32_t failCount = cpu->io_dbg_cmt_bdb_branchFail + cpu->io_dbg_cmt_bdb_callFail + cpu->io_dbg_cmt_bdb_retFail;
+            if (failCount != lastFailCount && lastBranchSeq >= 0) {
+                mispredictlog << lastBranchSeq << ",0x" << std::hex << lastBranchPC << std::dec << "\n";
+            }
+            lastFailCount = failCount;
+            lastBranchSeq = -1;
+        }
         if (cpu->io_dbg_axi_rdDoneVec != 0) {
             timelinelog << "end" << ","
                     << +cpu->io_dbg_axi_rdDoneVec << ","
@@ -121,6 +319,7 @@ int Emulator::step(uint32_t num, std::string imgName) {
                     << stat->getCycles() << std::endl;
         }
         if (cpu->io_dbg_dcProfiling_rMiss != 0) {
+            pendingMissCycles++;
             if (cacheMissing == 0) {
                 cacheMissing = 1;
                 cacheMissCycle = stat->getCycles();
@@ -133,39 +332,98 @@ int Emulator::step(uint32_t num, std::string imgName) {
             << std::hex << cacheMissAddr << std::dec << std::endl;
         }
 
+        int cmtNum = 0;
+        int cmtSeen = 0;
+        for(int i = 0; i < NCOMMIT; i++){
+            cmtNum += *cmtVlds[i] ? 1 : 0;
+        }
         for(int i = 0; i < NCOMMIT; i++){
             if(stallForTooLong()){
+                finishLogs();
                 return -3;
             }
             if(*cmtVlds[i]){
                 stallCount = 0;
+                if(inStub) {
+                    // 快进后的恢复代码段：只维护重命名表，不做 difftest、不计入 trace
+                    uint32_t stubInst = memory->debugRead(*cmtPCs[i]);
+                    if(*cmtPrds[i] != 0){
+                        rnmTableUpdate(bits(stubInst, 11, 7), *cmtPrds[i]);
+                    }
+                    if(*cmtPCs[i] == stubLast) {
+                        for(uint32_t addr : stubPatched) {
+                            memory->debugWrite(addr, memory->refMemoryRead(addr));
+                        }
+                        inStub = false;
+                        std::cout << ANSI_FG_CYAN << "fast-forward: state restored at cycle " << stat->getCycles()
+                                  << ANSI_NONE << std::endl;
+                    }
+                    continue;
+                }
                 stat->addInsts(1);
                 stat->pcBufferPush(*cmtPCs[i]);
                 uint32_t cmtInst = memory->debugRead(*cmtPCs[i]);
 
-                std::string asmStr = simulator->disassemble(cmtInst);
                 uint8_t opcode  = bits(cmtInst, 6, 0);
                 bool isBranch = opcode == 0x6F || opcode == 0x63 || opcode == 0x67;
-                // 输出一条指令的记录
-                baselog << "0x" << std::hex << *cmtPCs[i] << std::dec << ","
-                        << "\"" << asmStr << "\"";
-                for (int s = 0; s < numStages; s++) {
-                    baselog << "," << (*allCycles[s][i] + 1);
+                if(options.logDCacheAccess && (opcode == 0x03 || opcode == 0x23)) {
+                    // 参考模型尚未执行这条指令，其寄存器堆即为该访存的源操作数
+                    uint32_t imm = opcode == 0x03 ? (cmtInst >> 20) : ((bits(cmtInst, 31, 25) << 5) | bits(cmtInst, 11, 7));
+                    if(imm & 0x800) {
+                        imm |= 0xFFFFF000;
+                    }
+                    uint32_t addr = simulator->getRf(bits(cmtInst, 19, 15)) + imm;
+                    // 访问行: exe周期,0,0x地址,R/W,0xPC；缺失行保持 起始周期,持续周期,0x地址 三列
+                    cachelog << (*exeCycles[i] + 1) << ",0,0x" << std::hex << addr << ","
+                             << (opcode == 0x03 ? "R" : "W") << ",0x" << *cmtPCs[i] << std::dec << "\n";
+                }
+                if (options.aggregate) {
+                    PcProfileEntry &e = profile.at(*cmtPCs[i]);
+                    uint64_t retire = stat->getCycles();
+                    e.count++;
+                    e.latency += retire - lastCmtCycles;
+                    e.cycles += (double)(retire - lastCmtCycles) / cmtNum;
+                    e.missCycles += pendingMissCycles;
+                    pendingMissCycles = 0;
+                    // 同拍退休的后续指令与第一条指令不计入流水级统计
+                    if (!firstCommit && cmtSeen == 0) {
+                        profile.addStages(e, lastCmtCycles, *dispatchCycles[i] + 1, *readOpCycles[i] + 1,
+                                          *exeCycles[i] + 1, *wbCycles[i] + 1, retire);
+                    }
+                    firstCommit = false;
+                    cmtSeen++;
+                } else {
+                    // 输出一条指令的记录
+                    std::string asmStr = simulator->disassemble(cmtInst);
+                    baselog << "0x" << std::hex << *cmtPCs[i] << std::dec << ","
+                            << "\"" << asmStr << "\"";
+                    for (int s = 0; s < numStages; s++) {
+                        baselog << "," << (*allCycles[s][i] + 1);
+                    }
+                    baselog << "," << stat->getCycles()
+                            << "," << lastCmtCycles
+                            << "," << isBranch
+                            << std::endl;       
+                }
+                if(wave && wave->triggerArmed()) {
+                    wave->onCommit(*cmtPCs[i], stat->getCycles());
+                }
+                if(isBranch) {
+                    lastBranchSeq = seq;
+                    lastBranchPC = *cmtPCs[i];
                 }
-                baselog << "," << stat->getCycles()
-                        << "," << lastCmtCycles
-                        << "," << isBranch
-                        << std::endl;       
                 seq++;
 
                 uint8_t cmtRd = bits(cmtInst, 11, 7);
                 if(simEnd(cmtInst)){
+                    finishLogs();
                     return (dbgRf[rnmTable[10]] == 0 ? 0 : -1);
                 }
                 if(*cmtPrds[i] != 0){
                     rnmTableUpdate(cmtRd, *cmtPrds[i]);
                 }
                 if(!difftestStep(cmtRd, dbgRf[rnmTable[cmtRd]], *cmtPCs[i], 1)){
+                    finishLogs();
                     return -2;
                 }
             }
@@ -181,12 +439,17 @@ int Emulator::step(uint32_t num, std::string imgName) {
         cpu->eval();
         cpu->clock = 1;
         cpu->eval();
-#ifdef DUMP_WAVE
-        m_trace->dump(simTime);
-        simTime++;
-#endif
+        if (wave) {
+            wave->tick(stat->getCycles());
+        }
+        if (options.sampleInterval && sampler.due(stat->getCycles())) {
+            sampler.sample(stat->getCycles(), stat->getInsts());
+        }
+    }
+    if (!options.aggregate) {
+        baselog << "]" << std::endl;
     }
-    baselog << "]" << std::endl;
+    finishLogs();
     return 1;
 }
 
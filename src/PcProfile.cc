@@ -0,0 +1,87 @@
+#include "PcProfile.h"
+#include <fstream>
+#include <iostream>
+
+static const char *profileStageNames[NPROFILE_STAGES] = {
+    "lastCmt->dispatch", "dispatch->readop", "readop->execute", "execute->writeback", "writeback->retire"
+};
+
+void PcProfile::grow() {
+    std::vector<PcProfileEntry> old;
+    old.swap(table);
+    table.resize(old.size() * 2);
+    used = 0;
+    for (auto &e : old) {
+        if (e.used) {
+            at(e.pc) = e;
+        }
+    }
+}
+
+PcProfileEntry& PcProfile::at(uint32_t pc) {
+    // 装载因子超过 1/2 时翻倍
+    if ((used + 1) * 2 > table.size()) {
+        grow();
+    }
+    uint32_t mask = table.size() - 1;
+    for (uint32_t i = slot(pc); ; i = (i + 1) & mask) {
+        PcProfileEntry &e = table[i];
+        if (!e.used) {
+            e.used = true;
+            e.pc = pc;
+            used++;
+            return e;
+        }
+        if (e.pc == pc) {
+            return e;
+        }
+    }
+}
+
+void PcProfile::addStages(PcProfileEntry& e, uint64_t lastCmt, uint64_t dispatch, uint64_t readOp,
+                          uint64_t exe, uint64_t wb, uint64_t retire) {
+    // 各阶段边界：dispatch, readOp, exe, wb, retire；lastCmt 落在哪一段就从哪一段开始
+    uint64_t bounds[NPROFILE_STAGES + 1] = {lastCmt, dispatch, readOp, exe, wb, retire};
+    int first = 0;
+    while (first < NPROFILE_STAGES && lastCmt >= bounds[first + 1]) {
+        first++;
+    }
+    if (first == NPROFILE_STAGES) {
+        return;
+    }
+    for (int s = first; s < NPROFILE_STAGES; s++) {
+        int64_t from = s == first ? lastCmt : bounds[s];
+        int64_t val = (int64_t)bounds[s + 1] - from;
+        if (val <= 0) {
+            continue;
+        }
+        e.stageCount[s]++;
+        e.stageCycles[s] += val;
+    }
+}
+
+bool PcProfile::dump(const std::string& path, AXIMemory* memory, Simulator* simulator, uint64_t cycles) {
+    std::ofstream fout(path);
+    if (!fout.is_open()) {
+        std::cerr << "failed to open " << path << "\n";
+        return false;
+    }
+    fout << "# cycles=" << cycles << "\n";
+    fout << "pc,asm,count,latency,cycles,miss_cycles";
+    for (int s = 0; s < NPROFILE_STAGES; s++) {
+        fout << "," << profileStageNames[s] << "_count," << profileStageNames[s] << "_cycles";
+    }
+    fout << "\n";
+    for (auto &e : table) {
+        if (!e.used) {
+            continue;
+        }
+        fout << "0x" << std::hex << e.pc << std::dec << ",\"" << simulator->disassemble(memory->debugRead(e.pc)) << "\","
+             << e.count << "," << e.latency << "," << std::fixed << e.cycles << std::defaultfloat << "," << e.missCycles;
+        for (int s = 0; s < NPROFILE_STAGES; s++) {
+            fout << "," << e.stageCount[s] << "," << e.stageCycles[s];
+        }
+        fout << "\n";
+    }
+    return true;
+}
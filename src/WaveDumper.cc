@@ -0,0 +1,114 @@
+#include "WaveDumper.h"
+#include <iostream>
+#include <cstdio>
+#include "utils.h"
+
+WaveDumper::WaveDumper(VCPU* cpu, WaveOptions options): cpu(cpu), options(options) {
+    Verilated::traceEverOn(true);
+    tracer = new WaveTracer;
+    cpu->trace(tracer, options.depth);
+    if (options.ring > 0) {
+        state = State::RING;
+        openFile(ringPath(seg));
+    }
+}
+
+WaveDumper::~WaveDumper() {
+    closeFile();
+    delete tracer;
+}
+
+void WaveDumper::openFile(const std::string& path) {
+    tracer->open(path.c_str());
+}
+
+void WaveDumper::closeFile() {
+    if (tracer->isOpen()) {
+        tracer->close();
+    }
+}
+
+void WaveDumper::keepRing(const std::string& reason) {
+    if (state != State::RING) {
+        return;
+    }
+    // 当前分段与上一个分段合起来覆盖最近的 ring ~ 2*ring 个周期，按时间先后命名为 pre0/pre1
+    closeFile();
+    std::string older = ringPath(1 - seg), newer = ringPath(seg);
+    std::string pre0 = options.base + ".pre0" WAVE_EXT, pre1 = options.base + ".pre1" WAVE_EXT;
+    std::remove(pre0.c_str());
+    std::remove(pre1.c_str());
+    std::rename(older.c_str(), pre0.c_str());
+    std::rename(newer.c_str(), pre1.c_str());
+    std::cout << ANSI_FG_CYAN << "waveform: " << reason << ", kept last cycles in " << pre0 << " and " << pre1
+              << ANSI_NONE << std::endl;
+    state = State::IDLE;
+}
+
+void WaveDumper::activate(uint64_t cycle, uint64_t until) {
+    keepRing("triggered at cycle " + std::to_string(cycle));
+    openFile(options.base + WAVE_EXT);
+    state = State::ACTIVE;
+    stopAt = until;
+}
+
+void WaveDumper::tick(uint64_t cycle) {
+    switch (state) {
+        case State::RING: {
+            if (cycle - segStart >= options.ring) {
+                closeFile();
+                seg = 1 - seg;
+                segStart = cycle;
+                openFile(ringPath(seg));
+            }
+            tracer->dump(cycle);
+            break;
+        }
+        case State::IDLE: {
+            if (options.triggerPC < 0 && cycle >= options.begin && cycle < options.end) {
+                activate(cycle, options.end);
+                tracer->dump(cycle);
+            }
+            break;
+        }
+        case State::ACTIVE: {
+            if (cycle >= stopAt) {
+                closeFile();
+                state = State::DONE;
+                std::cout << ANSI_FG_CYAN << "waveform: stopped at cycle " << cycle << ANSI_NONE << std::endl;
+                break;
+            }
+            tracer->dump(cycle);
+            break;
+        }
+        default: {
+            break;
+        }
+    }
+}
+
+void WaveDumper::onCommit(uint32_t pc, uint64_t cycle) {
+    if (pc != (uint32_t)options.triggerPC || cycle < options.begin) {
+        return;
+    }
+    std::cout << ANSI_FG_CYAN << "waveform: trigger pc " << std::hex << pc << std::dec << " at cycle " << cycle
+              << ANSI_NONE << std::endl;
+    activate(cycle, cycle + options.after);
+}
+
+void WaveDumper::onFailure(const std::string& reason) {
+    if (state == State::RING) {
+        keepRing(reason);
+    }
+    closeFile();
+    state = State::DONE;
+}
+
+void WaveDumper::finish() {
+    closeFile();
+    if (state == State::RING) {
+        std::remove(ringPath(0).c_str());
+        std::remove(ringPath(1).c_str());
+    }
+    state = State::DONE;
+}
@@ -1,32 +1,92 @@
-#include "verilated_vcd_c.h"
 #include "VCPU.h"
 #include "AXIMemory.h"
 #include "Emulator.h"
 #include "Device.h"
+#include "WaveDumper.h"
 #include <iostream>
 #include "utils.h"
 
 
 int main(int argc, char** argv) {
     VCPU*cpu = new VCPU();
-    VerilatedVcdC *vcd = new VerilatedVcdC();
-
-    Verilated::traceEverOn(true);
-    VerilatedVcdC *m_trace = new VerilatedVcdC;
-    cpu->trace(m_trace, 5);
-    m_trace->open("waveform.vcd");
 
     std::string imgPath = argv[1];
+    EmulatorOptions options;
+    WaveOptions waveOptions;
+    bool waveEnabled = false;
+    for(int i = 2; i < argc; i++) {
+        std::string arg = argv[i];
+        if(arg == "--log-dcache-access") {
+            options.logDCacheAccess = true;
+        } else if(arg == "--log-mispredict") {
+            options.logMispredict = true;
+        } else if(arg == "--aggregate") {
+            options.aggregate = true;
+        } else if(arg == "--ff-insts" && i + 1 < argc) {
+            options.ffInsts = std::stoull(argv[++i]);
+        } else if(arg == "--ff-pc" && i + 1 < argc) {
+            options.ffPC = std::stoll(argv[++i], nullptr, 0);
+        } else if(arg == "--ff-warmup" && i + 1 < argc) {
+            options.ffWarmup = std::stoul(argv[++i]);
+        } else if(arg == "--ff-stub" && i + 1 < argc) {
+            options.ffStub = std::stoll(argv[++i], nullptr, 0);
+        } else if(arg == "--sample" && i + 1 < argc) {
+            options.sampleInterval = std::stoul(argv[++i]);
+        } else if(arg == "--wave") {
+            waveEnabled = true;
+        } else if(arg == "--wave-cycles" && i + 1 < argc) {
+            // A:B，任一端可省略
+            std::string range = argv[++i];
+            size_t colon = range.find(':');
+            std::string lo = range.substr(0, colon), hi = colon == std::string::npos ? "" : range.substr(colon + 1);
+            if(!lo.empty()) {
+                waveOptions.begin = std::stoull(lo);
+            }
+            if(!hi.empty()) {
+                waveOptions.end = std::stoull(hi);
+            }
+            waveEnabled = true;
+        } else if(arg == "--wave-trigger-pc" && i + 1 < argc) {
+            waveOptions.triggerPC = std::stoll(argv[++i], nullptr, 0);
+            waveEnabled = true;
+        } else if(arg == "--wave-after" && i + 1 < argc) {
+            waveOptions.after = std::stoull(argv[++i]);
+        } else if(arg == "--wave-ring" && i + 1 < argc) {
+            waveOptions.ring = std::stoull(argv[++i]);
+            waveEnabled = true;
+        } else if(arg == "--wave-depth" && i + 1 < argc) {
+            waveOptions.depth = std::stoi(argv[++i]);
+        } else if(arg == "--wave-file" && i + 1 < argc) {
+            waveOptions.base = argv[++i];
+        } else if(arg == "--wave-fst") {
+            waveOptions.fst = true;
+        } else {
+            std::cerr << ANSI_FG_YELLOW << "unknown option: " << arg << ANSI_NONE << std::endl;
+        }
+    }
+
+#ifndef WAVE_FST
+    if(waveOptions.fst) {
+        std::cerr << ANSI_FG_RED << "--wave-fst needs a build with FST tracing: make WAVE_FORMAT=fst" << ANSI_NONE << std::endl;
+        return -4;
+    }
+#endif
+    // 不需要波形时不做任何 trace 初始化
+    WaveDumper *wave = waveEnabled ? new WaveDumper(cpu, waveOptions) : nullptr;
 
     Device *device = new Device();
     AXIMemory *memory = new AXIMemory(imgPath, 0x80000000, device);
     Statistic *stat = new Statistic();
     Simulator *simulator = new Simulator(memory);
-    Emulator *emulator = new Emulator(cpu, memory, stat, simulator, m_trace);
+    Emulator *emulator = new Emulator(cpu, memory, stat, simulator, wave, options);
     std::cout << "========================================" << std::endl;
     std::cout << ANSI_FG_CYAN << "SIMULATION STARTED." << ANSI_NONE << std::endl;
 
     emulator->reset();
+    if(emulator->fastForward() != 0) {
+        std::cout << ANSI_FG_RED << "FAST-FORWARD FAILED." << ANSI_NONE << std::endl;
+        return -5;
+    }
     std::string imgName = imgPath.substr(imgPath.find_last_of('/') + 1, imgPath.find_last_of('.') - imgPath.find_last_of('/') - 1);
     int ret = emulator->step(-1,imgName);
 
@@ -45,6 +105,12 @@ int main(int argc, char** argv) {
     stat->printPerformance();
     stat->printMarkdownReport(cpu, imgName, simulator);
     std::cout <<  "========================================" << std::endl;
-    m_trace->close();
+    if(wave) {
+        if(ret == -2 || ret == -3) {
+            wave->onFailure(ret == -2 ? "difftest failed" : "stalled");
+        }
+        wave->finish();
+        delete wave;
+    }
     return ret;
 }
\ No newline at end of file
@@ -40,8 +40,9 @@ def process_trace(path, level_name, cfg):
             continue
 
         # 格式：9202,75,0x80001858
-        m = re.match(r"(\d+),(\d+),0x([0-9a-fA-F]+)", line)
-        if not m:
+        # （--log-dcache-access 额外写入的访问行 ts,0,0xaddr,R|W,0xpc 不是 miss，跳过）
+        m = re.match(r"(\d+),(\d+),0x([0-9a-fA-F]+)(,[RW],)?", line)
+        if not m or m.group(4):
             continue
 
         ts   = int(m.group(1))
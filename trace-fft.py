@@ -1,4 +1,4 @@
-import csv
+import argparse
 import sys
 import os
 import json
@@ -6,6 +6,9 @@ import string
 from typing import List
 from collections import defaultdict
 
+import trace_index
+from trace_phases import DEFAULT_MIN_SIZE, fixed_nested_segments, nested_segments
+
 useSaving = True
 useHIpc = False
 
@@ -161,14 +164,12 @@ def analyze_instructions_by_pc(instructions, output_file="pc_stats.txt"):
     return sorted_stats, total_cycles, type_stats
 def parse_trace_file(filename):
     instrs = []
-    with open(filename, newline="") as f:
-        reader = csv.reader(f)
-        next(reader) 
-        for seq, row in enumerate(reader):
-            if not row:
-                continue
-            pc, asm, fetch, preDecode, decode, dispatch, issue, ReadOp, Execute,Execute1,Execute2, writeBack,writeBackROB, commit,lastCmt , is_branch = row[:16]
-            instrs.append(Instruction(seq, pc, asm, lastCmt, dispatch, ReadOp, Execute, writeBack, commit, is_branch))
+    # 完整解析时顺带生成 base.log.idx
+    for seq, row in trace_index.iter_rows(filename):
+        if not row:
+            continue
+        pc, asm, fetch, preDecode, decode, dispatch, issue, ReadOp, Execute,Execute1,Execute2, writeBack,writeBackROB, commit,lastCmt , is_branch = row[:16]
+        instrs.append(Instruction(seq, pc, asm, lastCmt, dispatch, ReadOp, Execute, writeBack, commit, is_branch))
 
     # 调整 IPC：同一 start 的 N 条指令共享 latency
     start_groups = defaultdict(list)
@@ -360,14 +361,16 @@ def build_basic_blocks(instrs):
     blocks_list = sorted(blocks_map.values(), key=lambda b: b.block_id)
     return blocks_list
 GROUP_SIZE = 5120
-SUB_SIZE   = 512     # 每层固定 512 行
-SUB_COUNT  = GROUP_SIZE // SUB_SIZE   # = 10
-def dump_grouped_infos(it_infos, outfile):
-    total = len(it_infos)
-    group_id = 0
-
-    for g_start in range(0, total, GROUP_SIZE):
-        g_end = min(g_start + GROUP_SIZE, total)
+SUB_SIZE   = 512     # 仅在 --fixed 时使用：每层固定 512 行
+def dump_grouped_infos(it_infos, outfile, layout=None):
+    """
+    layout 为 trace_phases 给出的两级切分 [(g_start, g_end, [(s_start, s_end), ...]), ...]；
+    为 None 时退回固定的 GROUP_SIZE / SUB_SIZE。
+    """
+    if layout is None:
+        layout = fixed_nested_segments(len(it_infos), GROUP_SIZE, SUB_SIZE)
+
+    for group_id, (g_start, g_end, subs) in enumerate(layout):
         group = it_infos[g_start: g_end]
 
         # ===== 打印大标题 =====
@@ -378,15 +381,9 @@ def dump_grouped_infos(it_infos, outfile):
 
         group_total_cycles = 0   # <== 大组总 cycles
 
-        # ===== 5120 内部分 10 个小层，每层 512 行 =====
-        for sub_id in range(SUB_COUNT):
-            s_start = sub_id * SUB_SIZE
-            s_end   = s_start + SUB_SIZE
-
-            if s_start >= len(group):  # 不足 5120 时提前退出
-                break
-
-            sub = group[s_start:s_end]
+        # ===== 大组内部按子阶段分层 =====
+        for sub_id, (s_start, s_end) in enumerate(subs):
+            sub = it_infos[s_start:s_end]
 
             outfile.write(f"  {group_id}.{sub_id+1} 层: 迭代 {sub[0]['iter_id']} – {sub[-1]['iter_id']}\n")
 
@@ -405,10 +402,15 @@ def dump_grouped_infos(it_infos, outfile):
 
         # 输出大组总耗时
         outfile.write(f"  → 大组总耗时：{group_total_cycles} cycles\n")
-
-        group_id += 1
 def main():
-    imgname = sys.argv[1] + "-riscv32"
+    parser = argparse.ArgumentParser(description="FFT 基本块分层 profiling")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--block", type=int, default=20, help="按阶段展开的基本块")
+    parser.add_argument("--fixed", action="store_true",
+                        help=f"按固定的 {GROUP_SIZE}/{SUB_SIZE} 切分，不做阶段检测")
+    parser.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE, help="阶段检测时每段最少迭代数")
+    args = parser.parse_args()
+    imgname = args.img + "-riscv32"
     trace_file = os.path.join("profiling", imgname, "base.log")
     output_dir = os.path.join("profiling", imgname)
     os.makedirs(output_dir, exist_ok=True)
@@ -489,8 +491,9 @@ def main():
             # block 内迭代按 IPC 从低到高排序
             it_infos = bb.iteration_info()
             #it_infos.sort(key=lambda x: x["ipc"], reverse=True)  # 按 IPC 排序展示，但保留 iter_id
-            if bb.block_id == 20:
-                dump_grouped_infos(it_infos, outfile)
+            if bb.block_id == args.block:
+                layout = None if args.fixed else nested_segments([info["cycles"] for info in it_infos], args.min_size)
+                dump_grouped_infos(it_infos, outfile, layout)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
-import csv
+import argparse
 import sys
 import os
+
+import trace_index
 class Instruction:
     def __init__(self, id_in_file, seqnum, pc, disasm, is_branch):
         self.id = id_in_file
@@ -35,45 +37,51 @@ def safe_int(val):
     val = val.strip("[]'\"")
     return int(val)
 
-def parse_csv(input_csv):
+def parse_csv(input_csv, seq_range=None, cycle_range=None):
     instructions = []
-    with open(input_csv, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for idx, row in enumerate(reader):
-            instr = Instruction(
-                id_in_file=idx,
-                seqnum=idx,
-                pc=row["pc"],
-                disasm=row["asm"],
-                is_branch=int(row.get("is_branch",0))
-            )
-            cyc = {k: safe_int(row[k]) for k in row if k not in ["pc","asm","is_branch","lastcommit"]}
-            typ = classify_instruction(row["asm"])
-
-            # pipeline stages
-            instr.add_stage("F", cyc["fetch"], cyc["predecode"])
-            instr.add_stage("PD", cyc["predecode"], cyc["decode"])
-            instr.add_stage("DEC", cyc["decode"], cyc["dispatch"])
-            instr.add_stage("DISP", cyc["dispatch"], cyc["issue"])
-            instr.add_stage("IS", cyc["issue"], cyc["readOp"])
-            instr.add_stage("RF", cyc["readOp"], cyc["exe"])
-
-            if typ in ["Load","Store"]:
-                instr.add_stage("DC1", cyc["exe"], cyc["exe1"])
-                instr.add_stage("DC2", cyc["exe1"], cyc["wb"])
-            elif typ in ["MulDiv"]:
-                instr.add_stage("EXE1", cyc["exe"], cyc["exe1"])
-                instr.add_stage("EXE2", cyc["exe1"], cyc["exe2"])
-                instr.add_stage("EXE3", cyc["exe2"], cyc["wb"])
-            else:  # ALU/Branch
-                instr.add_stage("EXE", cyc["exe"], cyc["wb"])
-
-            instr.add_stage("WB", cyc["wb"], cyc["wbROB"])
-            instr.add_stage("CMT", cyc["wbROB"], cyc["retire"])
-            #print(cyc["wb"], cyc["wbRob"])
-            instr.retire_tick = cyc["retire"]
-
-            instructions.append(instr)
+    header = trace_index.read_header(input_csv)
+    if seq_range or cycle_range:
+        rows = trace_index.iter_window(input_csv, seq_range, cycle_range)
+    else:
+        rows = trace_index.iter_rows(input_csv)
+    for idx, values in rows:
+        if not values:
+            continue
+        row = dict(zip(header, values))
+        instr = Instruction(
+            id_in_file=idx,
+            seqnum=idx,
+            pc=row["pc"],
+            disasm=row["asm"],
+            is_branch=int(row.get("is_branch",0))
+        )
+        cyc = {k: safe_int(row[k]) for k in row if k not in ["pc","asm","is_branch","lastcommit"]}
+        typ = classify_instruction(row["asm"])
+
+        # pipeline stages
+        instr.add_stage("F", cyc["fetch"], cyc["predecode"])
+        instr.add_stage("PD", cyc["predecode"], cyc["decode"])
+        instr.add_stage("DEC", cyc["decode"], cyc["dispatch"])
+        instr.add_stage("DISP", cyc["dispatch"], cyc["issue"])
+        instr.add_stage("IS", cyc["issue"], cyc["readOp"])
+        instr.add_stage("RF", cyc["readOp"], cyc["exe"])
+
+        if typ in ["Load","Store"]:
+            instr.add_stage("DC1", cyc["exe"], cyc["exe1"])
+            instr.add_stage("DC2", cyc["exe1"], cyc["wb"])
+        elif typ in ["MulDiv"]:
+            instr.add_stage("EXE1", cyc["exe"], cyc["exe1"])
+            instr.add_stage("EXE2", cyc["exe1"], cyc["exe2"])
+            instr.add_stage("EXE3", cyc["exe2"], cyc["wb"])
+        else:  # ALU/Branch
+            instr.add_stage("EXE", cyc["exe"], cyc["wb"])
+
+        instr.add_stage("WB", cyc["wb"], cyc["wbROB"])
+        instr.add_stage("CMT", cyc["wbROB"], cyc["retire"])
+        #print(cyc["wb"], cyc["wbRob"])
+        instr.retire_tick = cyc["retire"]
+
+        instructions.append(instr)
     return instructions
 
 
@@ -139,11 +147,17 @@ def generate_kanata_log(instructions, output_file):
 
 
 if __name__ == "__main__":
-    imgname = sys.argv[1] + "-riscv32"
+    parser = argparse.ArgumentParser(description="base.log -> Konata")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--seq", help="只导出 seq 区间 A:B（借助 base.log.idx 跳转）")
+    parser.add_argument("--cycles", help="只导出周期区间 A:B（借助 base.log.idx 跳转）")
+    args = parser.parse_args()
+    imgname = args.img + "-riscv32"
     input_csv = os.path.join("profiling", imgname, "base.log")
     output_dir = os.path.join("profiling", imgname)
     output_log = os.path.join(output_dir, "instructions.log")
     print("Converting CSV to Kanata format...")
-    instructions = parse_csv(input_csv)
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instructions = parse_csv(input_csv, seq_range, cycle_range)
     generate_kanata_log(instructions, output_log)
     print(f"✅ Kanata log written to {output_log}")
@@ -1,23 +1,40 @@
+import argparse
 import csv
 import sys
 import os
 import json
 import string
+import heapq
 from typing import List
 from collections import defaultdict
 
+import trace_index
+import memo_store
+from elf_symbols import load_symbols, SymbolTable
+from block_table import summarize_blocks, cached_block_table
+
 useSaving = True
 useHIpc = False
 
+# 报告阈值：只影响最后的报告步骤，不进入 memo_store 的缓存键
+BELOW_IPC = 2           # 迭代 IPC 低于该值时 below_avg，展开逐条指令
+TARGET_IPC = 2          # useSaving 预估优化后的 IPC
+HIPC_MIN_SAVE = 0.1     # useHIpc：可优化周期占块耗时的最小比例
+HIPC_MIN_SHARE = 0.02   # useHIpc：块耗时占总耗时的最小比例
+
+# analyze_pipeline_stages 的流水级划分，与仿真器 PcProfile 中的顺序一致
+PIPELINE_STAGES = ["lastCmt->dispatch", "dispatch->readop", "readop->execute", "execute->writeback", "writeback->retire"]
+
 
 class Instruction:
-    def __init__(self, seq, pc, asm, lastCmt, dispatch, ReadOp, Execute, writeBack, commit, is_branch):
+    def __init__(self, seq, pc, asm, lastCmt, dispatch, ReadOp, Execute, writeBack, commit, is_branch, issue=None):
         self.seq = int(seq)
         self.pc = pc
         self.asm = asm
         self.start = int(lastCmt)
         self.latency = int(commit) - int(lastCmt)
         self.dispatch = int(dispatch)
+        self.issue = int(issue) if issue is not None else None
         self.ReadOp = int(ReadOp)
         self.Execute = int(Execute)
         self.writeBack = int(writeBack)
@@ -30,8 +47,9 @@ class Instruction:
         return self._ipc if self._ipc is not None else (1 / self.latency if self.latency > 0 else 0)
 
 class BasicBlock:
-    def __init__(self, block_id):
+    def __init__(self, block_id, start_pc=None):
         self.block_id = block_id
+        self.start_pc = start_pc
         self.iterations = []  # 每次迭代是一组指令
 
     def add_iteration(self, instrs):
@@ -54,7 +72,7 @@ class BasicBlock:
         total_cycles = self.total_cycles()
         return total_instrs / total_cycles if total_cycles else 0
 
-    def iteration_info(self):
+    def iteration_info(self, below_ipc=BELOW_IPC):
         infos = []
         avg_ipc = self.avg_ipc()
         for idx, it in enumerate(self.iterations):
@@ -69,7 +87,7 @@ class BasicBlock:
                 "cycles": cycles,
                 "ipc": ipc,
                 "instrs": it,   # 直接存 Instruction 对象
-                "below_avg": ipc < 2 #avg_ipc +0.5
+                "below_avg": ipc < below_ipc #avg_ipc +0.5
             })
         return infos
 
@@ -112,40 +130,46 @@ def output_instrview_json(instrs: List[Instruction], output_path="instrview.json
     print(f"[+] Instruction-level trace written to {output_path}")
 
 
-def analyze_instructions_by_pc(instructions, output_file="pc_stats.txt"):
-    """
-    根据 PC 分类统计指令性能，输出为逗号分隔格式（含 asm 和总 IPC）。
-    """
+def aggregate_by_pc(instructions):
+    """按 PC 聚合：{pc: {"total_cycles", "count", "asm"}}，同拍退休的指令平分 latency"""
     stats = defaultdict(lambda: {"total_cycles": 0.0, "count": 0, "asm": None})
-    type_stats = defaultdict(lambda: {"total_cycles": 0.0, "count": 0})  # 新增
-    total_cycles = 0.0
-
-    # 聚合每条指令
     for inst in instructions:
         cycle = 1 / inst.ipc if inst.ipc > 0 else 0
-        total_cycles += cycle
+        entry = stats[inst.pc]
+        if entry["asm"] is None:
+            entry["asm"] = inst.asm
+        entry["total_cycles"] += cycle
+        entry["count"] += 1
+    return stats
 
-        # --- 按 PC 统计 ---
-        if stats[inst.pc]["asm"] is None:
-            stats[inst.pc]["asm"] = inst.asm
-        stats[inst.pc]["total_cycles"] += cycle
-        stats[inst.pc]["count"] += 1
 
-        # --- 按类型统计 ---
-        itype = classify_instruction(inst.asm)
-        type_stats[itype]["total_cycles"] += cycle
-        type_stats[itype]["count"] += 1
+def write_pc_stats(stats, output_file="pc_stats.txt", symtab=None):
+    """
+    把按 PC 聚合的结果输出为逗号分隔格式（含 asm、所属函数和总 IPC）。
+    聚合结果来自仿真器的 pcprofile.csv 时多一列 miss_cycles。
+    """
+    if symtab is None:
+        symtab = SymbolTable()
+    type_stats = defaultdict(lambda: {"total_cycles": 0.0, "count": 0})
+    total_cycles = 0.0
+    for data in stats.values():
+        total_cycles += data["total_cycles"]
+        itype = classify_instruction(data["asm"])
+        type_stats[itype]["total_cycles"] += data["total_cycles"]
+        type_stats[itype]["count"] += data["count"]
+    with_miss = any("miss_cycles" in data for data in stats.values())
 
     # --- 按 total_cycles 从大到小排序 ---
     sorted_stats = sorted(stats.items(), key=lambda kv: kv[1]["total_cycles"], reverse=True)
 
     # --- 输出文件 ---
     with open(output_file, "w", encoding="utf-8") as f:
-        f.write("pc,asm,count,total_cycles,avg_cycles\n")
+        f.write("pc,asm,function,count,total_cycles,avg_cycles" + (",miss_cycles\n" if with_miss else "\n"))
         for pc, data in sorted_stats:
             asm_safe = data["asm"].replace('"', '""')
             avg_cycles = data["total_cycles"] / data["count"] if data["count"] > 0 else 0
-            f.write(f'{pc},"{asm_safe}",{data["count"]},{data["total_cycles"]:.6f},{avg_cycles:.6f}\n')
+            f.write(f'{pc},"{asm_safe}",{symtab.func_of(pc)},{data["count"]},{data["total_cycles"]:.6f},{avg_cycles:.6f}'
+                    + (f',{data.get("miss_cycles", 0)}\n' if with_miss else "\n"))
 
         f.write(f"\nTOTAL_Cycles,{total_cycles:.6f}\n\n")
 
@@ -159,16 +183,31 @@ def analyze_instructions_by_pc(instructions, output_file="pc_stats.txt"):
     print(f"✅ 已输出 {len(sorted_stats)} 条 PC 统计结果到 {output_file}")
     print(f"📊 所有指令 total_cycles 总和 = {total_cycles:.6f}")
     return sorted_stats, total_cycles, type_stats
-def parse_trace_file(filename):
+
+
+def analyze_instructions_by_pc(instructions, output_file="pc_stats.txt", symtab=None):
+    """
+    根据 PC 分类统计指令性能，输出为逗号分隔格式（含 asm、所属函数和总 IPC）。
+    """
+    return write_pc_stats(aggregate_by_pc(instructions), output_file, symtab)
+def row_to_instruction(seq, row):
+    pc, asm, fetch, preDecode, decode, dispatch, issue, ReadOp, Execute,Execute1,Execute2, writeBack,writeBackROB, commit,lastCmt , is_branch = row[:16]
+    return Instruction(seq, pc, asm, lastCmt, dispatch, ReadOp, Execute, writeBack, commit, is_branch, issue)
+
+def parse_trace_file(filename, seq_range=None, cycle_range=None):
+    """
+    解析 base.log。完整解析时顺带生成稀疏索引 base.log.idx；
+    给定 seq_range / cycle_range 时借助索引只解析对应片段。
+    """
     instrs = []
-    with open(filename, newline="") as f:
-        reader = csv.reader(f)
-        next(reader) 
-        for seq, row in enumerate(reader):
-            if not row:
-                continue
-            pc, asm, fetch, preDecode, decode, dispatch, issue, ReadOp, Execute,Execute1,Execute2, writeBack,writeBackROB, commit,lastCmt , is_branch = row[:16]
-            instrs.append(Instruction(seq, pc, asm, lastCmt, dispatch, ReadOp, Execute, writeBack, commit, is_branch))
+    if seq_range or cycle_range:
+        rows = trace_index.iter_window(filename, seq_range, cycle_range)
+    else:
+        rows = trace_index.iter_rows(filename)
+    for seq, row in rows:
+        if not row:
+            continue
+        instrs.append(row_to_instruction(seq, row))
 
     # 调整 IPC：同一 start 的 N 条指令共享 latency
     start_groups = defaultdict(list)
@@ -186,21 +225,15 @@ def parse_trace_file(filename):
 
     return instrs
 
-def analyze_pipeline_stages(instructions, output_file="pipeline_stage_stats.csv"):
+def aggregate_pipeline_stages(instructions):
     """
-    统计每条指令从 lastCmtCycle 开始，到 commit 之间的流水级耗时（按 PC 聚合）。
+    统计每条指令从 lastCmtCycle 开始，到 commit 之间的流水级耗时（按 PC 聚合）：
+    {(stage, pc): {"count", "total_cycles", "asm"}}。
     若相邻两条指令 commit 相同（同周期退休），则跳过后者。
-    并按指令种类统计每个流水级耗时。
     """
-    from collections import defaultdict
-
     stats = defaultdict(lambda: {"count": 0, "total_cycles": 0.0, "asm": None})
-    stage_totals = defaultdict(float)  # 每个流水级总和
-    stage_type_totals = defaultdict(lambda: defaultdict(float))  # stage -> type -> cycles
-
     if not instructions:
-        print("⚠️ analyze_pipeline_stages: empty instruction list")
-        return
+        return stats
 
     instrs = sorted(instructions, key=lambda x: x.seq)
 
@@ -236,31 +269,30 @@ def analyze_pipeline_stages(instructions, output_file="pipeline_stage_stats.csv"
         elif wb <= lc < cm:
             stage_durations["writeback->retire"] = cm - lc
 
-        instr_type = classify_instruction(inst.asm)
-
         for stage, val in stage_durations.items():
             if val <= 0:
                 continue
             # 按 PC 聚合
-            key = (stage, inst.pc)
-            entry = stats[key]
+            entry = stats[(stage, inst.pc)]
             if entry["asm"] is None:
                 entry["asm"] = inst.asm
             entry["count"] += 1
             entry["total_cycles"] += val
 
-            # 按流水级总和
-            stage_totals[stage] += val
-            # 按流水级+指令类型总和
-            stage_type_totals[stage][instr_type] += val
-
         prev_commit = inst.commit
+    return stats
 
-    # 输出 CSV
+
+def write_pipeline_stages(stats, output_file="pipeline_stage_stats.csv"):
+    """输出按 (流水级, PC) 聚合的结果，并附加每个流水级以及按指令种类的总和"""
+    stage_totals = {stage: 0.0 for stage in PIPELINE_STAGES}  # 每个流水级总和
+    stage_type_totals = defaultdict(lambda: defaultdict(float))  # stage -> type -> cycles
     rows = []
     for (stage, pc), data in stats.items():
         avg = data["total_cycles"] / data["count"] if data["count"] else 0
         rows.append((stage, pc, data["asm"], data["count"], data["total_cycles"], avg))
+        stage_totals[stage] += data["total_cycles"]
+        stage_type_totals[stage][classify_instruction(data["asm"])] += data["total_cycles"]
 
     rows.sort(key=lambda x: (x[0], -x[4]))
 
@@ -274,20 +306,61 @@ def analyze_pipeline_stages(instructions, output_file="pipeline_stage_stats.csv"
         f.write("\n# Stage Totals\n")
         total_cycles_all = 0.0
         for stage, total in stage_totals.items():
+            if stage not in stage_type_totals:
+                continue
             f.write(f'{stage}_TOTAL,{total:.3f}\n')
             total_cycles_all += total
         f.write(f'ALL_STAGES_TOTAL,{total_cycles_all:.3f}\n\n')
 
         # 输出每个流水级按指令类型的总和
         f.write("# Stage Totals by Instruction Type\n")
-        for stage, type_dict in stage_type_totals.items():
-            for instr_type, total in type_dict.items():
+        for stage in PIPELINE_STAGES:
+            for instr_type, total in stage_type_totals.get(stage, {}).items():
                 f.write(f'{stage}_{instr_type}_TOTAL,{total:.3f}\n')
 
     print(f"✅ 输出文件: {output_file} （共 {len(rows)} 条统计）")
     print(f"📊 各流水级总和已附加，ALL_STAGES_TOTAL={total_cycles_all:.3f}")
-  
-def build_basic_blocks(instrs):
+
+
+def analyze_pipeline_stages(instructions, output_file="pipeline_stage_stats.csv"):
+    """
+    统计每条指令从 lastCmtCycle 开始，到 commit 之间的流水级耗时（按 PC 聚合）。
+    若相邻两条指令 commit 相同（同周期退休），则跳过后者。
+    并按指令种类统计每个流水级耗时。
+    """
+    if not instructions:
+        print("⚠️ analyze_pipeline_stages: empty instruction list")
+        return
+    write_pipeline_stages(aggregate_pipeline_stages(instructions), output_file)
+
+
+def load_pc_profile(path):
+    """
+    读取仿真器 --aggregate 模式写出的 pcprofile.csv，
+    返回 (总周期, 与 aggregate_by_pc 同格式的 PC 统计, 与 aggregate_pipeline_stages 同格式的流水级统计)
+    """
+    total_cycles = 0
+    pc_stats = {}
+    stage_stats = {}
+    with open(path, newline="") as f:
+        first = f.readline()
+        if first.startswith("# cycles="):
+            total_cycles = int(first.strip().split("=", 1)[1])
+        else:
+            f.seek(0)
+        for rec in csv.DictReader(f):
+            pc, asm = rec["pc"], rec["asm"]
+            pc_stats[pc] = {"total_cycles": float(rec["cycles"]), "count": int(rec["count"]), "asm": asm,
+                            "latency": int(rec["latency"]), "miss_cycles": int(rec["miss_cycles"])}
+            for stage in PIPELINE_STAGES:
+                count = int(rec[f"{stage}_count"])
+                if count:
+                    stage_stats[(stage, pc)] = {"count": count, "total_cycles": float(rec[f"{stage}_cycles"]),
+                                                "asm": asm}
+    return total_cycles, pc_stats, stage_stats
+
+
+def build_basic_blocks(instrs, order=None):
     """
     更稳健的 basic-block 构造：
     1) 先识别所有 block 起点（block_starts）：
@@ -297,6 +370,7 @@ def build_basic_blocks(instrs):
     2) 第二遍按起点切分：遇到起点就把上一个积累的 current_block 收尾并加入对应的 BasicBlock（按起点地址做 key）
     3) 保证每次到达某个起点都会产生一次迭代（即便只有 1 条指令）
     返回值：list(BasicBlock)，顺序是按首次出现顺序分配 block_id。
+    若传入 order 列表，则按动态执行顺序追加 (block_id, 迭代下标)，供 CFG/循环分析使用。
     """
     if not instrs:
         return []
@@ -336,9 +410,12 @@ def build_basic_blocks(instrs):
                 # if instr.start == current_block[-1].start :
                 #     print(instr.seq)
                 if current_start not in blocks_map:
-                    blocks_map[current_start] = BasicBlock(block_id_counter)
+                    blocks_map[current_start] = BasicBlock(block_id_counter, current_start)
                     block_id_counter += 1
                 blocks_map[current_start].add_iteration(current_block)
+                if order is not None:
+                    bb = blocks_map[current_start]
+                    order.append((bb.block_id, len(bb.iterations) - 1))
                 if p != current_start:
                     print(blocks_map[current_start].block_id,"迭代次数：",len(blocks_map[current_start].iterations))
             # 启动一个新的 current_block，以当前 pc 作为 key
@@ -351,16 +428,188 @@ def build_basic_blocks(instrs):
     # 处理末尾残余
     if current_block:
         if current_start not in blocks_map:
-            blocks_map[current_start] = BasicBlock(block_id_counter)
+            blocks_map[current_start] = BasicBlock(block_id_counter, current_start)
             block_id_counter += 1
         blocks_map[current_start].add_iteration(current_block)
+        if order is not None:
+            bb = blocks_map[current_start]
+            order.append((bb.block_id, len(bb.iterations) - 1))
 
     # 按首次出现顺序返回 blocks（blocks_map 的值已经按创建顺序分配 block_id）
     # 返回 list 按 block_id 排序，保证输出稳定
     blocks_list = sorted(blocks_map.values(), key=lambda b: b.block_id)
     return blocks_list
+def _write_iteration(outfile, info, load_instrs):
+    outfile.write(f" 迭代 {info['iter_id']}: 耗时={info['cycles']} cycles, IPC={info['ipc']:.2f}\n")
+
+    prev_start = None
+    for instr in load_instrs(info["first_seq"], info["size"]):
+        pc_str = f"{instr.pc:<12}"
+        asm_str = f"{instr.asm:<30}"
+        start_str = f"start={instr.start:<5}"
+        delay_str = f"delay={instr.latency:<3}"
+
+        # 如果当前周期与上一条不同，则标记为第一条指令
+        mark = "*" if instr.start != prev_start else ""
+        prev_start = instr.start
+
+        outfile.write(f"    {pc_str} {asm_str} {start_str} {delay_str} {mark}\n")
+
+def write_block_detail(outfile, bb, bb_cycles, symtab, load_instrs, top_k=None, below_ipc=BELOW_IPC):
+    """
+    基本块（BlockSummary）的明细。top_k 为 None 时输出完整明细：每种耗时对应的全部迭代号，
+    以及所有 IPC < below_ipc 的迭代的逐条指令；
+    否则只输出每种耗时的迭代次数，和用堆选出的耗时最长的 top_k 个迭代（其中 IPC < below_ipc 的给出逐条指令）。
+    load_instrs(first_seq, size) 返回一次迭代的指令。
+    """
+    outfile.write(f"=== 基本块 {bb.block_id} ({bb.start_pc} {symtab.func_of(bb.start_pc) or '-'}) ===\n")
+    outfile.write(f"总耗时: {bb_cycles} cycles, 平均IPC: {bb.avg_ipc():.2f}\n")
+    outfile.write(f"迭代次数: {bb.n_iterations()}\n")
+
+    it_infos = bb.iteration_info(below_ipc)
+    if top_k is None:
+        # block 内迭代按 IPC 从低到高排序
+        it_infos.sort(key=lambda x: x["ipc"], reverse=True)  # 按 IPC 排序展示，但保留 iter_id
+        cycles_dict = defaultdict(list)
+        for info in it_infos:
+            cycles_dict[info["cycles"]].append(info["iter_id"])
+        for cycles in sorted(cycles_dict.keys()):
+            iter_ids = " ".join(str(i) for i in sorted(cycles_dict[cycles]))
+            outfile.write(f"    迭代 {iter_ids}, 耗时={cycles} cycles\n")
+        for info in it_infos:
+            if info["below_avg"]:
+                _write_iteration(outfile, info, load_instrs)
+        return
+
+    cycles_count = defaultdict(int)
+    for info in it_infos:
+        cycles_count[info["cycles"]] += 1
+    for cycles in sorted(cycles_count):
+        outfile.write(f"    耗时={cycles} cycles: {cycles_count[cycles]} 次\n")
+    worst = heapq.nlargest(top_k, it_infos, key=lambda x: x["cycles"])
+    outfile.write(f"  耗时最长的 {len(worst)} 次迭代: " + " ".join(f"{info['iter_id']}({info['cycles']})" for info in worst) + "\n")
+    for info in worst:
+        if info["below_avg"]:
+            _write_iteration(outfile, info, load_instrs)
+
+def _iteration_event(bb, iter_idx, start, end):
+    colors = string.ascii_lowercase
+    color = colors[(iter_idx - 1) % len(colors)]
+    return {
+        "name": f"{color}: {iter_idx} Iter",
+        "cname": color,   # 可换成 red/blue 等颜色
+        "ph": "X",
+        "pid": "cpu",
+        "tid": f"Block {bb.block_id}",   # 每个迭代号作为 thread id
+        "ts": start,
+        "dur": end - start
+    }
+
+def blkview_events(blocks, budget=0, tolerance=0.25):
+    """
+    blkview.json 的事件（blocks 为 BlockSummary）。总迭代数不超过 budget（或 budget<=0）时每次迭代一个 slice；
+    否则每个 block 先保底 2 个事件（budget 不够时保底 1 个），剩余配额按迭代数分配，总数不超过 budget
+    （只有 budget 小于 block 数时，每个 block 仍输出 1 个事件）。连续的普通迭代合并为一个汇总 slice
+    （args 中带 count / total_cycles / min_cycles / max_cycles），
+    只有耗时偏离该 block 众数超过 tolerance 的迭代保留单独的 slice（最多占配额的三分之一，偏离最大者优先）。
+    每个 block 只扫描两遍迭代的 start/end 数组，整体线性时间。
+    """
+    spans = [(bb, bb.starts, bb.ends) for bb in blocks]
+    total_iters = sum(len(st) for _, st, _ in spans)
+
+    events = []
+    if budget <= 0 or total_iters <= budget:
+        for bb, starts, ends in spans:
+            for i, (a, b) in enumerate(zip(starts, ends)):
+                events.append(_iteration_event(bb, i + 1, a, b))
+        return events
+
+    n_blocks = sum(1 for _, st, _ in spans if len(st))
+    floor = 2 if budget >= 2 * n_blocks else 1
+    spare = max(0, budget - floor * n_blocks)
+    for bb, starts, ends in spans:
+        n = len(starts)
+        if not n:
+            continue
+        quota = floor + spare * n // total_iters
+        cycles = [b - a for a, b in zip(starts, ends)]
+        counts = defaultdict(int)
+        for c in cycles:
+            counts[c] += 1
+        typical = max(counts, key=counts.get)
+        limit = max(1, typical * tolerance)
+        deviating = [i for i, c in enumerate(cycles) if abs(c - typical) > limit]
+        if len(deviating) > quota // 3:
+            deviating = heapq.nlargest(quota // 3, deviating, key=lambda i: abs(cycles[i] - typical))
+        detail = set(deviating)
+        # 每个单独的迭代最多把一段普通迭代截成两段，汇总 slice 的配额要扣掉这部分
+        group = max(1, -(-(n - len(detail)) // max(1, quota - 2 * len(detail) - 1)))
+
+        run_first = None
+        def flush(last):
+            count = last - run_first + 1
+            if count == 1:
+                events.append(_iteration_event(bb, run_first + 1, starts[run_first], ends[run_first]))
+                return
+            run = cycles[run_first:last + 1]
+            events.append({
+                "name": f"{run_first + 1}-{last + 1} Iter x{count}",
+                "cname": "grey",
+                "ph": "X",
+                "pid": "cpu",
+                "tid": f"Block {bb.block_id}",
+                "ts": starts[run_first],
+                "dur": ends[last] - starts[run_first],
+                "args": {"count": count, "total_cycles": sum(run),
+                         "min_cycles": min(run), "max_cycles": max(run)},
+            })
+
+        for i in range(n):
+            if i in detail:
+                if run_first is not None:
+                    flush(i - 1)
+                    run_first = None
+                events.append(_iteration_event(bb, i + 1, starts[i], ends[i]))
+                continue
+            if run_first is None:
+                run_first = i
+            elif i - run_first + 1 > group:
+                flush(i - 1)
+                run_first = i
+        if run_first is not None:
+            flush(n - 1)
+    return events
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="基本块 profiling")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B（借助 base.log.idx 跳转）")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B（借助 base.log.idx 跳转）")
+    parser.add_argument("--elf", help="镜像的 ELF 文件，用于把 PC 归属到函数")
+    parser.add_argument("--top-k", type=int, default=5,
+                        help="blkinfo 中每个基本块只展开耗时最长的 K 次迭代")
+    parser.add_argument("--block", type=int, action="append",
+                        help="额外输出该基本块所有迭代的完整明细到 blocks/block_N.txt（可重复）")
+    parser.add_argument("--below-ipc", type=float, default=BELOW_IPC,
+                        help="迭代 IPC 低于该值时展开逐条指令")
+    parser.add_argument("--target-ipc", type=float, default=TARGET_IPC,
+                        help="预估优化收益时假设的块 IPC")
+    parser.add_argument("--hipc", action="store_true", default=useHIpc,
+                        help="额外列出按最快迭代估算、可优化周期较多的基本块")
+    parser.add_argument("--pc-profile", action="store_true",
+                        help="由仿真器 --aggregate 写出的 pcprofile.csv 生成 PC 与流水级统计（base.log 不存在时自动使用）")
+    parser.add_argument("--no-memo", action="store_true", help="不读写 profiling/<img>/.memo 中的中间结果缓存")
+    parser.add_argument("--memo-max-mb", type=float, help="缓存总大小上限（MiB，默认 1024）")
+    parser.add_argument("--memo-max-days", type=float, help="缓存条目最长保留天数（默认 7）")
+    parser.add_argument("--lod-budget", type=int, default=200000,
+                        help="blkview.json 的事件上限，超过时合并普通迭代（<=0 表示不合并）")
+    parser.add_argument("--lod-tolerance", type=float, default=0.25,
+                        help="迭代耗时偏离 block 众数的比例超过该值时保留单独的 slice")
+    return parser.parse_args(argv)
+
 def main():
-    imgname = sys.argv[1] + "-riscv32"
+    args = parse_args()
+    imgname = args.img + "-riscv32"
     trace_file = os.path.join("profiling", imgname, "base.log")
     output_dir = os.path.join("profiling", imgname)
     os.makedirs(output_dir, exist_ok=True)
@@ -368,16 +617,68 @@ def main():
     view_file = os.path.join(output_dir, "blkview.json")  # 新增 view 文件
     instr_file =  os.path.join(output_dir, "instrview.csv")
     pipeline_file = os.path.join(output_dir, "pipeline_stage_stats.csv")
+    profile_file = os.path.join(output_dir, "pcprofile.csv")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    symtab = load_symbols(args.elf)
+
+    # --- 聚合模式：仿真器已按 PC 汇总，没有逐条指令，只能给出 PC 与流水级统计 ---
+    if args.pc_profile or (not os.path.exists(trace_file) and os.path.exists(profile_file)):
+        if seq_range or cycle_range:
+            print("⚠️ pcprofile.csv 是整个运行的汇总，忽略 --seq/--cycles")
+        total_cycles, pc_stats, stage_stats = load_pc_profile(profile_file)
+        print(f"[*] 读取 {profile_file}：{len(pc_stats)} 个 PC，总 cycles {total_cycles}")
+        write_pipeline_stages(stage_stats, pipeline_file)
+        write_pc_stats(pc_stats, instr_file, symtab)
+        return
 
-    instrs = parse_trace_file(trace_file)
-    blocks = build_basic_blocks(instrs)
+    # --- 中间结果：解析、基本块与迭代表、PC/流水级聚合，按输入指纹 + 窗口参数缓存 ---
+    store = memo_store.store_for(output_dir, args.memo_max_mb, args.memo_max_days)
+    fingerprint = memo_store.file_fingerprint(trace_file)
+    window = {"seq": seq_range, "cycles": cycle_range}
+    parsed = {}
+
+    def get_instrs():
+        if "instrs" not in parsed:
+            parsed["instrs"] = parse_trace_file(trace_file, seq_range, cycle_range)
+        return parsed["instrs"]
+
+    def compute_blocks():
+        return summarize_blocks(get_instrs(), build_basic_blocks(get_instrs()))
+
+    def cached_text(stage, params, path, write):
+        """把 write() 生成的输出文件整体缓存，命中时直接写回"""
+        def compute():
+            write()
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        if args.no_memo:
+            write()
+            return
+        misses = store.misses
+        text = store.cached(stage, 1, fingerprint, params, compute)
+        if store.misses == misses:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"♻️ 复用缓存: {path}")
+
+    if args.no_memo:
+        total_cycles, overall_instrs, blocks = compute_blocks()
+    else:
+        total_cycles, overall_instrs, blocks = cached_block_table(store, trace_file, seq_range, cycle_range, compute_blocks)
+
+    def load_instrs(first_seq, size):
+        instrs = parsed.get("instrs")
+        if instrs:
+            i = first_seq - instrs[0].seq
+            chunk = instrs[i:i + size] if i >= 0 else []
+            if chunk and chunk[0].seq == first_seq:
+                return chunk
+        if "reader" not in parsed:
+            parsed["reader"] = trace_index.SeqReader(trace_file)
+        return [row_to_instruction(seq, row) for seq, row in parsed["reader"].rows(first_seq, first_seq + size - 1)]
 
-    total_cycles = 0
-    if instrs:
-        total_cycles = max(instr.start + instr.latency for instr in instrs) - min(instr.start for instr in instrs)
-    overall_instrs = len(instrs)
     overall_ipc = overall_instrs / total_cycles if total_cycles else 0
-    avg_cycles_per_block = total_cycles / len(blocks) if blocks else 0
 
     with open(output_file, "w") as outfile:
         outfile.write(f"程序的基本块数量: {len(blocks)}\n")
@@ -385,17 +686,16 @@ def main():
         outfile.write(f"总指令数: {overall_instrs}\n")
         outfile.write(f"总体 IPC: {overall_ipc:.2f}\n\n")
 
-        sorted_blocks = sorted(blocks, key=lambda bb: bb.total_cycles(), reverse=True)
         # --- 粗略基本块信息（按预估优化收益排序） ---
         if useSaving:
             #outfile.write("按预估优化收益排序的基本块（占比高于平均）:\n")
             avg_percent = 0 # 1 / 200 #len(blocks) if blocks else 0
             block_savings = []
             for bb in blocks:
-                bb_instr_count = sum(len(it) for it in bb.iterations)
+                bb_instr_count = bb.n_instrs()
                 bb_cycles = bb.total_cycles()
-                # 预估优化 IPC = 2
-                optimized_cycles = bb_instr_count / 2
+                # 预估优化 IPC = TARGET_IPC
+                optimized_cycles = bb_instr_count / args.target_ipc
                 savings = bb_cycles - optimized_cycles
                 savings_percent = savings / total_cycles if total_cycles else 0
                 block_savings.append((bb, savings_percent, bb_cycles))
@@ -411,85 +711,58 @@ def main():
                 cumulative_percent += block_percent
                 cumulative_cycles += bb_cycles
                 outfile.write(
-                    f"Block {bb.block_id}: 总cycles={bb_cycles}, 占比={(bb_cycles/total_cycles):.2f}, "
-                    f"迭代次数 {len(bb.iterations)}, "
+                    f"Block {bb.block_id}: 函数={symtab.func_of(bb.start_pc) or '-'}, 总cycles={bb_cycles}, 占比={(bb_cycles/total_cycles):.2f}, "
+                    f"迭代次数 {bb.n_iterations()}, "
                     f"累计cycles={cumulative_cycles}, "
                     f"当前IPC={bb.avg_ipc():.2f}\n"
                 )
         
-        if useHIpc:
+        if args.hipc:
             for bb in blocks:
                 bb_cycles = bb.total_cycles()
-                it_infos = bb.iteration_info()
-                it_infos.sort(key=lambda x: x["cycles"])  
-                lowest_cycles = it_infos[0]['cycles']
-                optimize_cycles = lowest_cycles * len(bb.iterations)
+                lowest_cycles = min(b - a for a, b in zip(bb.starts, bb.ends))
+                optimize_cycles = lowest_cycles * bb.n_iterations()
                 save_cycles = bb_cycles - optimize_cycles
-                if save_cycles / bb_cycles < 0.1 or bb_cycles / total_cycles < 0.02:
+                if save_cycles / bb_cycles < HIPC_MIN_SAVE or bb_cycles / total_cycles < HIPC_MIN_SHARE:
                     continue
-                outfile.write(f"基本块 {bb.block_id}, 总耗时: {bb_cycles} cycles, 迭代次数: {len(bb.iterations)}, 平均IPC: {bb.avg_ipc():.2f}, 可优化周期: {save_cycles},占比: {(save_cycles / bb_cycles):.2f}\n")
+                outfile.write(f"基本块 {bb.block_id}, 总耗时: {bb_cycles} cycles, 迭代次数: {bb.n_iterations()}, 平均IPC: {bb.avg_ipc():.2f}, 可优化周期: {save_cycles},占比: {(save_cycles / bb_cycles):.2f}\n")
 
         outfile.write("\n")
         # --- 详细基本块信息（按预估优化收益排序） ---
         for bb, savings_percent, bb_cycles in block_savings:
             if savings_percent < avg_percent:
                 continue
-            outfile.write(f"=== 基本块 {bb.block_id} ===\n")
-            outfile.write(f"总耗时: {bb_cycles} cycles, 平均IPC: {bb.avg_ipc():.2f}\n")
-            outfile.write(f"迭代次数: {len(bb.iterations)}\n")
-
-            # block 内迭代按 IPC 从低到高排序
-            it_infos = bb.iteration_info()
-            it_infos.sort(key=lambda x: x["ipc"], reverse=True)  # 按 IPC 排序展示，但保留 iter_id
-            cycles_dict = defaultdict(list)
-            for info in it_infos:
-                cycles_dict[info["cycles"]].append(info["iter_id"])
-            for cycles in sorted(cycles_dict.keys()):
-                iter_ids = " ".join(str(i) for i in sorted(cycles_dict[cycles]))
-                outfile.write(f"    迭代 {iter_ids}, 耗时={cycles} cycles\n")
-            for info in it_infos:
-                if not info["below_avg"]:
-                    continue
-                outfile.write(f" 迭代 {info['iter_id']}: 耗时={info['cycles']} cycles, IPC={info['ipc']:.2f}\n")
-
-                prev_start = None
-                for instr in info["instrs"]:
-                    pc_str = f"{instr.pc:<12}"
-                    asm_str = f"{instr.asm:<30}"
-                    start_str = f"start={instr.start:<5}"
-                    delay_str = f"delay={instr.latency:<3}"
-
-                    # 如果当前周期与上一条不同，则标记为第一条指令
-                    mark = "*" if instr.start != prev_start else ""
-                    prev_start = instr.start
-
-                    outfile.write(f"    {pc_str} {asm_str} {start_str} {delay_str} {mark}\n")
+            write_block_detail(outfile, bb, bb_cycles, symtab, load_instrs, args.top_k, args.below_ipc)
+
+    # --- 按需输出指定 block 的完整明细（所有迭代） ---
+    if args.block:
+        detail_dir = os.path.join(output_dir, "blocks")
+        os.makedirs(detail_dir, exist_ok=True)
+        by_id = {bb.block_id: bb for bb in blocks}
+        for block_id in args.block:
+            bb = by_id.get(block_id)
+            if bb is None:
+                print(f"⚠️ 没有基本块 {block_id}")
+                continue
+            detail_file = os.path.join(detail_dir, f"block_{block_id}.txt")
+            with open(detail_file, "w") as f:
+                write_block_detail(f, bb, bb.total_cycles(), symtab, load_instrs, below_ipc=args.below_ipc)
+            print(f"✅ 基本块 {block_id} 的完整明细写入 {detail_file}")
 
     # ========== 新增 blkview.json 输出 ==========
-    colors = list(string.ascii_lowercase) 
-    view_events = []
-    for bb in blocks:
-        for iter_idx, it in enumerate(bb.iterations, start=1):
-            if not it:
-                continue
-            color = colors[(iter_idx - 1) % len(colors)]
-            min_start = min(instr.start for instr in it)
-            max_end = max(instr.start + instr.latency for instr in it)
-            event = {
-                "name": f"{color}: {iter_idx} Iter",
-                "cname": color,   # 可换成 red/blue 等颜色
-                "ph": "X",
-                "pid": "cpu",
-                "tid": f"Block {bb.block_id}",   # 每个迭代号作为 thread id
-                "ts": min_start,
-                "dur": max_end - min_start
-            }
-            view_events.append(event)
+    view_events = blkview_events(blocks, args.lod_budget, args.lod_tolerance)
     with open(view_file, "w") as vf:
         json.dump(view_events, vf, indent=2)
-    analyze_pipeline_stages(instrs,pipeline_file)
+    cached_text("pipeline_stages", window, pipeline_file,
+                lambda: analyze_pipeline_stages(get_instrs(), pipeline_file))
 
     #output_instrview_json(instrs,instr_file)
-    analyze_instructions_by_pc(instrs,instr_file)
+    cached_text("pc_stats", dict(window, elf=memo_store.file_fingerprint(args.elf)), instr_file,
+                lambda: analyze_instructions_by_pc(get_instrs(), instr_file, symtab))
+    if "reader" in parsed:
+        parsed["reader"].close()
+    if not args.no_memo:
+        store.evict()
+        print(f"[*] 中间结果缓存 {store.root}：命中 {store.hits}，重新计算 {store.misses}")
 if __name__ == "__main__":
     main()
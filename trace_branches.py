@@ -0,0 +1,124 @@
+import argparse
+import os
+from collections import defaultdict
+
+import trace_index
+from elf_symbols import load_symbols
+
+# ============================
+# 分支预测失败推断
+# ============================
+# 预测正确时，分支之后的指令早在分支执行前就已取指；预测失败时前端要等分支在 exe 级
+# 给出重定向后才取到正确路径，所以下一条提交指令的 fetch 不早于分支的 exe。
+# 对每条 is_branch 指令看紧随其后提交的指令：
+#   fetch(next) >= exe(branch) - slack  -> 记为一次预测失败
+#   损失周期 = fetch(next) - fetch(branch) - 1（预测正确时两者至多相差取指带宽内的 1 拍）
+# 若仿真时加了 --log-mispredict，mispredict.log 给出真实的失败分支，用于校验推断结果。
+FETCH, EXE = 2, 8
+
+
+def infer_mispredicts(rows, slack=0):
+    """
+    返回 {pc: 统计}、推断为预测失败的 seq 集合，以及能做出判断的分支 seq 区间 (first, last)：
+    窗口内最后一条指令之后没有下一条，不参与判断。没有读到指令时区间为 None。
+    """
+    stats = defaultdict(lambda: {"asm": None, "count": 0, "mispredicts": 0, "lost_cycles": 0, "gap": 0})
+    flagged = set()
+    prev = None
+    prev_seq = None
+    first_seq = None
+    for seq, row in rows:
+        if not row:
+            continue
+        if first_seq is None:
+            first_seq = seq
+        if prev is not None and prev[15] == "1":
+            st = stats[prev[0]]
+            if st["asm"] is None:
+                st["asm"] = prev[1]
+            st["count"] += 1
+            fetch_next = int(row[FETCH])
+            br_fetch, br_exe = int(prev[FETCH]), int(prev[EXE])
+            if fetch_next >= br_exe - slack:
+                st["mispredicts"] += 1
+                st["lost_cycles"] += max(0, fetch_next - br_fetch - 1)
+                st["gap"] += fetch_next - br_exe
+                flagged.add(prev_seq)
+        prev, prev_seq = row, seq
+    span = (first_seq, prev_seq - 1) if first_seq is not None else None
+    return stats, flagged, span
+
+
+def read_ground_truth(filename):
+    truth = {}
+    with open(filename) as f:
+        next(f, None)
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) >= 2:
+                truth[int(parts[0])] = parts[1]
+    return truth
+
+
+def write_branch_stats(stats, output_file, symtab, truth=None, flagged=None):
+    actual = defaultdict(int)
+    hits = defaultdict(int)
+    if truth is not None:
+        for seq, pc in truth.items():
+            actual[pc] += 1
+            if seq in flagged:
+                hits[pc] += 1
+    rows = sorted(stats.items(), key=lambda kv: kv[1]["lost_cycles"], reverse=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("pc,asm,function,count,est_mispredicts,est_rate,lost_cycles,avg_penalty,avg_redirect_gap")
+        f.write(",actual_mispredicts,matched\n" if truth is not None else "\n")
+        for pc, st in rows:
+            n, m = st["count"], st["mispredicts"]
+            asm_safe = st["asm"].replace('"', '""')
+            f.write(f'{pc},"{asm_safe}",{symtab.func_of(pc)},{n},{m},{(m / n if n else 0):.4f},'
+                    f'{st["lost_cycles"]},{(st["lost_cycles"] / m if m else 0):.2f},{(st["gap"] / m if m else 0):.2f}')
+            f.write(f",{actual[pc]},{hits[pc]}\n" if truth is not None else "\n")
+    print(f"✅ 分支统计写入 {output_file}（{len(rows)} 个分支 PC）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由 fetch/exe 列推断每个分支 PC 的预测失败次数与损失周期")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--slack", type=int, default=0,
+                        help="下一条指令的 fetch 不早于分支 exe 之前 slack 拍即视为重定向")
+    parser.add_argument("--elf", help="镜像的 ELF 文件，用于给出分支所在函数")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    truth_file = os.path.join(output_dir, "mispredict.log")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    if seq_range or cycle_range:
+        rows = trace_index.iter_window(trace_file, seq_range, cycle_range)
+    else:
+        rows = trace_index.iter_rows(trace_file)
+    stats, flagged, span = infer_mispredicts(rows, args.slack)
+
+    truth = None
+    if os.path.exists(truth_file):
+        truth = read_ground_truth(truth_file)
+        # 只和实际读到的指令比较（--cycles 窗口也要按读到的 seq 范围截取）
+        lo, hi = span if span else (0, -1)
+        truth = {s: pc for s, pc in truth.items() if lo <= s <= hi}
+        tp = len(flagged & truth.keys())
+        precision = tp / len(flagged) if flagged else 0
+        recall = tp / len(truth) if truth else 0
+        print(f"[*] 推断 {len(flagged)} 次 / 实际 {len(truth)} 次预测失败，"
+              f"precision={precision:.3f} recall={recall:.3f}")
+    else:
+        print(f"[*] 推断 {len(flagged)} 次预测失败（无 mispredict.log，未校验）")
+
+    write_branch_stats(stats, os.path.join(output_dir, "branch_stats.csv"), load_symbols(args.elf), truth, flagged)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+
+import trace_index
+from trace_critpath import parse_operands
+from elf_symbols import load_symbols
+
+# ============================
+# 调用栈重建
+# ============================
+# 单遍扫描 base.log，按 RISC-V 的 RAS 提示规则识别调用/返回（link 寄存器为 x1/x5，
+# 反汇编中写作 a1/a5）：
+#   jal  rd=link                     -> 调用
+#   jalr rd=link, rs1!=link          -> 调用
+#   jalr rd!=link, rs1=link          -> 返回（jalr a0, a1, 0）
+#   jalr rd=link, rs1=link, rd!=rs1  -> 返回后再调用（协程切换）
+# 每条指令的退休周期（commit - 上一次退休，同周期退休的后续指令记 0）记到当前栈上。
+# 栈用整数编码的前缀树表示：节点 id 即栈，子节点用 (父节点 << 32 | 帧名 id) 查找，
+# 内存只与不同的栈数量有关。
+LINK_REGS = (1, 5)
+
+CALL = 1
+RETURN = 2
+SWAP = 3
+
+
+def classify_jump(asm):
+    """返回 CALL / RETURN / SWAP，非调用相关的指令返回 0"""
+    parts = asm.split(None, 1)
+    mnemonic = parts[0].lower() if parts else ""
+    if mnemonic == "ret":
+        return RETURN
+    if mnemonic not in ("jal", "jalr"):
+        return 0
+    rd, srcs = parse_operands(asm)
+    rd_link = rd in LINK_REGS
+    if mnemonic == "jal":
+        return CALL if rd_link else 0
+    rs1 = srcs[0] if srcs else 0
+    rs1_link = rs1 in LINK_REGS
+    if rd_link and rs1_link and rd != rs1:
+        return SWAP
+    if rd_link:
+        return CALL
+    if rs1_link:
+        return RETURN
+    return 0
+
+
+class StackTrie:
+    def __init__(self, root_name="root"):
+        self.names = []
+        self.name_ids = {}
+        self.parent = [-1]
+        self.frame = [self._name_id(root_name)]
+        self.cycles = [0]
+        self.children = {}
+
+    def _name_id(self, name):
+        nid = self.name_ids.get(name)
+        if nid is None:
+            nid = len(self.names)
+            self.name_ids[name] = nid
+            self.names.append(name)
+        return nid
+
+    def child(self, node, name):
+        key = (node << 32) | self._name_id(name)
+        c = self.children.get(key)
+        if c is None:
+            c = len(self.parent)
+            self.children[key] = c
+            self.parent.append(node)
+            self.frame.append(self.name_ids[name])
+            self.cycles.append(0)
+        return c
+
+    def path(self, node):
+        names = []
+        while node >= 0:
+            names.append(self.names[self.frame[node]])
+            node = self.parent[node]
+        return names[::-1]
+
+
+class SliceWriter:
+    """边扫描边写 Perfetto 的 X 事件（嵌套的调用区间），不在内存中保留事件列表"""
+
+    def __init__(self, path):
+        self.f = open(path, "w")
+        self.f.write("[\n")
+        self.first = True
+        self.count = 0
+
+    def emit(self, name, ts, end, depth):
+        if not self.first:
+            self.f.write(",\n")
+        self.first = False
+        self.count += 1
+        self.f.write(json.dumps({"name": name, "ph": "X", "pid": "callstack", "tid": "calls",
+                                 "ts": ts, "dur": max(end - ts, 0), "args": {"depth": depth}}))
+
+    def close(self):
+        self.f.write("\n]\n")
+        self.f.close()
+
+
+def reconstruct(rows, symtab, slices=None):
+    """
+    rows: trace_index 产出的 (seq, row)。返回 StackTrie（cycles 为各栈的自身退休周期）。
+    slices 不为 None 时同时输出每次调用的区间。
+    """
+    trie = None
+    node = 0
+    frames = []          # [(node, 名字, 开始周期)]，栈底为根帧
+    pending = 0
+    prev_commit = None
+    commit = 0
+    unmatched = 0
+    for _, row in rows:
+        if not row:
+            continue
+        pc, asm = row[0], row[1]
+        commit = int(row[13])
+        if trie is None:
+            root = symtab.func_of(pc) or "root"
+            trie = StackTrie(root)
+            frames.append((0, root, int(row[14])))
+        if pending:
+            name = symtab.func_of(pc) or pc
+            node = trie.child(node, name)
+            frames.append((node, name, prev_commit))
+            pending = 0
+
+        if prev_commit is None or commit != prev_commit:
+            trie.cycles[node] += commit - (int(row[14]) if prev_commit is None else prev_commit)
+        prev_commit = commit
+
+        kind = classify_jump(asm)
+        if kind in (RETURN, SWAP):
+            if len(frames) > 1:
+                _, name, ts = frames.pop()
+                if slices is not None:
+                    slices.emit(name, ts, commit, len(frames))
+                node = frames[-1][0]
+            else:
+                unmatched += 1
+        if kind in (CALL, SWAP):
+            pending = 1
+
+    if trie is None:
+        return StackTrie(), 0
+    while len(frames) > 1:
+        _, name, ts = frames.pop()
+        if slices is not None:
+            slices.emit(name, ts, commit, len(frames))
+    if slices is not None:
+        root_ts = frames[0][2]
+        slices.emit(frames[0][1], root_ts, commit, 0)
+    return trie, unmatched
+
+
+def write_collapsed(trie, output_file):
+    """flamegraph.pl / speedscope 可读的 collapsed-stack 格式：帧1;帧2;... 周期数"""
+    n = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for node, cycles in enumerate(trie.cycles):
+            if cycles <= 0:
+                continue
+            f.write(";".join(trie.path(node)) + f" {cycles}\n")
+            n += 1
+    print(f"✅ collapsed stack 写入 {output_file}（{n} 个栈）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由 jal/jalr 重建调用栈，输出火焰图与嵌套调用区间")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--elf", help="镜像的 ELF 文件，用于把调用目标换成函数名")
+    parser.add_argument("--no-slices", action="store_true", help="不输出 callview.json")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    if seq_range or cycle_range:
+        rows = trace_index.iter_window(trace_file, seq_range, cycle_range)
+    else:
+        rows = trace_index.iter_rows(trace_file)
+
+    symtab = load_symbols(args.elf)
+    slices = None if args.no_slices else SliceWriter(os.path.join(output_dir, "callview.json"))
+    trie, unmatched = reconstruct(rows, symtab, slices)
+    if slices is not None:
+        slices.close()
+        print(f"✅ 调用区间写入 {slices.f.name}（{slices.count} 个）")
+    if unmatched:
+        print(f"⚠️ {unmatched} 次返回没有对应的调用（窗口从函数内部开始或 longjmp 一类的跳转）")
+    print(f"[*] {len(trie.parent)} 个不同调用栈，{sum(trie.cycles)} cycles")
+    write_collapsed(trie, os.path.join(output_dir, "stacks.folded"))
+
+
+if __name__ == "__main__":
+    main()
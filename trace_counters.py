@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import struct
+from array import array
+
+import trace_index
+from trace import parse_trace_file, build_basic_blocks
+
+# ============================
+# io_dbg_* 计数器的周期采样
+# ============================
+# 仿真时加 --sample N，每 N 个周期把计数器的当前值写入 counters.bin（格式见 include/CounterSampler.h）。
+# 相邻两次采样的差值即该区间内的增量：
+#   *Cycle 计数器   除以区间周期数，得到该区间内处于该状态的周期比例
+#   X_hit / X_visit 得到区间命中率；bdb_XFail / bdb_X 得到区间预测失败率
+# 按基本块汇总时，把每条指令的退休窗口 [上一次退休, 本次退休) 与采样区间求交，
+# 按重叠周期把区间内的 *Cycle 计数器按比例分给该指令所属的块。
+MAGIC = b"ZCTR"
+HEADER = struct.Struct("<4sIII")
+SAMPLE_HEAD = struct.Struct("<QQ")
+
+RATE_PAIRS = [
+    ("ic_hit_rate", "fte_ic_hit", "fte_ic_visit"),
+    ("dc_rd_hit_rate", "bke_lsPP_dc_0_hit", "bke_lsPP_dc_0_visit"),
+    ("dc_wr_hit_rate", "bke_lsPP_dc_1_hit", "bke_lsPP_dc_1_visit"),
+    ("l2_i_hit_rate", "l2_0_hit", "l2_0_visit"),
+    ("l2_d_hit_rate", "l2_1_hit", "l2_1_visit"),
+    ("branch_fail_rate", "cmt_bdb_branchFail", "cmt_bdb_branch"),
+    ("call_fail_rate", "cmt_bdb_callFail", "cmt_bdb_call"),
+    ("ret_fail_rate", "cmt_bdb_retFail", "cmt_bdb_ret"),
+]
+
+
+def read_samples(path):
+    """返回 (计数器名, 采样间隔, cycles 数组, insts 数组, 每个计数器一个数组)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, interval, n = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} 不是计数器采样文件")
+    pos = HEADER.size
+    names = []
+    for _ in range(n):
+        end = data.index(b"\0", pos)
+        names.append(data[pos:end].decode())
+        pos = end + 1
+    record = struct.Struct(f"<QQ{n}I")
+    cycles, insts = array("Q"), array("Q")
+    values = [array("Q") for _ in range(n)]
+    for rec in record.iter_unpack(data[pos:pos + (len(data) - pos) // record.size * record.size]):
+        cycles.append(rec[0])
+        insts.append(rec[1])
+        for col, v in zip(values, rec[2:]):
+            col.append(v)
+    return names, interval, cycles, insts, values
+
+
+def interval_rates(names, cycles, insts, values):
+    """
+    每个采样区间一行：{"start", "end", "cycles", "ipc", 各计数器增量, *Cycle 的比例, 命中/失败率}。
+    第一个区间从 0 周期开始（计数器在复位时为 0）。
+    """
+    rows = []
+    prev_c, prev_i, prev_v = 0, 0, [0] * len(names)
+    for k in range(len(cycles)):
+        c, i = cycles[k], insts[k]
+        cur = [col[k] for col in values]
+        dc = c - prev_c
+        if dc <= 0:
+            continue
+        # 32 位计数器可能回绕
+        delta = {name: (v - p) & 0xFFFFFFFF for name, v, p in zip(names, cur, prev_v)}
+        row = {"start": prev_c, "end": c, "cycles": dc, "ipc": (i - prev_i) / dc}
+        row.update(delta)
+        for name in names:
+            if name.endswith("Cycle"):
+                row[name + "_frac"] = delta[name] / dc
+        for rate, num, den in RATE_PAIRS:
+            if num in delta and den in delta:
+                row[rate] = delta[num] / delta[den] if delta[den] else None
+        rows.append(row)
+        prev_c, prev_i, prev_v = c, i, cur
+    return rows
+
+
+def write_rates(rows, names, output_file):
+    cols = ["start", "end", "cycles", "ipc"] + names + \
+           [n + "_frac" for n in names if n.endswith("Cycle")] + \
+           [rate for rate, num, den in RATE_PAIRS if num in names and den in names]
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(",".join(cols) + "\n")
+        for row in rows:
+            f.write(",".join(_fmt(row.get(c)) for c in cols) + "\n")
+    print(f"✅ {len(rows)} 个采样区间写入 {output_file}")
+
+
+def _fmt(v):
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return f"{v:.4f}"
+    return str(v)
+
+
+def counter_events(rows, names):
+    """Perfetto counter track：IPC、停顿比例、命中率各一组"""
+    stall = [n for n in names if n.endswith("Cycle")]
+    rates = [r for r, num, den in RATE_PAIRS if num in names and den in names]
+    events = []
+    for row in rows:
+        ts = row["start"]
+        events.append({"name": "IPC", "ph": "C", "pid": "counters", "ts": ts, "args": {"ipc": round(row["ipc"], 4)}})
+        events.append({"name": "Stall fraction", "ph": "C", "pid": "counters", "ts": ts,
+                       "args": {n: round(row[n + "_frac"], 4) for n in stall}})
+        args = {r: round(row[r], 4) for r in rates if row.get(r) is not None}
+        if args:
+            events.append({"name": "Hit / fail rate", "ph": "C", "pid": "counters", "ts": ts, "args": args})
+    return events
+
+
+def block_attribution(instrs, block_of, rows, names):
+    """
+    沿退休窗口与采样区间同时前进：每段重叠按 区间比例 × 重叠周期 累加到该块。
+    返回 {block_id: {"cycles": 重叠周期, 计数器名: 估计的停顿周期}}。
+    """
+    stall = [n for n in names if n.endswith("Cycle")]
+    result = {}
+    j = 0
+    prev_commit = None
+    for inst in instrs:
+        a = inst.start if prev_commit is None else prev_commit
+        b = inst.commit
+        prev_commit = b
+        if b <= a:
+            continue
+        acc = result.setdefault(block_of[inst.seq], dict.fromkeys(["cycles"] + stall, 0.0))
+        while j < len(rows) and rows[j]["end"] <= a:
+            j += 1
+        k = j
+        while k < len(rows) and rows[k]["start"] < b:
+            overlap = min(b, rows[k]["end"]) - max(a, rows[k]["start"])
+            if overlap > 0:
+                acc["cycles"] += overlap
+                for n in stall:
+                    acc[n] += rows[k][n + "_frac"] * overlap
+            k += 1
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="读取 counters.bin，输出按区间的计数器比率、Perfetto counter 和按基本块的停顿归因")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--no-blocks", action="store_true", help="不读取 base.log，不做按基本块的归因")
+    parser.add_argument("--seq", help="基本块归因只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="基本块归因只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    sample_file = os.path.join(output_dir, "counters.bin")
+    trace_file = os.path.join(output_dir, "base.log")
+
+    if not os.path.exists(sample_file):
+        print(f"⚠️ 没有 {sample_file}，仿真时需要加 --sample N")
+        return
+    names, interval, cycles, insts, values = read_samples(sample_file)
+    rows = interval_rates(names, cycles, insts, values)
+    if not rows:
+        print("⚠️ 没有采样记录")
+        return
+    print(f"[*] {len(names)} 个计数器，采样间隔 {interval} cycles，共 {len(rows)} 个区间")
+
+    write_rates(rows, names, os.path.join(output_dir, "counters.csv"))
+    view_file = os.path.join(output_dir, "counters.json")
+    with open(view_file, "w") as f:
+        json.dump(counter_events(rows, names), f)
+    print(f"✅ Perfetto counter 写入 {view_file}")
+
+    if args.no_blocks or not os.path.exists(trace_file):
+        return
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+    if not instrs:
+        return
+    blocks = build_basic_blocks(instrs)
+    block_of = {}
+    start_pc = {}
+    for bb in blocks:
+        start_pc[bb.block_id] = bb.start_pc
+        for it in bb.iterations:
+            for inst in it:
+                block_of[inst.seq] = bb.block_id
+    per_block = block_attribution(instrs, block_of, rows, names)
+    stall = [n for n in names if n.endswith("Cycle")]
+    block_file = os.path.join(output_dir, "counters_blocks.csv")
+    with open(block_file, "w", encoding="utf-8") as f:
+        f.write("block_id,start_pc,cycles," + ",".join(stall) + "\n")
+        for bid, acc in sorted(per_block.items(), key=lambda kv: kv[1]["cycles"], reverse=True):
+            f.write(f"{bid},{start_pc[bid]},{acc['cycles']:.0f}," + ",".join(f"{acc[n]:.1f}" for n in stall) + "\n")
+    print(f"✅ 按基本块的停顿归因写入 {block_file}")
+
+
+if __name__ == "__main__":
+    main()
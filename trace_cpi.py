@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+
+import trace_index
+from trace import parse_trace_file, build_basic_blocks, classify_instruction
+from analyze_sublayer_misses import parse_cache_trace, classify_miss
+from trace_timeline import convert_trace_to_json
+from intervals import IntervalUnion, miss_intervals, axi_intervals
+
+# ============================
+# CPI stack
+# ============================
+# 与 analyze_pipeline_stages 一致，以 [lastCmt, retire) 作为每条指令贡献的退休间隔，
+# 同周期退休的后续指令不再计入。间隔按以下优先级拆分：
+#   base        退休本身占用的 1 个周期
+#   frontend    lastCmt -> dispatch（指令尚未进入后端）
+#   dcache_l2   readop -> writeback 与 L2 缺失（cachelog dur > 10）或 DATA 类 AXI 读重叠的部分
+#   dcache_l1   readop -> writeback 与其余 D-cache 缺失重叠的部分
+#   stream_wait readop -> writeback 与 STREAM 类 AXI 读重叠的部分（stream 指令的执行段整体计入）
+#   other       剩余部分（发射等待、写回到退休等）
+CATEGORIES = ["base", "frontend", "dcache_l1", "dcache_l2", "stream_wait", "other"]
+STREAM_TYPES = ("CAL-STREAM", "MISC-STREAM")
+
+
+class MissCoverage:
+    def __init__(self, cache_events, timeline_events):
+        l2, l1 = [], []
+        for ev, iv in zip(cache_events, miss_intervals(cache_events)):
+            (l2 if classify_miss(ev).endswith("l2") else l1).append(iv)
+        l2 += axi_intervals(timeline_events, "DATA")
+        stream = axi_intervals(timeline_events, "STREAM")
+        # 逐级并集，差分后即可按优先级拆分且不会重复计数
+        self.l2 = IntervalUnion(l2)
+        self.l12 = IntervalUnion(l2 + l1)
+        self.all = IntervalUnion(l2 + l1 + stream)
+
+
+def instruction_stack(inst, cov):
+    gap = inst.commit - inst.start
+    stack = dict.fromkeys(CATEGORIES, 0)
+    if gap <= 0:
+        return stack
+    budget = gap
+    stack["base"] = 1
+    budget -= 1
+
+    frontend = min(max(min(inst.dispatch, inst.commit) - inst.start, 0), budget)
+    stack["frontend"] = frontend
+    budget -= frontend
+
+    a = max(inst.ReadOp, inst.start)
+    b = min(inst.writeBack, inst.commit)
+    if b > a:
+        l2 = cov.l2.covered(a, b)
+        l12 = cov.l12.covered(a, b)
+        if classify_instruction(inst.asm) in STREAM_TYPES:
+            every = b - a
+        else:
+            every = cov.all.covered(a, b)
+        for cat, val in (("dcache_l2", l2), ("dcache_l1", l12 - l2), ("stream_wait", every - l12)):
+            val = min(val, budget)
+            stack[cat] = val
+            budget -= val
+    stack["other"] = budget
+    return stack
+
+
+def compute_stacks(instrs, cov):
+    """按 seq 顺序给每条指令挂上 cpi_stack；同周期退休的后续指令记为全 0"""
+    prev_commit = None
+    for inst in instrs:
+        if prev_commit is not None and inst.commit == prev_commit:
+            inst.cpi_stack = dict.fromkeys(CATEGORIES, 0)
+        else:
+            inst.cpi_stack = instruction_stack(inst, cov)
+        prev_commit = inst.commit
+
+
+def _add(dst, stack):
+    for cat in CATEGORIES:
+        dst[cat] += stack[cat]
+
+
+def write_pc_stack(instrs, output_file):
+    stats = defaultdict(lambda: dict.fromkeys(CATEGORIES, 0))
+    counts = defaultdict(int)
+    asms = {}
+    for inst in instrs:
+        _add(stats[inst.pc], inst.cpi_stack)
+        counts[inst.pc] += 1
+        asms.setdefault(inst.pc, inst.asm)
+    rows = sorted(stats.items(), key=lambda kv: sum(kv[1].values()), reverse=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("pc,asm,count," + ",".join(CATEGORIES) + ",total\n")
+        for pc, st in rows:
+            asm_safe = asms[pc].replace('"', '""')
+            f.write(f'{pc},"{asm_safe}",{counts[pc]},' + ",".join(str(st[c]) for c in CATEGORIES)
+                    + f",{sum(st.values())}\n")
+    print(f"✅ 按 PC 的 CPI stack 写入 {output_file}（{len(rows)} 个 PC）")
+
+
+def write_block_stack(blocks, output_file):
+    rows = []
+    for bb in blocks:
+        st = dict.fromkeys(CATEGORIES, 0)
+        n = 0
+        for it in bb.iterations:
+            for inst in it:
+                _add(st, inst.cpi_stack)
+                n += 1
+        rows.append((bb, n, st))
+    rows.sort(key=lambda r: sum(r[2].values()), reverse=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("block_id,start_pc,instrs," + ",".join(CATEGORIES) + ",total,"
+                + ",".join(f"cpi_{c}" for c in CATEGORIES) + ",cpi\n")
+        for bb, n, st in rows:
+            total = sum(st.values())
+            cpis = [st[c] / n if n else 0 for c in CATEGORIES]
+            f.write(f"{bb.block_id},{bb.start_pc},{n}," + ",".join(str(st[c]) for c in CATEGORIES) + f",{total},"
+                    + ",".join(f"{v:.4f}" for v in cpis) + f",{(total / n if n else 0):.4f}\n")
+    print(f"✅ 按基本块的 CPI stack 写入 {output_file}")
+
+
+def write_counter_track(instrs, output_file, bucket=None):
+    """按退休周期分桶，输出 Perfetto counter（每个类别一条曲线）"""
+    if not instrs:
+        return
+    t0 = instrs[0].commit
+    t1 = instrs[-1].commit
+    if bucket is None:
+        bucket = max(1, (t1 - t0) // 2000)
+    buckets = defaultdict(lambda: dict.fromkeys(CATEGORIES, 0))
+    for inst in instrs:
+        _add(buckets[(inst.commit - t0) // bucket], inst.cpi_stack)
+    events = []
+    for b in sorted(buckets):
+        events.append({
+            "name": "CPI stack",
+            "ph": "C",
+            "pid": "cpi",
+            "ts": t0 + b * bucket,
+            "args": buckets[b],
+        })
+    with open(output_file, "w") as f:
+        json.dump(events, f, indent=2)
+    print(f"✅ CPI stack counter 写入 {output_file}（桶宽 {bucket} cycles）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结合流水级、cache miss 与 AXI 访存的 CPI stack")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--bucket", type=int, help="counter track 的桶宽（周期，默认自动）")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    cache_file = os.path.join(output_dir, "cachelog.log")
+    timeline_file = os.path.join(output_dir, "timeline.log")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+    blocks = build_basic_blocks(instrs)
+
+    cache_events = parse_cache_trace(cache_file) if os.path.exists(cache_file) else []
+    timeline_events = []
+    if os.path.exists(timeline_file):
+        with open(timeline_file) as f:
+            timeline_events = convert_trace_to_json(f)
+    cov = MissCoverage(cache_events, timeline_events)
+
+    compute_stacks(instrs, cov)
+    write_pc_stack(instrs, os.path.join(output_dir, "cpi_stack_pc.csv"))
+    write_block_stack(blocks, os.path.join(output_dir, "cpi_stack_block.csv"))
+    write_counter_track(instrs, os.path.join(output_dir, "cpi_stack.json"), args.bucket)
+
+
+if __name__ == "__main__":
+    main()
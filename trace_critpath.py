@@ -0,0 +1,169 @@
+import argparse
+import os
+import re
+
+import trace_index
+from trace import parse_trace_file, build_basic_blocks
+
+# ============================
+# 操作数解析
+# ============================
+# 反汇编统一把寄存器写成 a<编号>（编号即 x 寄存器号），例如：
+#   add a13, a13, a14 / addi a10, a10, 12 / lw a14, 0(a10) / sw a13, 8(a10)
+#   bne a10, a11, -24 / lui a5, 4096 / jal a1, 248 / jalr a0, a1, 0
+NUM_REGS = 32
+REG_RE = re.compile(r"\ba(\d+)\b")
+
+NO_DEST = ("sb", "sh", "sw", "beq", "bne", "blt", "bge", "bltu", "bgeu")
+NO_SRC = ("lui", "auipc", "jal")
+
+_operand_cache = {}
+
+
+def parse_operands(asm):
+    """返回 (rd, (rs...))；rd 为 None 表示不写寄存器。按 asm 字符串缓存，每种写法只解析一次"""
+    ops = _operand_cache.get(asm)
+    if ops is not None:
+        return ops
+    parts = asm.split(None, 1)
+    mnemonic = parts[0].lower() if parts else ""
+    regs = [int(r) for r in REG_RE.findall(parts[1])] if len(parts) > 1 else []
+    if not regs:
+        ops = (None, ())
+    elif mnemonic in NO_DEST:
+        ops = (None, tuple(r for r in regs if r != 0))
+    elif mnemonic in NO_SRC:
+        ops = (regs[0] or None, ())
+    else:
+        ops = (regs[0] or None, tuple(r for r in regs[1:] if r != 0))
+    _operand_cache[asm] = ops
+    return ops
+
+
+def exec_latency(instr):
+    """结果可被后继使用所需的周期：execute -> writeback，至少 1"""
+    return max(1, instr.writeBack - instr.Execute)
+
+
+# ============================
+# 单次迭代的关键路径
+# ============================
+def iteration_critical_path(it, last_len, last_writer):
+    """
+    last_len / last_writer 是长度为 NUM_REGS 的数组，按寄存器记录当前最新写者的链长和下标；
+    调用方在每次迭代前清零（迭代入口的寄存器视为已就绪）。
+    返回 (关键路径长度, 关键路径上的指令下标列表)。
+    """
+    n = len(it)
+    finish = [0] * n
+    pred = [-1] * n
+    best, best_idx = 0, -1
+    for i, instr in enumerate(it):
+        rd, srcs = parse_operands(instr.asm)
+        ready, p = 0, -1
+        for r in srcs:
+            if last_len[r] > ready:
+                ready, p = last_len[r], last_writer[r]
+        f = ready + exec_latency(instr)
+        finish[i] = f
+        pred[i] = p
+        if rd is not None:
+            last_len[rd] = f
+            last_writer[rd] = i
+        if f > best:
+            best, best_idx = f, i
+    chain = []
+    while best_idx >= 0:
+        chain.append(best_idx)
+        best_idx = pred[best_idx]
+    chain.reverse()
+    return best, chain
+
+
+class BlockCritPath:
+    def __init__(self, bb):
+        self.block_id = bb.block_id
+        self.start_pc = bb.start_pc
+        self.iterations = 0
+        self.instrs = 0
+        self.cycles = 0
+        self.crit_cycles = 0
+        self.chains = {}          # (pc, ...) -> [次数, asm 列表]
+
+    def ratio(self):
+        return min(self.crit_cycles, self.cycles) / self.cycles if self.cycles else 0
+
+    def top_chain(self):
+        if not self.chains:
+            return (), [], 0
+        key, (count, asms) = max(self.chains.items(), key=lambda kv: kv[1][0])
+        return key, asms, count
+
+
+def analyze_block(bb):
+    res = BlockCritPath(bb)
+    last_len = [0] * NUM_REGS
+    last_writer = [-1] * NUM_REGS
+    for it in bb.iterations:
+        if not it:
+            continue
+        for r in range(NUM_REGS):
+            last_len[r] = 0
+            last_writer[r] = -1
+        crit, chain = iteration_critical_path(it, last_len, last_writer)
+        min_start = min(instr.start for instr in it)
+        max_end = max(instr.start + instr.latency for instr in it)
+        res.iterations += 1
+        res.instrs += len(it)
+        res.cycles += max_end - min_start
+        res.crit_cycles += crit
+        key = tuple(it[i].pc for i in chain)
+        entry = res.chains.get(key)
+        if entry is None:
+            res.chains[key] = [1, [it[i].asm for i in chain]]
+        else:
+            entry[0] += 1
+    return res
+
+
+def write_report(results, output_file, threshold):
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("block_id,start_pc,iterations,instrs,total_cycles,avg_cycles,avg_crit_path,crit_ratio,bound,"
+                "chain_len,chain_share,chain\n")
+        for r in sorted(results, key=lambda r: r.cycles, reverse=True):
+            if not r.iterations:
+                continue
+            pcs, asms, count = r.top_chain()
+            chain = " -> ".join(f"{pc} {asm}" for pc, asm in zip(pcs, asms)).replace('"', '""')
+            bound = "latency" if r.ratio() >= threshold else "throughput"
+            f.write(
+                f"{r.block_id},{r.start_pc},{r.iterations},{r.instrs},{r.cycles},"
+                f"{r.cycles / r.iterations:.2f},{r.crit_cycles / r.iterations:.2f},{r.ratio():.3f},{bound},"
+                f"{len(pcs)},{count / r.iterations:.3f},\"{chain}\"\n"
+            )
+    print(f"✅ 关键路径分析写入 {output_file}，共 {len(results)} 个基本块")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基本块迭代内的寄存器数据流关键路径分析")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--threshold", type=float, default=0.8,
+                        help="关键路径占迭代周期比例不低于该值时判为 latency-bound")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    output_file = os.path.join(output_dir, "critpath.csv")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+    blocks = build_basic_blocks(instrs)
+    results = [analyze_block(bb) for bb in blocks]
+    write_report(results, output_file, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import csv
+import os
+import sys
+from bisect import bisect_right
+
+# ============================
+# base.log 稀疏索引
+# ============================
+# 每 STRIDE 条指令记录一次 (seq, 字节偏移, retire, lastcommit)，
+# 索引文件与 base.log 放在一起（base.log.idx），并用文件大小/mtime 校验是否过期。
+# retire / lastcommit 按提交顺序单调不减，因此可以对周期做二分查找。
+
+INDEX_MAGIC = "# zircon-trace-index v1"
+INDEX_SUFFIX = ".idx"
+DEFAULT_STRIDE = 4096
+
+
+def index_path(log_path):
+    return log_path + INDEX_SUFFIX
+
+
+def _file_sig(log_path):
+    st = os.stat(log_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _column(header, name, default):
+    try:
+        return header.index(name)
+    except ValueError:
+        return default
+
+
+class TraceIndex:
+    def __init__(self, stride, seqs, offsets, retires, lastcmts):
+        self.stride = stride
+        self.seqs = seqs
+        self.offsets = offsets
+        self.retires = retires
+        self.lastcmts = lastcmts
+
+    def __len__(self):
+        return len(self.seqs)
+
+    def seek_seq(self, seq):
+        """返回不晚于 seq 的最近索引点 (seq, offset)"""
+        i = bisect_right(self.seqs, seq) - 1
+        if i < 0:
+            return None
+        return self.seqs[i], self.offsets[i]
+
+    def seek_cycle(self, cycle):
+        """返回 retire 严格早于 cycle 的最近索引点，保证从这里顺序扫描不会漏掉 cycle 附近的指令"""
+        i = bisect_right(self.retires, cycle - 1) - 1
+        i = max(i, 0)
+        if not self.seqs:
+            return None
+        return self.seqs[i], self.offsets[i]
+
+
+class IndexBuilder:
+    """在完整解析 base.log 时顺带收集索引点"""
+
+    def __init__(self, log_path, header, stride=DEFAULT_STRIDE):
+        self.log_path = log_path
+        self.stride = stride
+        self.retire_col = _column(header, "retire", 13)
+        self.lastcmt_col = _column(header, "lastcommit", 14)
+        self.seqs, self.offsets, self.retires, self.lastcmts = [], [], [], []
+
+    def add(self, seq, offset, row):
+        if seq % self.stride != 0:
+            return
+        try:
+            retire = int(row[self.retire_col])
+            lastcmt = int(row[self.lastcmt_col])
+        except (IndexError, ValueError):
+            return
+        self.seqs.append(seq)
+        self.offsets.append(offset)
+        self.retires.append(retire)
+        self.lastcmts.append(lastcmt)
+
+    def save(self):
+        size, mtime_ns = _file_sig(self.log_path)
+        path = index_path(self.log_path)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(INDEX_MAGIC + "\n")
+                f.write(f"# size={size} mtime_ns={mtime_ns} stride={self.stride}\n")
+                f.write("seq,offset,retire,lastcommit\n")
+                for row in zip(self.seqs, self.offsets, self.retires, self.lastcmts):
+                    f.write(",".join(str(v) for v in row) + "\n")
+            os.replace(tmp, path)
+        except OSError as e:
+            # 索引只是加速手段，写失败（例如只读目录）不影响分析
+            print(f"⚠️ 无法写入索引 {path}: {e}")
+            return None
+        return TraceIndex(self.stride, self.seqs, self.offsets, self.retires, self.lastcmts)
+
+
+def _read_meta(f):
+    if f.readline().rstrip("\n") != INDEX_MAGIC:
+        return None
+    return dict(kv.split("=", 1) for kv in f.readline()[1:].split())
+
+
+def index_is_current(log_path):
+    """只读索引文件头，判断 base.log.idx 是否存在且与 base.log 的 size/mtime 一致"""
+    try:
+        size, mtime_ns = _file_sig(log_path)
+        with open(index_path(log_path)) as f:
+            meta = _read_meta(f)
+        return meta is not None and int(meta["size"]) == size and int(meta["mtime_ns"]) == mtime_ns
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def load_index(log_path):
+    """读取索引；若不存在或与 base.log 的 size/mtime 不一致则返回 None"""
+    path = index_path(log_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        size, mtime_ns = _file_sig(log_path)
+        with open(path) as f:
+            meta = _read_meta(f)
+            if meta is None:
+                return None
+            if int(meta["size"]) != size or int(meta["mtime_ns"]) != mtime_ns:
+                return None
+            stride = int(meta["stride"])
+            f.readline()
+            seqs, offsets, retires, lastcmts = [], [], [], []
+            for line in f:
+                s, o, r, l = line.split(",")
+                seqs.append(int(s))
+                offsets.append(int(o))
+                retires.append(int(r))
+                lastcmts.append(int(l))
+    except (OSError, ValueError, KeyError):
+        return None
+    return TraceIndex(stride, seqs, offsets, retires, lastcmts)
+
+
+def read_header(log_path):
+    with open(log_path, newline="") as f:
+        return next(csv.reader(f))
+
+
+def _iter_from(f, offset, first_seq):
+    """从 offset 处开始逐行解析 CSV，产出 (seq, offset, row)"""
+    f.seek(offset)
+    pos = [offset, offset]
+
+    def lines():
+        for raw in f:
+            pos[0] = pos[1]
+            pos[1] += len(raw)
+            yield raw.decode("utf-8")
+
+    for seq, row in enumerate(csv.reader(lines()), start=first_seq):
+        yield seq, pos[0], row
+
+
+def iter_rows(log_path, stride=DEFAULT_STRIDE, save_index=None):
+    """
+    完整顺序解析 base.log，产出 (seq, row)，seq 与原先 enumerate(reader) 的编号一致。
+    迭代到文件末尾时顺带写出 base.log.idx：save_index 为 None 时只在索引不存在或过期时写，
+    True 强制重写，False 不写。
+    """
+    if save_index is None:
+        save_index = not index_is_current(log_path)
+    with open(log_path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8")]))
+        builder = IndexBuilder(log_path, header, stride) if save_index else None
+        for seq, offset, row in _iter_from(f, len(header_line), 0):
+            if row and builder is not None:
+                builder.add(seq, offset, row)
+            yield seq, row
+    if builder is not None:
+        builder.save()
+
+
+def ensure_index(log_path, stride=DEFAULT_STRIDE):
+    index = load_index(log_path)
+    if index is not None:
+        return index
+    print(f"[*] 构建索引 {index_path(log_path)} ...")
+    for _ in iter_rows(log_path, stride, save_index=True):
+        pass
+    return load_index(log_path)
+
+
+def iter_window(log_path, seq_range=None, cycle_range=None):
+    """
+    只解析落在窗口内的指令，产出 (seq, row)。
+    seq_range = (first, last)，cycle_range = (begin, end)，均为闭区间，None 表示不限。
+    cycle 窗口按 [lastcommit, retire] 与窗口相交判定。
+    """
+    index = ensure_index(log_path)
+    header = read_header(log_path)
+    retire_col = _column(header, "retire", 13)
+    lastcmt_col = _column(header, "lastcommit", 14)
+
+    seq_lo, seq_hi = seq_range if seq_range else (0, None)
+    cyc_lo, cyc_hi = cycle_range if cycle_range else (None, None)
+
+    start = None
+    if index is not None and len(index):
+        start = index.seek_seq(seq_lo)
+        if cyc_lo is not None:
+            by_cycle = index.seek_cycle(cyc_lo)
+            if by_cycle is not None and (start is None or by_cycle[0] > start[0]):
+                start = by_cycle
+    with open(log_path, "rb") as f:
+        if start is None:
+            header_len = len(f.readline())
+            start = (0, header_len)
+        for seq, _, row in _iter_from(f, start[1], start[0]):
+            if seq_hi is not None and seq > seq_hi:
+                break
+            if seq < seq_lo or not row:
+                continue
+            if cyc_lo is not None or cyc_hi is not None:
+                try:
+                    retire = int(row[retire_col])
+                    lastcmt = int(row[lastcmt_col])
+                except (IndexError, ValueError):
+                    continue
+                if cyc_hi is not None and lastcmt > cyc_hi:
+                    break
+                if cyc_lo is not None and retire < cyc_lo:
+                    continue
+            yield seq, row
+
+
+class SeqReader:
+    """按 seq 区间多次读取同一个 base.log：索引只加载一次，文件句柄保持打开，每次只 seek 到最近的索引点"""
+
+    def __init__(self, log_path):
+        self.index = ensure_index(log_path)
+        self.f = open(log_path, "rb")
+        self.header_len = len(self.f.readline())
+
+    def rows(self, first, last):
+        """产出 seq 在 [first, last] 内的 (seq, row)"""
+        start = self.index.seek_seq(first) if self.index is not None and len(self.index) else None
+        if start is None:
+            start = (0, self.header_len)
+        for seq, _, row in _iter_from(self.f, start[1], start[0]):
+            if seq > last:
+                break
+            if seq >= first and row:
+                yield seq, row
+
+    def close(self):
+        self.f.close()
+
+
+def parse_range(text):
+    """解析命令行中的 "A:B" 区间，任一端可省略"""
+    lo, _, hi = text.partition(":")
+    return (int(lo, 0) if lo else None, int(hi, 0) if hi else None)
+
+
+def window_args(seq_text=None, cycle_text=None):
+    seq_range = None
+    if seq_text:
+        lo, hi = parse_range(seq_text)
+        seq_range = (lo or 0, hi)
+    cycle_range = parse_range(cycle_text) if cycle_text else None
+    return seq_range, cycle_range
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python3 trace_index.py <imgname> [stride]")
+        sys.exit(1)
+    imgname = sys.argv[1] + "-riscv32"
+    trace_file = os.path.join("profiling", imgname, "base.log")
+    stride = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_STRIDE
+    count = 0
+    for _ in iter_rows(trace_file, stride, save_index=True):
+        count += 1
+    print(f"✅ 已为 {count} 条记录写入索引 {index_path(trace_file)}（间隔 {stride}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+
+import trace_index
+from trace import parse_trace_file, build_basic_blocks
+
+
+# ============================
+# 1) 由动态 block 序列构造 CFG
+# ============================
+class CFG:
+    def __init__(self):
+        self.entry = None
+        self.nodes = {}                        # block_id -> 执行次数（保持首次出现顺序）
+        self.succs = defaultdict(dict)         # src -> {dst: 边计数}
+        self.preds = defaultdict(set)          # dst -> {src}
+
+    def edge_count(self):
+        return sum(len(d) for d in self.succs.values())
+
+
+def build_cfg(order):
+    """单遍扫描 (block_id, iter_idx) 序列，统计 block 之间的跳转边"""
+    cfg = CFG()
+    prev = None
+    for block_id, _ in order:
+        if cfg.entry is None:
+            cfg.entry = block_id
+        cfg.nodes[block_id] = cfg.nodes.get(block_id, 0) + 1
+        if prev is not None:
+            dsts = cfg.succs[prev]
+            dsts[block_id] = dsts.get(block_id, 0) + 1
+            cfg.preds[block_id].add(prev)
+        prev = block_id
+    return cfg
+
+
+# ============================
+# 2) 支配树（Cooper-Harvey-Kennedy 迭代算法）
+# ============================
+def reverse_postorder(cfg):
+    visited = set()
+    post = []
+    stack = [(cfg.entry, iter(cfg.succs[cfg.entry]))]
+    visited.add(cfg.entry)
+    while stack:
+        node, it = stack[-1]
+        nxt = next(it, None)
+        if nxt is None:
+            stack.pop()
+            post.append(node)
+        elif nxt not in visited:
+            visited.add(nxt)
+            stack.append((nxt, iter(cfg.succs[nxt])))
+    post.reverse()
+    return post
+
+
+def compute_dominators(cfg):
+    """返回 idom 字典（entry 的 idom 为自身）"""
+    rpo = reverse_postorder(cfg)
+    rank = {n: i for i, n in enumerate(rpo)}
+    idom = {cfg.entry: cfg.entry}
+
+    def intersect(a, b):
+        while a != b:
+            while rank[a] > rank[b]:
+                a = idom[a]
+            while rank[b] > rank[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for node in rpo[1:]:
+            new_idom = None
+            for p in cfg.preds[node]:
+                if p not in idom:
+                    continue
+                new_idom = p if new_idom is None else intersect(p, new_idom)
+            if new_idom is not None and idom.get(node) != new_idom:
+                idom[node] = new_idom
+                changed = True
+    return idom
+
+
+def dominates(idom, a, b):
+    """a 是否支配 b"""
+    while True:
+        if a == b:
+            return True
+        parent = idom.get(b)
+        if parent is None or parent == b:
+            return False
+        b = parent
+
+
+# ============================
+# 3) 自然循环与循环嵌套
+# ============================
+class Loop:
+    def __init__(self, header):
+        self.loop_id = None
+        self.header = header
+        self.body = {header}
+        self.back_edges = []
+        self.parent = None
+        self.children = []
+        self.depth = 0
+        # 动态统计
+        self.entries = 0
+        self.trips = 0
+        self.max_trips = 0
+        self.cycles = 0
+        self.instrs = 0
+
+    def ipc(self):
+        return self.instrs / self.cycles if self.cycles else 0
+
+
+def find_natural_loops(cfg, idom):
+    """回边 u->h（h 支配 u）确定自然循环；同一 header 的循环合并"""
+    loops = {}
+    for src, dsts in cfg.succs.items():
+        for dst in dsts:
+            if not dominates(idom, dst, src):
+                continue
+            loop = loops.setdefault(dst, Loop(dst))
+            loop.back_edges.append((src, dst))
+            stack = [src]
+            while stack:
+                n = stack.pop()
+                if n in loop.body:
+                    continue
+                loop.body.add(n)
+                stack.extend(cfg.preds[n])
+
+    loop_list = sorted(loops.values(), key=lambda l: l.header)
+    for i, loop in enumerate(loop_list):
+        loop.loop_id = i
+
+    # 嵌套关系：包含本循环 header 的最小的其它循环即为父循环
+    by_size = sorted(loop_list, key=lambda l: len(l.body))
+    for loop in loop_list:
+        for outer in by_size:
+            if outer is loop or len(outer.body) <= len(loop.body):
+                continue
+            if loop.header in outer.body:
+                loop.parent = outer
+                outer.children.append(loop)
+                break
+    for loop in loop_list:
+        d, p = 0, loop.parent
+        while p is not None:
+            d += 1
+            p = p.parent
+        loop.depth = d
+    return loop_list
+
+
+def loop_chains(loops):
+    """block_id -> 从最外层到最内层的循环链"""
+    innermost = {}
+    for loop in sorted(loops, key=lambda l: len(l.body), reverse=True):
+        for b in loop.body:
+            innermost[b] = loop
+    chains = {}
+    for b, loop in innermost.items():
+        chain = []
+        while loop is not None:
+            chain.append(loop)
+            loop = loop.parent
+        chain.reverse()
+        chains[b] = chain
+    return chains
+
+
+# ============================
+# 4) 单遍动态聚合：每个循环的进入次数、trip 数、cycles、IPC
+# ============================
+def iteration_span(it):
+    min_start = min(instr.start for instr in it)
+    max_end = max(instr.start + instr.latency for instr in it)
+    return min_start, max_end
+
+
+def aggregate_loops(blocks, order, loops):
+    """
+    维护一个与当前 block 循环链对齐的活动栈；离开循环时结算该次进入的周期与指令数。
+    返回每次循环实例 (loop, start, end, trips, instrs)，供 Perfetto 输出。
+    """
+    chains = loop_chains(loops)
+    headers = {loop.header: loop for loop in loops}
+    instances = []
+    stack = []          # [loop, entry_start, entry_instrs, trips]
+    cum_instrs = 0
+    last_end = None
+
+    def close(entry):
+        loop, start, instrs0, trips = entry
+        end = last_end if last_end is not None else start
+        loop.entries += 1
+        loop.trips += trips
+        loop.max_trips = max(loop.max_trips, trips)
+        loop.cycles += end - start
+        loop.instrs += cum_instrs - instrs0
+        instances.append((loop, start, end, trips, cum_instrs - instrs0))
+
+    for block_id, it_idx in order:
+        it = blocks[block_id].iterations[it_idx]
+        if not it:
+            continue
+        start, end = iteration_span(it)
+        chain = chains.get(block_id, [])
+
+        while stack and (len(stack) > len(chain) or stack[-1][0] is not chain[len(stack) - 1]):
+            close(stack.pop())
+        for loop in chain[len(stack):]:
+            stack.append([loop, start, cum_instrs, 0])
+        header_loop = headers.get(block_id)
+        if header_loop is not None and header_loop.depth < len(stack):
+            stack[header_loop.depth][3] += 1
+
+        cum_instrs += len(it)
+        last_end = end
+
+    while stack:
+        close(stack.pop())
+    return instances
+
+
+# ============================
+# 5) 输出
+# ============================
+def write_loop_report(output_file, cfg, loops, blocks, total_cycles, top_edges=30):
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(f"CFG: {len(cfg.nodes)} 个基本块, {cfg.edge_count()} 条边, 入口 Block {cfg.entry}\n")
+        f.write(f"自然循环数量: {len(loops)}\n\n")
+
+        f.write("loop_id,header_block,header_pc,depth,parent,blocks,entries,trips,avg_trips,max_trips,cycles,ratio,instrs,ipc\n")
+        for loop in sorted(loops, key=lambda l: l.cycles, reverse=True):
+            parent = loop.parent.loop_id if loop.parent is not None else ""
+            body = " ".join(str(b) for b in sorted(loop.body))
+            avg_trips = loop.trips / loop.entries if loop.entries else 0
+            ratio = loop.cycles / total_cycles if total_cycles else 0
+            f.write(
+                f"{loop.loop_id},{loop.header},{blocks[loop.header].start_pc},{loop.depth},{parent},"
+                f"\"{body}\",{loop.entries},{loop.trips},{avg_trips:.2f},{loop.max_trips},"
+                f"{loop.cycles},{ratio:.4f},{loop.instrs},{loop.ipc():.3f}\n"
+            )
+
+        f.write("\n# 循环嵌套\n")
+
+        def dump(loop, indent):
+            f.write(f"{'  ' * indent}Loop {loop.loop_id} (Block {loop.header}): "
+                    f"cycles={loop.cycles}, trips={loop.trips}, IPC={loop.ipc():.2f}\n")
+            for child in sorted(loop.children, key=lambda l: l.header):
+                dump(child, indent + 1)
+
+        for loop in loops:
+            if loop.parent is None:
+                dump(loop, 0)
+
+        f.write(f"\n# 最热的 {top_edges} 条 CFG 边\n")
+        f.write("src_block,dst_block,count,back_edge\n")
+        back = {e for loop in loops for e in loop.back_edges}
+        edges = [(src, dst, c) for src, dsts in cfg.succs.items() for dst, c in dsts.items()]
+        edges.sort(key=lambda e: e[2], reverse=True)
+        for src, dst, c in edges[:top_edges]:
+            f.write(f"{src},{dst},{c},{int((src, dst) in back)}\n")
+    print(f"✅ 循环报告写入 {output_file}")
+
+
+def write_loop_view(output_file, instances):
+    """每次循环进入输出一个 slice；循环实例在时间上天然嵌套，放在同一个 track 上即可看出层次"""
+    events = []
+    for loop, start, end, trips, instrs in instances:
+        cycles = end - start
+        events.append({
+            "name": f"Loop {loop.loop_id} (Block {loop.header})",
+            "cname": "a",
+            "ph": "X",
+            "pid": "loops",
+            "tid": "Loop nest",
+            "ts": start,
+            "dur": cycles,
+            "args": {
+                "trips": trips,
+                "instrs": instrs,
+                "ipc": round(instrs / cycles, 3) if cycles else 0,
+            },
+        })
+    with open(output_file, "w") as f:
+        json.dump(events, f, indent=2)
+    print(f"✅ 循环 Perfetto 轨迹写入 {output_file}，共 {len(events)} 个实例")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于基本块的 CFG 与自然循环分析")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    report_file = os.path.join(output_dir, "loopinfo")
+    view_file = os.path.join(output_dir, "loopview.json")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+    order = []
+    blocks = build_basic_blocks(instrs, order)
+    if not order:
+        print("⚠️ trace 为空")
+        return
+    total_cycles = max(i.start + i.latency for i in instrs) - min(i.start for i in instrs)
+
+    cfg = build_cfg(order)
+    idom = compute_dominators(cfg)
+    loops = find_natural_loops(cfg, idom)
+    instances = aggregate_loops(blocks, order, loops)
+
+    write_loop_report(report_file, cfg, loops, blocks, total_cycles)
+    write_loop_view(view_file, instances)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import heapq
+import json
+import os
+import string
+from array import array
+from bisect import bisect_left
+
+import trace_index
+from trace import classify_instruction
+from trace_timeline import iter_trace_events
+
+# ============================
+# 合并的 Perfetto trace
+# ============================
+# 把 blkview / instrview / cache-trace-L1/L2 / timeline 以及 IPC counter 合到一个文件里：
+# base.log 只读两遍：第一遍收集基本块起点，第二遍同时产出基本块、指令和 IPC 事件。
+# 每个来源是一个按 ts 有序的生成器，用 heapq.merge 归并后逐条写出，内存只与
+# 静态代码大小（基本块起点集合）、miss 条数和一个 ROB 窗口内的事件数有关，与指令条数无关。
+# 进程划分：blocks / instructions / dcache / axi / ipc。
+# load 的执行区间 [exe, wb) 与它引起的 miss（miss 起点落在 [exe, exe + slack]）之间画 flow 箭头。
+
+# 与 trace-cache.py 中 L1 的配置一致
+L1_OFFSET = 6
+L1_INDEX = 4
+
+
+def trace_rows(trace_file, save_index=None):
+    for _, row in trace_index.iter_rows(trace_file, save_index=save_index):
+        if row:
+            yield row
+
+
+def block_starts(trace_file):
+    """第一遍：与 trace.build_basic_blocks 相同的基本块起点规则（索引缺失或过期时顺带重建）"""
+    starts = set()
+    prev_pc = None
+    prev_branch = False
+    for row in trace_rows(trace_file):
+        pc = row[0].lower()
+        if prev_pc is None or prev_branch or int(pc, 16) != prev_pc + 4:
+            starts.add(pc)
+        prev_pc = int(pc, 16)
+        prev_branch = row[15] == "1"
+    return starts
+
+
+def read_misses(cache_file):
+    """cachelog.log 中的 miss 行（按起始周期有序），返回 (ts, dur, addr) 三个数组"""
+    ts, durs, addrs = array("q"), array("q"), array("Q")
+    with open(cache_file) as f:
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) != 3:
+                continue  # 访问行多出 R/W 与 PC 两列
+            try:
+                t, d, a = int(parts[0]), int(parts[1]), int(parts[2], 16)
+            except ValueError:
+                continue
+            ts.append(t)
+            durs.append(d)
+            addrs.append(a)
+    return ts, durs, addrs
+
+
+def miss_track(addr):
+    return f"L1 set {(addr >> L1_OFFSET) & ((1 << L1_INDEX) - 1)}"
+
+
+def miss_events(misses):
+    ts, durs, addrs = misses
+    for t, d, a in zip(ts, durs, addrs):
+        yield {"name": f"{hex(a)}, offset={a & ((1 << L1_OFFSET) - 1)}", "cname": "L2" if d > 10 else "L1",
+               "ph": "X", "pid": "dcache", "tid": miss_track(a), "ts": t, "dur": d}
+
+
+def trace_events(trace_file, starts, misses, slack, bucket, with_slices=True):
+    """
+    第二遍，一次读完 base.log 产出三类事件：
+      blocks        每次迭代一个 slice，block_id 按首次出现的顺序分配（与 blkview.json 一致）
+      instructions  每条指令在其类别的 track 上一个 [lastCmt, retire) slice；
+                    能匹配到 miss 的 load 额外输出执行区间 [exe, wb) 和指向该 miss 的 flow
+      ipc           每 bucket 个周期一个 IPC counter
+    这些事件的 ts 不是按行有序的（迭代 slice 在迭代结束时才知道、load 的 exe 早于 lastCmt），
+    先放进一个小堆，只有 ts 不大于“之后任何事件的 ts 下界”的才弹出，因此输出按 ts 有序。
+    下界取 当前行的 fetch（按程序顺序不减，之后的 exe / miss 都不早于它）、当前 lastCmt、
+    未结束迭代的起点和当前 IPC 桶的起点中的最小值；堆中只留下一个 ROB 窗口左右的事件。
+    """
+    colors = string.ascii_lowercase
+    ids, iters = {}, {}
+    cur = None
+    it_start = it_end = 0
+    ts, _, addrs = misses
+    claimed = bytearray(len(ts))
+    flow_id = 0
+    ipc_bucket, ipc_count = None, 0
+    pending = []
+    order = 0
+
+    def push(ev):
+        nonlocal order
+        heapq.heappush(pending, (ev["ts"], order, ev))
+        order += 1
+
+    def iteration_event():
+        if cur not in ids:
+            ids[cur] = len(ids)
+        iters[cur] = iters.get(cur, 0) + 1
+        n = iters[cur]
+        color = colors[(n - 1) % len(colors)]
+        return {"name": f"{color}: {n} Iter", "cname": color, "ph": "X", "pid": "blocks",
+                "tid": f"Block {ids[cur]}", "ts": it_start, "dur": it_end - it_start}
+
+    def ipc_event():
+        return {"name": "IPC", "ph": "C", "pid": "ipc", "ts": ipc_bucket * bucket,
+                "args": {"ipc": round(ipc_count / bucket, 4)}}
+
+    for row in trace_rows(trace_file, save_index=False):
+        pc = row[0].lower()
+        fetch, start, commit = int(row[2]), int(row[14]), int(row[13])
+        if pc in starts:
+            if cur is not None:
+                push(iteration_event())
+            cur = pc
+            it_start = start
+        it_end = commit
+
+        b = commit // bucket
+        if b != ipc_bucket:
+            if ipc_bucket is not None:
+                push(ipc_event())
+            ipc_bucket, ipc_count = b, 0
+        ipc_count += 1
+
+        asm = row[1]
+        cls = classify_instruction(asm)
+        if with_slices:
+            push({"name": asm, "cname": "a", "ph": "X", "pid": "instructions", "tid": cls,
+                  "ts": start, "dur": commit - start})
+        if cls == "Load" and ts:
+            exe, wb = int(row[8]), int(row[11])
+            i = bisect_left(ts, exe)
+            while i < len(ts) and ts[i] <= exe + slack and claimed[i]:
+                i += 1
+            if i < len(ts) and ts[i] <= exe + slack:
+                claimed[i] = 1
+                flow_id += 1
+                push({"name": f"{row[0]} {asm}", "ph": "X", "pid": "instructions", "tid": "Load exec",
+                      "ts": exe, "dur": max(wb - exe, 1)})
+                push({"name": "load miss", "cat": "dcache", "ph": "s", "id": flow_id,
+                      "pid": "instructions", "tid": "Load exec", "ts": exe})
+                push({"name": "load miss", "cat": "dcache", "ph": "f", "bp": "e", "id": flow_id,
+                      "pid": "dcache", "tid": miss_track(addrs[i]), "ts": ts[i]})
+
+        low = min(fetch, start, it_start, ipc_bucket * bucket)
+        while pending and pending[0][0] <= low:
+            yield heapq.heappop(pending)[2]
+
+    if cur is not None:
+        push(iteration_event())
+    if ipc_bucket is not None:
+        push(ipc_event())
+    while pending:
+        yield heapq.heappop(pending)[2]
+
+
+def axi_events(timeline_file):
+    with open(timeline_file) as f:
+        for ev in iter_trace_events(f):
+            ev["pid"] = "axi"
+            yield ev
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把基本块、指令、D-cache miss、AXI 与 IPC 合并成一个 Perfetto trace")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--bucket", type=int, default=1000, help="IPC counter 的桶宽（周期）")
+    parser.add_argument("--slack", type=int, default=2, help="miss 起点晚于 load exe 不超过该拍数时画 flow")
+    parser.add_argument("--no-instrs", action="store_true", help="不输出逐条指令的 slice（只保留 load->miss 的 flow）")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    cache_file = os.path.join(output_dir, "cachelog.log")
+    timeline_file = os.path.join(output_dir, "timeline.log")
+    output_file = os.path.join(output_dir, "merged.json")
+
+    misses = read_misses(cache_file) if os.path.exists(cache_file) else (array("q"), array("q"), array("Q"))
+    sources = [
+        trace_events(trace_file, block_starts(trace_file), misses, args.slack, args.bucket, not args.no_instrs),
+        miss_events(misses),
+    ]
+    if os.path.exists(timeline_file):
+        sources.append(axi_events(timeline_file))
+
+    count = 0
+    with open(output_file, "w") as f:
+        f.write("[\n")
+        for i, name in enumerate(["blocks", "instructions", "dcache", "axi", "ipc"]):
+            f.write(json.dumps({"name": "process_name", "ph": "M", "pid": name, "args": {"name": name}}) + ",\n")
+            f.write(json.dumps({"name": "process_sort_index", "ph": "M", "pid": name, "args": {"sort_index": i}}) + ",\n")
+        first = True
+        for ev in heapq.merge(*sources, key=lambda e: e["ts"]):
+            if not first:
+                f.write(",\n")
+            first = False
+            f.write(json.dumps(ev))
+            count += 1
+        f.write("\n]\n")
+    print(f"✅ 合并 trace 写入 {output_file}（{count} 个事件，{len(misses[0])} 个 miss）")
+
+
+if __name__ == "__main__":
+    main()
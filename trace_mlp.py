@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+from bisect import bisect_right
+from collections import defaultdict
+
+import trace_index
+from trace import parse_trace_file, build_basic_blocks
+from analyze_sublayer_misses import parse_cache_trace
+from intervals import miss_intervals
+from trace_occupancy import occupancy_series, histogram, block_histograms
+from cache_sim import DEFAULT_REGIONS
+from elf_symbols import load_symbols, resolve_regions
+
+# ============================
+# D-cache miss 的访存并行度（MLP）
+# ============================
+# 把每个 miss 视为区间 [ts, ts + dur)，起止事件排序后扫描得到任意时刻未完成的 miss 数。
+# 在这条阶梯序列上再做两组前缀和（∑count·dt 与 ∑[count==1]·dt），
+# 任一 miss 期间的平均并行度和“独占”周期数只需两次二分。
+#   avg_mlp        有 miss 未完成的周期里，平均同时未完成的 miss 数
+#   serialized     只有一个 miss 未完成的周期占有 miss 周期的比例（完全串行、无重叠）
+
+
+class MissProfile:
+    def __init__(self, series):
+        self.times = [t for t, _ in series]
+        self.counts = [c for _, c in series]
+        self.cum_load = [0]
+        self.cum_single = [0]
+        for (t, c), (t_next, _) in zip(series, series[1:]):
+            dt = t_next - t
+            self.cum_load.append(self.cum_load[-1] + c * dt)
+            self.cum_single.append(self.cum_single[-1] + (dt if c == 1 else 0))
+
+    def _before(self, cum, x, weight):
+        i = bisect_right(self.times, x) - 1
+        if i < 0:
+            return 0
+        if i >= len(cum) - 1:
+            return cum[-1]
+        return cum[i] + weight(self.counts[i]) * (x - self.times[i])
+
+    def load(self, a, b):
+        """[a, b) 内 ∑ 未完成 miss 数"""
+        w = lambda c: c
+        return self._before(self.cum_load, b, w) - self._before(self.cum_load, a, w)
+
+    def single(self, a, b):
+        """[a, b) 内只有一个 miss 未完成的周期数"""
+        w = lambda c: 1 if c == 1 else 0
+        return self._before(self.cum_single, b, w) - self._before(self.cum_single, a, w)
+
+
+def mlp_summary(hist):
+    """由“未完成 miss 数 -> 周期数”直方图得到 (miss 周期, 平均 MLP, 串行比例, 最大 MLP)"""
+    active = sum(c for k, c in hist.items() if k > 0)
+    if not active:
+        return 0, 0, 0, 0
+    avg = sum(k * c for k, c in hist.items() if k > 0) / active
+    return active, avg, hist.get(1, 0) / active, max(hist)
+
+
+def region_of(addr, regions):
+    for name, lo, hi in regions:
+        if lo <= addr <= hi:
+            return name
+    return "other"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="D-cache miss 的访存并行度分析")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--region", action="append",
+                        help="地址区间 name:lo:hi、name:符号 或 符号（可重复，默认 twiddle/output）")
+    parser.add_argument("--elf", help="镜像的 ELF 文件，用于按符号名定义区间")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    cache_file = os.path.join(output_dir, "cachelog.log")
+
+    try:
+        regions = resolve_regions(args.region, load_symbols(args.elf)) if args.region else DEFAULT_REGIONS
+    except KeyError as e:
+        parser.error(e.args[0])
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+    cache_events = parse_cache_trace(cache_file) if os.path.exists(cache_file) else []
+    if seq_range or cycle_range:
+        if instrs:
+            lo, hi = instrs[0].start, instrs[-1].commit
+            cache_events = [ev for ev in cache_events if lo <= ev["ts"] < hi]
+    if not cache_events:
+        print("⚠️ 没有 D-cache miss 记录")
+        return
+
+    series = occupancy_series(miss_intervals(cache_events))
+    profile = MissProfile(series)
+
+    # --- 全局分布 ---
+    hist = histogram(series)
+    rows = [("global", "all", len(cache_events)) + mlp_summary(hist)]
+
+    # --- 按地址区间：每个 miss 期间看到的平均并行度与独占周期 ---
+    by_region = defaultdict(lambda: [0, 0, 0, 0])  # misses, cycles, load, single
+    for ev in cache_events:
+        a, b = ev["ts"], ev["ts"] + ev["dur"]
+        acc = by_region[region_of(ev["addr"], regions)]
+        acc[0] += 1
+        acc[1] += b - a
+        acc[2] += profile.load(a, b)
+        acc[3] += profile.single(a, b)
+    for name in sorted(by_region):
+        n, cycles, load, single = by_region[name]
+        rows.append(("region", name, n, cycles, load / cycles if cycles else 0,
+                     single / cycles if cycles else 0, ""))
+
+    # --- 按基本块：把时间轴按退休窗口分给各块，统计窗口内的并行度分布 ---
+    if instrs:
+        block_of = {}
+        for bb in build_basic_blocks(instrs):
+            for it in bb.iterations:
+                for inst in it:
+                    block_of[inst.seq] = bb.block_id
+        starts = [inst.start for inst in instrs]
+        block_misses = defaultdict(int)
+        for ev in cache_events:
+            i = bisect_right(starts, ev["ts"]) - 1
+            if i >= 0:
+                block_misses[block_of[instrs[i].seq]] += 1
+        per_block = block_histograms(instrs, block_of, series)
+        for bid in sorted(per_block):
+            summary = mlp_summary(per_block[bid])
+            if summary[0]:
+                rows.append(("block", bid, block_misses[bid]) + summary)
+
+    output_file = os.path.join(output_dir, "mlp.csv")
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("scope,key,misses,miss_cycles,avg_mlp,serialized_frac,max_mlp\n")
+        for scope, key, n, cycles, avg, serial, mx in rows:
+            f.write(f"{scope},{key},{n},{cycles},{avg:.3f},{serial:.4f},{mx}\n")
+    hist_file = os.path.join(output_dir, "mlp_hist.csv")
+    with open(hist_file, "w", encoding="utf-8") as f:
+        f.write("outstanding,cycles\n")
+        for k in sorted(hist):
+            if k > 0:
+                f.write(f"{k},{hist[k]}\n")
+    view_file = os.path.join(output_dir, "mlp.json")
+    with open(view_file, "w") as f:
+        json.dump([{"name": "Outstanding D-cache misses", "ph": "C", "pid": "mlp", "ts": t,
+                    "args": {"misses": c}} for t, c in series], f)
+
+    _, _, avg, serial, mx = rows[0][2:]
+    print(f"[*] {len(cache_events)} 次 miss，平均 MLP {avg:.2f}，串行比例 {serial:.2%}，最大 {mx}")
+    print(f"✅ 输出 {output_file}、{hist_file}、{view_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+from collections import defaultdict
+from heapq import merge
+
+import trace_index
+from trace import parse_trace_file, build_basic_blocks
+
+# ============================
+# ROB / 发射队列占用重建
+# ============================
+# 一条指令在 [dispatch, retire) 内占用 ROB，在 [dispatch, issue) 内占用它所属的发射队列。
+# 进入事件（dispatch，按程序顺序基本有序）与离开事件（retire 有序、issue 基本有序）各自排序后
+# 归并成一条事件流，累加 +1/-1 即得到占用随时间的阶梯序列。
+# 按基本块统计时，把 [上一次退休, 本次退休) 这段时间记在本次退休指令所属的块上。
+STRUCTURES = ["rob", "iq_arith", "iq_muldiv", "iq_ldst"]
+
+LDST = ("lb", "lh", "lw", "lbu", "lhu", "sb", "sh", "sw")
+MULDIV = ("mul", "div", "rem")
+
+
+def issue_queue(asm):
+    mnemonic = asm.split(None, 1)[0].lower() if asm else ""
+    if mnemonic in LDST:
+        return "iq_ldst"
+    if mnemonic.startswith(MULDIV):
+        return "iq_muldiv"
+    return "iq_arith"
+
+
+def occupancy_series(intervals):
+    """intervals: [(进入, 离开)]，返回阶梯序列 [(t, 占用)]，占用从 t 保持到下一个 t"""
+    arrivals = sorted(a for a, b in intervals if b > a)
+    departures = sorted(b for a, b in intervals if b > a)
+    events = merge(((t, 1) for t in arrivals), ((t, -1) for t in departures))
+    series = []
+    occ = 0
+    for t, d in events:
+        occ += d
+        if series and series[-1][0] == t:
+            series[-1] = (t, occ)
+        else:
+            series.append((t, occ))
+    return series
+
+
+def histogram(series, t_end=None):
+    """每个占用值持续的周期数"""
+    hist = defaultdict(int)
+    for (t, occ), (t_next, _) in zip(series, series[1:]):
+        hist[occ] += t_next - t
+    if series and t_end is not None and t_end > series[-1][0]:
+        hist[series[-1][1]] += t_end - series[-1][0]
+    return hist
+
+
+def block_histograms(instrs, block_of, series):
+    """沿退休窗口与阶梯序列同时前进，按块累加各占用值持续的周期"""
+    hists = defaultdict(lambda: defaultdict(int))
+    j = 0  # series[j] 是第一个晚于当前时刻的变化点
+    prev_commit = None
+    for inst in instrs:
+        a = inst.start if prev_commit is None else prev_commit
+        b = inst.commit
+        prev_commit = b
+        if b <= a:
+            continue
+        hist = hists[block_of[inst.seq]]
+        while j < len(series) and series[j][0] <= a:
+            j += 1
+        occ = series[j - 1][1] if j > 0 else 0
+        t = a
+        while t < b:
+            nxt = series[j][0] if j < len(series) else b
+            seg_end = min(b, nxt)
+            hist[occ] += seg_end - t
+            t = seg_end
+            if j < len(series) and t == nxt:
+                occ = series[j][1]
+                j += 1
+    return hists
+
+
+def summarize(hist):
+    cycles = sum(hist.values())
+    if not cycles:
+        return 0, 0, 0, 0
+    avg = sum(o * c for o, c in hist.items()) / cycles
+    acc = 0
+    p50 = 0
+    for o in sorted(hist):
+        acc += hist[o]
+        if acc * 2 >= cycles:
+            p50 = o
+            break
+    return cycles, avg, p50, max(hist)
+
+
+def write_counters(series_by_struct, output_file, t0, t1, bucket=None):
+    """按桶输出时间加权的平均占用，作为 Perfetto counter"""
+    if bucket is None:
+        bucket = max(1, (t1 - t0) // 2000)
+    n = (t1 - t0) // bucket + 1
+    sums = {s: [0] * n for s in series_by_struct}
+    for s, series in series_by_struct.items():
+        acc = sums[s]
+        for (t, occ), (t_next, _) in zip(series, series[1:]):
+            while t < t_next:
+                b = (t - t0) // bucket
+                seg_end = min(t_next, t0 + (b + 1) * bucket)
+                acc[b] += occ * (seg_end - t)
+                t = seg_end
+    events = []
+    for b in range(n):
+        events.append({"name": "Occupancy", "ph": "C", "pid": "occupancy", "ts": t0 + b * bucket,
+                       "args": {s: round(sums[s][b] / bucket, 2) for s in series_by_struct}})
+    with open(output_file, "w") as f:
+        json.dump(events, f)
+    print(f"✅ 占用 counter 写入 {output_file}（桶宽 {bucket} cycles）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由 dispatch/issue/retire 重建 ROB 与发射队列占用")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--bucket", type=int, help="counter track 的桶宽（周期，默认自动）")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+    if not instrs:
+        print("⚠️ 没有可分析的指令")
+        return
+    blocks = build_basic_blocks(instrs)
+    block_of = {}
+    for bb in blocks:
+        for it in bb.iterations:
+            for inst in it:
+                block_of[inst.seq] = bb.block_id
+
+    intervals = {s: [] for s in STRUCTURES}
+    for inst in instrs:
+        intervals["rob"].append((inst.dispatch, inst.commit))
+        intervals[issue_queue(inst.asm)].append((inst.dispatch, inst.issue))
+    series = {s: occupancy_series(iv) for s, iv in intervals.items()}
+
+    t0 = min([instrs[0].start] + [sr[0][0] for sr in series.values() if sr])
+    t1 = instrs[-1].commit
+    hist_file = os.path.join(output_dir, "occupancy_hist.csv")
+    summary_file = os.path.join(output_dir, "occupancy.csv")
+    with open(hist_file, "w", encoding="utf-8") as fh, open(summary_file, "w", encoding="utf-8") as fs:
+        fh.write("scope,key,structure,occupancy,cycles\n")
+        fs.write("scope,key,structure,cycles,avg,p50,max\n")
+        for s in STRUCTURES:
+            scopes = [("global", "all", histogram(series[s], t1))]
+            per_block = block_histograms(instrs, block_of, series[s])
+            scopes += [("block", bid, per_block[bid]) for bid in sorted(per_block)]
+            for scope, key, hist in scopes:
+                for occ in sorted(hist):
+                    fh.write(f"{scope},{key},{s},{occ},{hist[occ]}\n")
+                cycles, avg, p50, mx = summarize(hist)
+                fs.write(f"{scope},{key},{s},{cycles},{avg:.3f},{p50},{mx}\n")
+    print(f"✅ 占用直方图写入 {hist_file}，汇总写入 {summary_file}")
+    write_counters(series, os.path.join(output_dir, "occupancy.json"), t0, t1, args.bucket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import heapq
+import math
+import os
+from bisect import bisect_left
+from itertools import accumulate
+
+import trace_index
+from trace import parse_trace_file, build_basic_blocks
+
+# ============================
+# 变点检测（均值漂移，best-first 二分切分）
+# ============================
+# 用一阶/二阶前缀和 O(1) 计算任意区间的平方误差，每次切分扫描一遍区间，
+# 平衡切分下总代价 O(n log n)。惩罚项默认取 BIC 形式 3 * sigma^2 * ln(n)，
+# sigma 用一阶差分的 MAD 稳健估计，避免阶跃本身抬高噪声估计。
+
+DEFAULT_MIN_SIZE = 16
+DEFAULT_MAX_PHASES = 64
+
+
+def _prefix_sums(series):
+    s1 = list(accumulate(series, initial=0))
+    s2 = list(accumulate((x * x for x in series), initial=0))
+    return s1, s2
+
+
+def _cost(s1, s2, a, b):
+    n = b - a
+    d = s1[b] - s1[a]
+    return (s2[b] - s2[a]) - d * d / n
+
+
+def noise_variance(series):
+    diffs = sorted(abs(series[i] - series[i - 1]) for i in range(1, len(series)))
+    if not diffs:
+        return 0.0
+    mad = diffs[len(diffs) // 2]
+    if mad > 0:
+        sigma = 1.4826 * mad / math.sqrt(2)
+        return sigma * sigma
+    # 大部分相邻值完全相同时 MAD 为 0，退化为差分均方
+    return sum(d * d for d in diffs) / (2 * len(diffs))
+
+
+def _best_split(s1, s2, a, b, min_size):
+    whole = _cost(s1, s2, a, b)
+    best_k, best_cost = None, whole
+    for k in range(a + min_size, b - min_size + 1):
+        c = _cost(s1, s2, a, k) + _cost(s1, s2, k, b)
+        if c < best_cost:
+            best_k, best_cost = k, c
+    return best_k, whole - best_cost
+
+
+def detect_change_points(series, min_size=DEFAULT_MIN_SIZE, penalty=None, max_phases=DEFAULT_MAX_PHASES):
+    """返回排好序的变点下标列表（每个变点是新阶段的第一个元素）"""
+    n = len(series)
+    if n < 2 * min_size:
+        return []
+    s1, s2 = _prefix_sums(series)
+    if penalty is None:
+        penalty = 3 * max(noise_variance(series), 1e-9) * math.log(n)
+
+    heap = []
+
+    def push(a, b):
+        if b - a < 2 * min_size:
+            return
+        k, gain = _best_split(s1, s2, a, b, min_size)
+        if k is not None and gain > penalty:
+            heapq.heappush(heap, (-gain, a, b, k))
+
+    push(0, n)
+    cps = []
+    while heap and len(cps) + 1 < max_phases:
+        _, a, b, k = heapq.heappop(heap)
+        cps.append(k)
+        push(a, k)
+        push(k, b)
+    cps.sort()
+    return cps
+
+
+def segments_from_change_points(n, cps):
+    bounds = [0] + list(cps) + [n]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i + 1] > bounds[i]]
+
+
+def detect_segments(series, min_size=DEFAULT_MIN_SIZE, penalty=None, max_phases=DEFAULT_MAX_PHASES):
+    return segments_from_change_points(len(series), detect_change_points(series, min_size, penalty, max_phases))
+
+
+def fixed_segments(n, size):
+    return [(s, min(s + size, n)) for s in range(0, n, size)]
+
+
+def nested_segments(series, min_size=DEFAULT_MIN_SIZE, penalty=None):
+    """两级切分：先在整段上找大阶段，再在每个大阶段内部找子阶段。返回 [(g_start, g_end, [(s, e), ...]), ...]"""
+    layout = []
+    for g_start, g_end in detect_segments(series, min_size, penalty):
+        subs = detect_segments(series[g_start:g_end], min_size, penalty)
+        layout.append((g_start, g_end, [(g_start + s, g_start + e) for s, e in subs]))
+    return layout
+
+
+def fixed_nested_segments(n, group_size, sub_size):
+    layout = []
+    for g_start, g_end in fixed_segments(n, group_size):
+        subs = [(g_start + s, g_start + e) for s, e in fixed_segments(g_end - g_start, sub_size)]
+        layout.append((g_start, g_end, subs))
+    return layout
+
+
+# ============================
+# 按时间分桶的 cache miss 序列
+# ============================
+def bucket_misses(cache_events, bucket):
+    """cache_events 需按 ts 排序；返回 (起始周期, 每桶 miss 数列表)"""
+    if not cache_events:
+        return 0, []
+    t0 = cache_events[0]["ts"]
+    t1 = cache_events[-1]["ts"]
+    counts = [0] * ((t1 - t0) // bucket + 1)
+    for ev in cache_events:
+        counts[(ev["ts"] - t0) // bucket] += 1
+    return t0, counts
+
+
+def detect_miss_phases(cache_events, bucket=None, min_size=DEFAULT_MIN_SIZE, penalty=None):
+    """在分桶后的 miss 计数序列上做变点检测，返回 [(start_cycle, end_cycle), ...]"""
+    if not cache_events:
+        return []
+    if bucket is None:
+        span = cache_events[-1]["ts"] - cache_events[0]["ts"] + 1
+        bucket = max(1, span // 2048)
+    t0, counts = bucket_misses(cache_events, bucket)
+    return [(t0 + s * bucket, t0 + e * bucket) for s, e in detect_segments(counts, min_size, penalty)]
+
+
+def summarize_miss_window(cache_events, keys, start, end, classify_miss):
+    """统计 [start, end) 内的 miss，按 twiddle/output/其它 × L1/L2 拆分；keys 为各 miss 的 ts（与 cache_events 对齐）"""
+    lo = bisect_left(keys, start)
+    hi = bisect_left(keys, end)
+    summary = {"miss_count": 0, "miss_dur_sum": 0}
+    for ev in cache_events[lo:hi]:
+        summary["miss_count"] += 1
+        summary["miss_dur_sum"] += ev["dur"]
+        bucket = classify_miss(ev)
+        summary[bucket] = summary.get(bucket, 0) + 1
+        summary[bucket + "_dur"] = summary.get(bucket + "_dur", 0) + ev["dur"]
+    return summary
+
+
+# ============================
+# main
+# ============================
+MISS_BUCKETS = ["tw_l1", "tw_l2", "out_l1", "out_l2", "miss_taken_l1", "miss_taken_l2"]
+
+
+def main():
+    from analyze_sublayer_misses import parse_cache_trace, iterations_to_infos, classify_miss
+
+    parser = argparse.ArgumentParser(description="基于变点检测的阶段划分")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--block", type=int, action="append",
+                        help="只分析指定 block（可重复）；默认分析迭代次数不少于 2*min-size 的所有 block")
+    parser.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE, help="每个阶段的最少迭代数/桶数")
+    parser.add_argument("--penalty", type=float, help="切分惩罚（默认 BIC）")
+    parser.add_argument("--bucket", type=int, help="miss 序列的分桶宽度（周期，默认自动）")
+    parser.add_argument("--fixed", type=int, help="不做检测，按固定迭代数切分")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    cache_file = os.path.join(output_dir, "cachelog.log")
+    phase_file = os.path.join(output_dir, "phases.csv")
+    miss_phase_file = os.path.join(output_dir, "miss_phases.csv")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+    blocks = build_basic_blocks(instrs)
+    cache_events = parse_cache_trace(cache_file) if os.path.exists(cache_file) else []
+    miss_ts = [ev["ts"] for ev in cache_events]
+
+    selected = set(args.block) if args.block else None
+    with open(phase_file, "w", encoding="utf-8") as f:
+        f.write("block_id,phase,iter_first,iter_last,iterations,start,end,total_cycles,avg_cycles,"
+                "miss_count,miss_dur_sum," + ",".join(f"{b},{b}_dur" for b in MISS_BUCKETS) + "\n")
+        n_phases = 0
+        for bb in blocks:
+            if selected is not None and bb.block_id not in selected:
+                continue
+            it_infos = iterations_to_infos(bb.iterations)
+            if selected is None and len(it_infos) < 2 * args.min_size:
+                continue
+            series = [info["cycles"] for info in it_infos]
+            if args.fixed:
+                segments = fixed_segments(len(series), args.fixed)
+            else:
+                segments = detect_segments(series, args.min_size, args.penalty)
+            for phase_id, (s, e) in enumerate(segments):
+                part = it_infos[s:e]
+                total = sum(series[s:e])
+                start, end = part[0]["start"], part[-1]["end"]
+                miss = summarize_miss_window(cache_events, miss_ts, start, end, classify_miss)
+                f.write(
+                    f"{bb.block_id},{phase_id},{part[0]['iter_id']},{part[-1]['iter_id']},{e - s},"
+                    f"{start},{end},{total},{total / (e - s):.2f},"
+                    f"{miss['miss_count']},{miss['miss_dur_sum']},"
+                    + ",".join(f"{miss.get(b, 0)},{miss.get(b + '_dur', 0)}" for b in MISS_BUCKETS) + "\n"
+                )
+                n_phases += 1
+    print(f"✅ 迭代阶段写入 {phase_file}，共 {n_phases} 个阶段")
+
+    with open(miss_phase_file, "w", encoding="utf-8") as f:
+        f.write("phase,start,end,miss_count,misses_per_kcycle,miss_dur_sum,"
+                + ",".join(f"{b},{b}_dur" for b in MISS_BUCKETS) + "\n")
+        miss_phases = detect_miss_phases(cache_events, args.bucket, args.min_size, args.penalty)
+        for phase_id, (start, end) in enumerate(miss_phases):
+            miss = summarize_miss_window(cache_events, miss_ts, start, end, classify_miss)
+            rate = miss["miss_count"] * 1000 / (end - start) if end > start else 0
+            f.write(
+                f"{phase_id},{start},{end},{miss['miss_count']},{rate:.3f},{miss['miss_dur_sum']},"
+                + ",".join(f"{miss.get(b, 0)},{miss.get(b + '_dur', 0)}" for b in MISS_BUCKETS) + "\n"
+            )
+    print(f"✅ miss 阶段写入 {miss_phase_file}，共 {len(miss_phases)} 个阶段")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+from itertools import accumulate
+
+import trace_index
+from trace import classify_instruction
+from analyze_sublayer_misses import parse_cache_trace
+
+# ============================
+# 滑动窗口 IPC / 吞吐时间序列
+# ============================
+# 流式扫描 base.log，只取 retire 周期与 asm，把退休事件按 bucket 个周期分桶；
+# 每个窗口（bucket 的整数倍）的滑动和由前缀和相减得到：sum[i, i+w) = cum[i+w] - cum[i]，
+# 与窗口大小无关，每个窗口一遍线性扫描。
+CLASSES = ["Load", "Store", "Branch", "Compute", "multiply", "CAL-STREAM", "MISC-STREAM"]
+
+
+def bin_retires(rows, bucket):
+    """返回 (起始周期, 每桶退休数, {类别: 每桶退休数})"""
+    class_of = {}
+    t0 = None
+    total = []
+    per_class = {c: [] for c in CLASSES}
+    for _, row in rows:
+        if not row:
+            continue
+        commit = int(row[13])
+        if t0 is None:
+            t0 = commit - commit % bucket
+        b = (commit - t0) // bucket
+        if b >= len(total):
+            grow = b + 1 - len(total)
+            total.extend([0] * grow)
+            for lst in per_class.values():
+                lst.extend([0] * grow)
+        total[b] += 1
+        asm = row[1]
+        cls = class_of.get(asm)
+        if cls is None:
+            cls = class_of[asm] = classify_instruction(asm)
+        per_class[cls][b] += 1
+    return t0 or 0, total, per_class
+
+
+def bin_misses(cache_events, t0, bucket, n):
+    counts = [0] * n
+    for ev in cache_events:
+        b = (ev["ts"] - t0) // bucket
+        if 0 <= b < n:
+            counts[b] += 1
+    return counts
+
+
+def window_sums(counts, w):
+    """长度为 len(counts) 的滑动窗口和（窗口结束于第 i 个桶，开头不足 w 个桶的部分按实际桶数）"""
+    cum = [0] + list(accumulate(counts))
+    return [cum[i + 1] - cum[max(0, i + 1 - w)] for i in range(len(counts))]
+
+
+def window_width(i, w):
+    return min(i + 1, w)
+
+
+def write_csv(output_file, t0, bucket, windows, total, per_class, misses):
+    sums = {w: window_sums(total, w) for w in windows}
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("cycle,retired," + ",".join(CLASSES) + ",dcache_misses,"
+                + ",".join(f"ipc_w{w}" for w in windows) + "\n")
+        for i in range(len(total)):
+            ipcs = [sums[w][i] / (window_width(i, w) * bucket) for w in windows]
+            f.write(f"{t0 + i * bucket},{total[i]}," + ",".join(str(per_class[c][i]) for c in CLASSES)
+                    + f",{misses[i]}," + ",".join(f"{v:.4f}" for v in ipcs) + "\n")
+    print(f"✅ 时间序列写入 {output_file}（{len(total)} 个桶，桶宽 {bucket} cycles）")
+
+
+def write_counters(output_file, t0, bucket, windows, total, per_class, misses):
+    """
+    Perfetto counter track：每个窗口一条 IPC 曲线、一条按类别的吞吐曲线（最小窗口）和 D-cache miss 数。
+    大窗口曲线变化慢，每 w/4 个桶采样一次，控制事件数量。
+    """
+    events = []
+    for w in windows:
+        sums = window_sums(total, w)
+        stride = max(1, w // 4)
+        for i in range(0, len(total), stride):
+            events.append({"name": f"IPC (window {w * bucket})", "ph": "C", "pid": "throughput",
+                           "ts": t0 + i * bucket, "args": {"ipc": round(sums[i] / (window_width(i, w) * bucket), 4)}})
+    w = windows[0]
+    class_sums = {c: window_sums(per_class[c], w) for c in CLASSES if any(per_class[c])}
+    miss_sums = window_sums(misses, w)
+    for i in range(len(total)):
+        width = window_width(i, w) * bucket
+        events.append({"name": "Throughput by class", "ph": "C", "pid": "throughput",
+                       "ts": t0 + i * bucket, "args": {c: round(s[i] / width, 4) for c, s in class_sums.items()}})
+        events.append({"name": "D-cache misses", "ph": "C", "pid": "throughput",
+                       "ts": t0 + i * bucket, "args": {"misses": miss_sums[i]}})
+    with open(output_file, "w") as f:
+        json.dump(events, f)
+    print(f"✅ counter track 写入 {output_file}（{len(events)} 个事件）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按周期分桶的滑动窗口 IPC / 吞吐 / D-cache miss 时间序列")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--bucket", type=int, default=100, help="桶宽（周期）")
+    parser.add_argument("--windows", default="1,10,100", help="窗口大小列表（以桶为单位）")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    cache_file = os.path.join(output_dir, "cachelog.log")
+    windows = sorted(int(w) for w in args.windows.split(",") if w)
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    if seq_range or cycle_range:
+        rows = trace_index.iter_window(trace_file, seq_range, cycle_range)
+    else:
+        rows = trace_index.iter_rows(trace_file)
+    t0, total, per_class = bin_retires(rows, args.bucket)
+    if not total:
+        print("⚠️ 没有可分析的指令")
+        return
+    cache_events = parse_cache_trace(cache_file) if os.path.exists(cache_file) else []
+    misses = bin_misses(cache_events, t0, args.bucket, len(total))
+
+    write_csv(os.path.join(output_dir, "throughput.csv"), t0, args.bucket, windows, total, per_class, misses)
+    write_counters(os.path.join(output_dir, "throughput.json"), t0, args.bucket, windows, total, per_class, misses)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,10 @@ def parse_trace_line(line):
         raise ValueError(f"Invalid line: {line}")
 
 def convert_trace_to_json(trace_lines):
-    results = []
+    return list(iter_trace_events(trace_lines))
+
+def iter_trace_events(trace_lines):
+    """逐条产出配对好的 AXI 事件；FIFO 配对，因此按开始周期有序"""
     stack = []  # 暂存 start 记录
     type_count = {1: 0, 2: 0, 4: 0}  # 计数
 
@@ -58,9 +61,7 @@ def convert_trace_to_json(trace_lines):
                 "ts": start_entry["start"],
                 "dur": entry["dur"]
             }
-            results.append(obj)
-
-    return results
+            yield obj
 
 
 def main():
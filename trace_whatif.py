@@ -0,0 +1,133 @@
+import argparse
+import os
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+import trace_index
+import memo_store
+from trace import parse_trace_file, build_basic_blocks
+from block_table import summarize_blocks, cached_block_table
+from analyze_sublayer_misses import parse_cache_trace
+from intervals import IntervalUnion, miss_intervals
+
+# ============================
+# What-if 加速估计
+# ============================
+# 每个基本块的迭代表只预处理一次（按耗时排序 + 前缀和、按 IPC 排序 + 前缀和、每次迭代被 miss 覆盖的周期），
+# 之后每个场景对每个块只是一次二分加常数次运算，场景数增加几乎不增加开销：
+#   ipc=T        IPC 低于 T 的迭代按 size/T 计，其余不变      sum_{ipc<T} size/T + sum_{ipc>=T} cycles
+#   best_iter    所有迭代都和最快的一次一样快                  n * min(cycles)
+#   pXX_iter     慢于第 XX 百分位的迭代截到该百分位           sum_{c<=q} c + (#c>q) * q
+#   no_dcache    去掉迭代窗口内与 D-cache miss 重叠的周期     sum max(1, cycles - covered)
+# 迭代窗口 [首条 lastCmt, 末条 retire) 之间相互重叠，各块窗口之和大于实测总周期，
+# 因此每个块的节省按“节省比例 × 该块在总周期中的份额”折算，项目总周期 = 实测总周期 - 各块折算节省之和。
+
+
+class BlockModel:
+    def __init__(self, bb, cov):
+        self.bb = bb
+        cycles = [b - a for a, b in zip(bb.starts, bb.ends)]
+        self.n = len(cycles)
+        self.total = sum(cycles)
+        self.sorted_cycles = sorted(cycles)
+        self.cycle_prefix = [0] + list(accumulate(self.sorted_cycles))
+
+        by_ipc = sorted(zip(cycles, bb.sizes), key=lambda cs: cs[1] / cs[0] if cs[0] else float("inf"))
+        self.ipcs = [s / c if c else float("inf") for c, s in by_ipc]
+        self.ipc_cycle_prefix = [0] + list(accumulate(c for c, _ in by_ipc))
+        self.ipc_size_prefix = [0] + list(accumulate(s for _, s in by_ipc))
+
+        self.no_miss = sum(max(1, c - cov.covered(a, b)) if c else 0
+                           for c, a, b in zip(cycles, bb.starts, bb.ends)) if cov is not None else self.total
+
+    def at_ipc(self, target):
+        k = bisect_left(self.ipcs, target)
+        return self.ipc_size_prefix[k] / target + (self.total - self.ipc_cycle_prefix[k])
+
+    def best_iter(self):
+        return self.n * self.sorted_cycles[0] if self.n else 0
+
+    def clamp_to(self, q):
+        k = bisect_right(self.sorted_cycles, q)
+        return self.cycle_prefix[k] + (self.n - k) * q
+
+    def percentile(self, p):
+        if not self.n:
+            return 0
+        return self.sorted_cycles[min(self.n - 1, int(p / 100 * (self.n - 1) + 0.5))]
+
+
+def scenarios(ipcs, percentiles, with_miss):
+    result = [(f"ipc={t:g}", lambda m, t=t: m.at_ipc(t)) for t in ipcs]
+    result.append(("best_iter", lambda m: m.best_iter()))
+    result += [(f"p{p:g}_iter", lambda m, p=p: m.clamp_to(m.percentile(p))) for p in percentiles]
+    if with_miss:
+        result.append(("no_dcache", lambda m: m.no_miss))
+    return result
+
+
+def _floats(text):
+    return [float(v) for v in text.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按多种假设估计各基本块可节省的周期与整体加速比")
+    parser.add_argument("img", help="镜像名（不含 -riscv32 后缀）")
+    parser.add_argument("--ipcs", default="1,1.5,2,3,4", help="目标 IPC 列表")
+    parser.add_argument("--percentiles", default="50,75,90", help="按迭代耗时百分位截断的列表")
+    parser.add_argument("--top", type=int, default=10, help="每个场景列出节省最多的前 N 个块")
+    parser.add_argument("--seq", help="只分析 seq 区间 A:B")
+    parser.add_argument("--cycles", help="只分析周期区间 A:B")
+    args = parser.parse_args()
+
+    imgname = args.img + "-riscv32"
+    output_dir = os.path.join("profiling", imgname)
+    trace_file = os.path.join(output_dir, "base.log")
+    cache_file = os.path.join(output_dir, "cachelog.log")
+
+    seq_range, cycle_range = trace_index.window_args(args.seq, args.cycles)
+    store = memo_store.store_for(output_dir)
+
+    def compute_blocks():
+        instrs = parse_trace_file(trace_file, seq_range, cycle_range)
+        return summarize_blocks(instrs, build_basic_blocks(instrs))
+
+    total_cycles, _, blocks = cached_block_table(store, trace_file, seq_range, cycle_range, compute_blocks)
+    if not total_cycles:
+        print("⚠️ 没有可分析的指令")
+        return
+
+    cov = None
+    if os.path.exists(cache_file):
+        cov = IntervalUnion(miss_intervals(parse_cache_trace(cache_file)))
+    models = [BlockModel(bb, cov) for bb in blocks]
+    grid = scenarios(_floats(args.ipcs), _floats(args.percentiles), cov is not None)
+    window_sum = sum(m.total for m in models)
+    scale = total_cycles / window_sum if window_sum else 0
+
+    summary_file = os.path.join(output_dir, "whatif.csv")
+    blocks_file = os.path.join(output_dir, "whatif_blocks.csv")
+    with open(summary_file, "w", encoding="utf-8") as fs, open(blocks_file, "w", encoding="utf-8") as fb:
+        fs.write("scenario,total_cycles,projected_cycles,saved_cycles,speedup,top_blocks\n")
+        fb.write("scenario,rank,block_id,start_pc,window_cycles,cycles,projected_cycles,saved_cycles,saved_share\n")
+        for name, project in grid:
+            saved = []
+            for m in models:
+                share = m.total * scale
+                proj = project(m) * scale
+                saved.append((share - proj, proj, m))
+            total_saved = sum(s for s, _, _ in saved)
+            projected = total_cycles - total_saved
+            saved.sort(key=lambda x: x[0], reverse=True)
+            top = saved[:args.top]
+            fs.write(f"{name},{total_cycles},{projected:.0f},{total_saved:.0f},"
+                     f"{(total_cycles / projected if projected > 0 else 0):.3f},"
+                     + " ".join(f"{m.bb.block_id}:{s:.0f}" for s, _, m in top if s > 0) + "\n")
+            for rank, (s, proj, m) in enumerate(top, start=1):
+                fb.write(f"{name},{rank},{m.bb.block_id},{m.bb.start_pc},{m.total},{m.total * scale:.0f},{proj:.0f},{s:.0f},"
+                         f"{(s / total_cycles):.4f}\n")
+    print(f"✅ {len(grid)} 个场景 × {len(models)} 个基本块，汇总写入 {summary_file}，排名写入 {blocks_file}")
+
+
+if __name__ == "__main__":
+    main()